@@ -0,0 +1,41 @@
+"""Adiciona row_version a Products e a tabela product_tombstones (sync incremental)
+
+Revision ID: 45aae8a1d3f9
+Revises: 0f3b608ee7ff
+Create Date: 2026-10-17 10:03:51.402877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '45aae8a1d3f9'
+down_revision: Union[str, None] = '0f3b608ee7ff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROW_VERSION = sa.text("pg_current_xact_id()::text::bigint")
+
+
+def upgrade() -> None:
+    # Linhas já existentes recebem a versão da transação da migração
+    op.add_column('products', sa.Column('row_version', sa.BigInteger(), server_default=ROW_VERSION, nullable=False))
+    op.create_index(op.f('ix_products_row_version'), 'products', ['row_version'], unique=False)
+
+    op.create_table('product_tombstones',
+    sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('row_version', sa.BigInteger(), server_default=ROW_VERSION, nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_product_tombstones_row_version'), 'product_tombstones', ['row_version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_product_tombstones_row_version'), table_name='product_tombstones')
+    op.drop_table('product_tombstones')
+    op.drop_index(op.f('ix_products_row_version'), table_name='products')
+    op.drop_column('products', 'row_version')
@@ -0,0 +1,64 @@
+"""Particiona stock_movements por mês (RANGE em timestamp)
+
+Revision ID: 840eb8536826
+Revises: bff75312fc36
+Create Date: 2026-10-17 18:05:12.417730
+
+A tabela é recriada como particionada e os dados copiados: rode com as vendas
+paradas. A chave primária passa a ser (id, timestamp), exigência do Postgres
+para tabelas particionadas; os ids continuam vindo da mesma sequência.
+
+A migração cria só a partição default (recebe todas as linhas). As partições
+mensais dependem do fuso da loja e são criadas pela aplicação, que também
+move para elas as linhas da default: rode "python -m app.partitions maintain"
+logo depois do upgrade (a inicialização da API faz o mesmo).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '840eb8536826'
+down_revision: Union[str, None] = 'bff75312fc36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEQUENCE = 'stock_movements_id_seq'
+INDEXES = [
+    ('ix_stock_movements_id', ['id']),
+    ('ix_stock_movements_row_version', ['row_version']),
+    ('ix_stock_movements_product_id_timestamp', ['product_id', '"timestamp"']),
+    ('ix_stock_movements_timestamp_id', ['"timestamp"', 'id']),
+]
+
+
+def _swap(primary_key: str) -> None:
+    """Copia os dados para stock_movements_new e a coloca no lugar da tabela atual."""
+    op.execute('INSERT INTO stock_movements_new SELECT * FROM stock_movements')
+    # A sequência pertence à coluna antiga: solta antes do DROP para não ir junto
+    op.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY NONE')
+    op.execute('DROP TABLE stock_movements')
+    op.execute('ALTER TABLE stock_movements_new RENAME TO stock_movements')
+    op.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY stock_movements.id')
+    # Chaves e índices depois da carga (mais rápido que mantê-los durante o INSERT)
+    op.execute(f'ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_pkey PRIMARY KEY ({primary_key})')
+    op.execute('ALTER TABLE stock_movements ADD CONSTRAINT stock_movements_product_id_fkey '
+               'FOREIGN KEY (product_id) REFERENCES products (id)')
+    for name, columns in INDEXES:
+        op.execute(f'CREATE INDEX {name} ON stock_movements ({", ".join(columns)})')
+
+
+def upgrade() -> None:
+    op.execute('UPDATE stock_movements SET "timestamp" = now() WHERE "timestamp" IS NULL')
+
+    op.execute('CREATE TABLE stock_movements_new (LIKE stock_movements INCLUDING DEFAULTS) '
+               'PARTITION BY RANGE ("timestamp")')
+    op.execute('CREATE TABLE stock_movements_default PARTITION OF stock_movements_new DEFAULT')
+    _swap('id, "timestamp"')
+
+
+def downgrade() -> None:
+    # Volta a uma tabela comum (as partições mensais e anuais saem junto com a particionada)
+    op.execute('CREATE TABLE stock_movements_new (LIKE stock_movements INCLUDING DEFAULTS)')
+    _swap('id')
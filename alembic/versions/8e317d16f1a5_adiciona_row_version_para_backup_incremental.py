@@ -0,0 +1,34 @@
+"""Adiciona row_version a cashier_sessions, sales, sale_items e stock_movements (backup incremental)
+
+Revision ID: 8e317d16f1a5
+Revises: b5940042b3cd
+Create Date: 2026-10-17 15:12:40.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e317d16f1a5'
+down_revision: Union[str, None] = 'b5940042b3cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROW_VERSION = sa.text("pg_current_xact_id()::text::bigint")
+TABLES = ['cashier_sessions', 'sales', 'sale_items', 'stock_movements']
+
+
+def upgrade() -> None:
+    # Linhas já existentes recebem a versão da transação da migração
+    for table in TABLES:
+        op.add_column(table, sa.Column('row_version', sa.BigInteger(), server_default=ROW_VERSION, nullable=False))
+        op.create_index(op.f(f'ix_{table}_row_version'), table, ['row_version'], unique=False)
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_index(op.f(f'ix_{table}_row_version'), table_name=table)
+        op.drop_column(table, 'row_version')
@@ -0,0 +1,55 @@
+"""Adiciona índices de busca de produtos (pg_trgm, unaccent e prefixo)
+
+Revision ID: 9f1a677b0f37
+Revises: 840eb8536826
+Create Date: 2026-10-17 19:02:48.631904
+
+Requer permissão para CREATE EXTENSION (pg_trgm e unaccent são "trusted" a
+partir do PostgreSQL 13). Os índices são criados com CONCURRENTLY.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f1a677b0f37'
+down_revision: Union[str, None] = '840eb8536826'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesmo SQL de app/search.py (SETUP_STATEMENTS), copiado: a migração não depende do código atual
+SETUP_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+]
+
+# (nome, colunas, opções)
+INDEXES = [
+    ('ix_products_name_prefix', [sa.text('f_unaccent(lower(name)) text_pattern_ops')], {}),
+    ('ix_products_name_trgm', [sa.text('f_unaccent(lower(name)) gin_trgm_ops')], {'postgresql_using': 'gin'}),
+    ('ix_products_category_trgm', [sa.text('f_unaccent(lower(category)) gin_trgm_ops')],
+     {'postgresql_using': 'gin'}),
+    ('ix_products_barcode_prefix', [sa.text('barcode varchar_pattern_ops')], {}),
+]
+
+
+def upgrade() -> None:
+    for statement in SETUP_STATEMENTS:
+        op.execute(statement)
+
+    with op.get_context().autocommit_block():
+        for name, columns, options in INDEXES:
+            op.create_index(name, 'products', columns, postgresql_concurrently=True, if_not_exists=True, **options)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products', postgresql_concurrently=True, if_exists=True)
+    # As extensões ficam (podem ser usadas por outros objetos do banco)
+    op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
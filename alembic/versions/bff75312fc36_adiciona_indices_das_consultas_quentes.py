@@ -0,0 +1,62 @@
+"""Adiciona índices compostos e parciais das consultas quentes (caixa, vendas, estoque)
+
+Revision ID: bff75312fc36
+Revises: 8e317d16f1a5
+Create Date: 2026-10-17 16:40:27.905143
+
+Os índices são criados com CONCURRENTLY (fora de transação) para não bloquear
+as vendas durante a migração em bancos grandes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bff75312fc36'
+down_revision: Union[str, None] = '8e317d16f1a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome, tabela, colunas, opções)
+INDEXES = [
+    ('ix_cashier_sessions_terminal_id_status', 'cashier_sessions', ['terminal_id', 'status'], {}),
+    ('uq_cashier_sessions_open_terminal', 'cashier_sessions', ['terminal_id'],
+     {'unique': True, 'postgresql_where': sa.text("status = 'open'")}),
+    ('ix_cashier_sessions_start_time', 'cashier_sessions', ['start_time'], {}),
+    ('ix_sales_session_id_status', 'sales', ['session_id', 'status'], {}),
+    ('ix_sales_timestamp_id', 'sales', ['timestamp', 'id'], {}),
+    ('ix_sale_items_sale_id', 'sale_items', ['sale_id'], {}),
+    ('ix_sale_items_product_id', 'sale_items', ['product_id'], {}),
+    ('ix_stock_movements_product_id_timestamp', 'stock_movements', ['product_id', 'timestamp'], {}),
+    ('ix_stock_movements_timestamp_id', 'stock_movements', ['timestamp', 'id'], {}),
+    ('ix_products_low_stock', 'products', ['id'],
+     {'postgresql_where': sa.text("stock_quantity < min_stock AND is_active")}),
+]
+
+
+def upgrade() -> None:
+    # Terminais com mais de um caixa aberto (estado que o índice único passa a impedir):
+    # mantém aberto só o mais recente de cada terminal
+    op.execute("""
+        UPDATE cashier_sessions SET status = 'closed', end_time = now()
+        WHERE status = 'open' AND id NOT IN (
+            SELECT max(id) FROM cashier_sessions WHERE status = 'open' GROUP BY terminal_id
+        )
+    """)
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **options)
+        # Substituído pelo índice composto (terminal_id, status)
+        op.drop_index('ix_cashier_sessions_terminal_id', table_name='cashier_sessions',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_cashier_sessions_terminal_id', 'cashier_sessions', ['terminal_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
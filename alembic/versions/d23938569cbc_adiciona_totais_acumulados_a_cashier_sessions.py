@@ -0,0 +1,53 @@
+"""Adiciona totais acumulados (total_sold, sale_count, payment_totals) a CashierSession
+
+Revision ID: d23938569cbc
+Revises: 74467806a933
+Create Date: 2026-10-17 12:41:27.550913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd23938569cbc'
+down_revision: Union[str, None] = '74467806a933'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('cashier_sessions', sa.Column('total_sold', sa.Float(), server_default='0', nullable=False))
+    op.add_column('cashier_sessions', sa.Column('sale_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('cashier_sessions', sa.Column('payment_totals', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False))
+
+    # Preenche os totais das sessões existentes a partir das vendas concluídas
+    op.execute("""
+        UPDATE cashier_sessions cs
+        SET total_sold = t.total_sold,
+            sale_count = t.sale_count,
+            payment_totals = t.payment_totals
+        FROM (
+            SELECT session_id,
+                   SUM(total) AS total_sold,
+                   SUM(qty) AS sale_count,
+                   jsonb_object_agg(payment_method, total) AS payment_totals
+            FROM (
+                SELECT session_id, payment_method, SUM(total_amount) AS total, COUNT(*) AS qty
+                FROM sales
+                WHERE status = 'COMPLETED'
+                GROUP BY session_id, payment_method
+            ) per_method
+            GROUP BY session_id
+        ) t
+        WHERE cs.id = t.session_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('cashier_sessions', 'payment_totals')
+    op.drop_column('cashier_sessions', 'sale_count')
+    op.drop_column('cashier_sessions', 'total_sold')
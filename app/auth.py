@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
@@ -5,7 +7,22 @@ from datetime import datetime, timedelta
 
 from app.config import settings
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Custos do Argon2 vêm do .env. Hashes gerados com outros parâmetros continuam
+# válidos e são refeitos no próximo login (ver check_password).
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# O Argon2 é caro de propósito (CPU e memória). Rodar no event loop trava todas as
+# requisições do worker durante o hash; o argon2-cffi libera o GIL, então um pool
+# de threads pequeno resolve e ainda limita a memória usada em picos de login.
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -16,6 +33,24 @@ def get_password_hash(password):
     # Vamos garantir que nunca passaremos mais que isso.
     return pwd_context.hash(password[:72])
 
+
+async def hash_password(password: str) -> str:
+    """get_password_hash fora do event loop (pool limitado)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifica a senha fora do event loop (pool limitado).
+    Retorna (válida, novo_hash); novo_hash vem preenchido quando o hash salvo usa
+    parâmetros antigos e deve ser substituído.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -0,0 +1,754 @@
+"""
+Exportação e restauração de backup em streaming.
+
+O banco é lido tabela a tabela com cursor do lado do servidor, em blocos de
+CHUNK_SIZE linhas, e gravado como NDJSON compacto comprimido com gzip. A memória
+usada fica limitada a um bloco, não importa o tamanho do banco.
+
+Formato atual (v3): um arquivo .tar com um segmento comprimido por tabela e um
+manifesto, que é o primeiro membro do arquivo:
+
+    manifest.json        versão, tipo, marcas d'água, revisão do alembic e, por
+                         tabela: linhas, colunas, segmento e SHA-256 do segmento
+    users.ndjson.gz      uma linha JSON por registro
+    products.ndjson.gz
+    ...
+
+As tabelas são lidas em paralelo (BACKUP_PARALLEL_DUMPS conexões), todas no
+mesmo snapshot (pg_export_snapshot / SET TRANSACTION SNAPSHOT), e a restauração
+confere os checksums de todos os segmentos antes de tocar no banco. Os formatos
+anteriores continuam restauráveis: NDJSON.gz único (v2) e JSON (v1).
+
+Cadeia de backups: um backup completo (base) seguido de incrementais. Cada
+backup guarda, por tabela, a marca d'água (watermark) do snapshot em que foi
+lido; o incremental seguinte contém só as linhas com row_version >= marca do
+anterior ("parent" no manifesto). A tabela users é pequena e sem versão de
+linha, então vai inteira em todo incremental. Para juntar uma cadeia em uma
+nova base (sem acessar o banco):
+
+    python -m app.backups compact [arquivo]
+
+A restauração lê o arquivo aos poucos (bloco a bloco), apaga as tabelas com um
+único TRUNCATE e insere cada bloco com COPY; os incrementais da cadeia são
+aplicados por UPSERT em seguida, tudo em uma única transação.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import uuid
+from datetime import datetime, date
+from itertools import groupby, islice
+from operator import itemgetter
+
+from sqlalchemy import select, text, bindparam, DateTime, Date, Enum, Uuid, Float
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app import models, rollups
+from app.config import settings
+from app.database import engine, backup_engine
+
+BACKUP_DIR = "backups"
+BACKUP_VERSION = "3.0"
+BACKUP_EXTENSIONS = (".tar", ".ndjson.gz", ".json")
+# backup_YYYYMMDD_HHMMSS[.delta].tar (e os formatos antigos): nada de caminho, só o nome
+BACKUP_NAME = re.compile(r"backup_[\w-]+(\.delta)?(\.tar|\.ndjson\.gz|\.json)")
+CHUNK_SIZE = 5000
+COMPRESS_LEVEL = 6
+GZIP_MAGIC = b"\x1f\x8b"
+MANIFEST_NAME = "manifest.json"
+
+# Ordem de inserção (Pais -> Filhos). A limpeza no restore usa a ordem inversa.
+# O nome "sessions" é mantido por compatibilidade com os backups JSON antigos.
+BACKUP_TABLES = [
+    ("users", models.User),
+    ("products", models.Product),
+    ("sessions", models.CashierSession),
+    ("sales", models.Sale),
+    ("sale_items", models.SaleItem),
+    ("stock_movements", models.StockMovement),
+    ("product_tombstones", models.ProductTombstone),
+]
+TABLE_ORDER = {name: position for position, (name, _) in enumerate(BACKUP_TABLES)}
+
+# Tabelas copiadas inteiras em todo incremental (sem row_version; exclusões físicas)
+FULL_TABLES = {"users"}
+
+# Marca d'água do snapshot: toda transação com id menor já terminou, então qualquer
+# linha gravada depois terá row_version >= este valor (mesma regra de /products/changes)
+SNAPSHOT_WATERMARK = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+ALEMBIC_REVISION = text(
+    "SELECT CASE WHEN to_regclass('alembic_version') IS NOT NULL "
+    "THEN (SELECT version_num FROM alembic_version LIMIT 1) END"
+)
+
+
+def json_serial(obj):
+    # JSON não suporta datetime/UUID nativamente
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    return str(obj)
+
+
+def dumps(obj) -> str:
+    return json.dumps(obj, default=json_serial, separators=(",", ":"))
+
+
+def _write_rows(fileobj, rows):
+    # Roda em thread: serialização + compressão não travam o event loop
+    fileobj.write("".join(dumps(dict(row._mapping)) + "\n" for row in rows))
+
+
+class BackupChainError(Exception):
+    pass
+
+
+class InvalidBackupError(Exception):
+    pass
+
+
+def is_backup_name(filename: str) -> bool:
+    """Nome de arquivo de backup válido (vindo da URL ou do cabeçalho de um upload)."""
+    return bool(filename) and BACKUP_NAME.fullmatch(filename) is not None
+
+
+def backup_files() -> list[str]:
+    if not os.path.exists(BACKUP_DIR):
+        return []
+    return [f for f in os.listdir(BACKUP_DIR) if is_backup_name(f)]
+
+
+def backup_filename(kind: str = "full") -> str:
+    suffix = ".delta.tar" if kind == "incremental" else ".tar"
+    return f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+
+
+def segment_name(name: str) -> str:
+    return f"{name}.ndjson.gz"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pack_archive(tmp_path: str, manifest: dict, segment_dir: str):
+    """Monta o .tar: manifesto (com os checksums dos segmentos) primeiro, depois os segmentos."""
+    for name, info in manifest["tables"].items():
+        path = os.path.join(segment_dir, info["segment"])
+        info["bytes"] = os.path.getsize(path)
+        info["sha256"] = _file_sha256(path)
+
+    data = json.dumps(manifest, indent=2).encode("utf-8")
+    with tarfile.open(tmp_path, "w") as tar:
+        member = tarfile.TarInfo(MANIFEST_NAME)
+        member.size = len(data)
+        member.mtime = int(datetime.now().timestamp())
+        tar.addfile(member, io.BytesIO(data))
+        for info in manifest["tables"].values():
+            tar.add(os.path.join(segment_dir, info["segment"]), arcname=info["segment"])
+
+
+async def _dump_table(name, model, snapshot_id, since, segment_dir, job=None) -> int:
+    """Grava o segmento de uma tabela, com conexão própria, no snapshot exportado pelo coordenador."""
+    table = model.__table__
+    path = os.path.join(segment_dir, segment_name(name))
+    rows_written = 0
+
+    fileobj = await asyncio.to_thread(gzip.open, path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL)
+    try:
+        async with backup_engine().connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with conn.begin():
+                # Precisa ser o primeiro comando da transação (não aceita parâmetro: id vem do próprio banco)
+                await conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+                # Ordenado pela PK: permite compactar a cadeia com merge em streaming
+                query = select(table).order_by(*table.primary_key.columns)
+                if since.get(name) is not None:
+                    query = query.where(table.c.row_version >= since[name])
+                result = await conn.stream(query, execution_options={"yield_per": CHUNK_SIZE})
+                async for rows in result.partitions(CHUNK_SIZE):
+                    await asyncio.to_thread(_write_rows, fileobj, rows)
+                    rows_written += len(rows)
+                    if job:
+                        job.progress(name, rows_written)
+    finally:
+        await asyncio.to_thread(fileobj.close)
+    return rows_written
+
+
+async def export_backup(filename: str, parent: dict | None = None, job=None, parallel: int | None = None) -> dict:
+    """
+    Gera o arquivo de backup em BACKUP_DIR e retorna a contagem de linhas por tabela.
+
+    Todas as tabelas são lidas no mesmo snapshot (REPEATABLE READ, somente leitura),
+    então o backup é consistente mesmo com vendas acontecendo. Até `parallel`
+    tabelas (padrão: BACKUP_PARALLEL_DUMPS) são lidas e comprimidas ao mesmo tempo.
+    Com `parent` (manifesto do backup anterior da cadeia, ver latest_chain_head)
+    gera um incremental com as linhas gravadas desde a marca d'água dele.
+
+    `job` (opcional, ver app/jobs.py) recebe o andamento: job.progress(tabela, linhas)
+    após cada bloco e job.set_phase(fase) nas etapas seguintes.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    final_path = os.path.join(BACKUP_DIR, filename)
+    tmp_path = final_path + ".tmp" # Só aparece na listagem depois de completo
+    segment_dir = final_path + ".segments"
+    since = parent["watermarks"] if parent else {}
+    semaphore = asyncio.Semaphore(parallel or settings.BACKUP_PARALLEL_DUMPS)
+
+    async def dump(name, model, snapshot_id):
+        async with semaphore:
+            return await _dump_table(name, model, snapshot_id, since, segment_dir, job)
+
+    try:
+        os.makedirs(segment_dir, exist_ok=True)
+        # Com réplica configurada, o backup lê dela (não disputa o pool das vendas)
+        async with backup_engine().connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with conn.begin():
+                # Primeira consulta da transação: fixa o snapshot usado em todas as tabelas
+                watermark = await conn.scalar(SNAPSHOT_WATERMARK)
+                if since and watermark < max(since.values()):
+                    # Marca d'água "do futuro": o banco foi restaurado/trocado depois do backup anterior
+                    raise BackupChainError("A cadeia de backups não corresponde a este banco. Gere um backup completo.")
+                revision = await conn.scalar(ALEMBIC_REVISION)
+                # As conexões de cada tabela importam este snapshot; a transação fica aberta até terminarem
+                snapshot_id = await conn.scalar(text("SELECT pg_export_snapshot()"))
+
+                tasks = [asyncio.create_task(dump(name, model, snapshot_id)) for name, model in BACKUP_TABLES]
+                try:
+                    counts = await asyncio.gather(*tasks)
+                except BaseException:
+                    # Uma tabela falhou (ou o job foi cancelado): interrompe as demais
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+
+        if job:
+            job.set_phase("empacotando")
+        manifest = {
+            "version": BACKUP_VERSION,
+            "timestamp": datetime.now().isoformat(),
+            "kind": "incremental" if parent else "full",
+            "parent": parent["filename"] if parent else None,
+            "watermarks": {name: watermark for name, _ in BACKUP_TABLES if name not in FULL_TABLES},
+            "alembic_revision": revision,
+            "tables": {
+                name: {
+                    "rows": rows,
+                    "segment": segment_name(name),
+                    "columns": [c.name for c in model.__table__.columns],
+                }
+                for (name, model), rows in zip(BACKUP_TABLES, counts)
+            },
+        }
+        await asyncio.to_thread(_pack_archive, tmp_path, manifest, segment_dir)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    return dict(zip((name for name, _ in BACKUP_TABLES), counts))
+
+
+class BackupReader:
+    """
+    Leitura de qualquer formato de backup: .tar segmentado (v3), NDJSON.gz (v2)
+    ou JSON (v1). `header` traz o manifesto/cabeçalho e rows(tabela) gera os
+    registros da tabela. No v2 o arquivo é lido uma única vez, então rows()
+    deve ser chamado na ordem de BACKUP_TABLES.
+
+    Não fecha `fileobj` (só o que abriu em BackupReader.open).
+    """
+
+    def __init__(self, fileobj, owned: bool = False):
+        self.fileobj = fileobj
+        self.owned = owned
+        self.tar = None
+        self.data = None
+        self.lines = None
+        try:
+            fileobj.seek(0)
+            start = fileobj.read(512)
+            fileobj.seek(0)
+            if start[257:262] == b"ustar":
+                self.tar = tarfile.open(fileobj=fileobj, mode="r:")
+                self.header = json.load(self.tar.extractfile(MANIFEST_NAME))
+            elif start.startswith(GZIP_MAGIC):
+                self.lines = io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj), encoding="utf-8")
+                self.header = json.loads(self.lines.readline()).get("__backup__", {})
+                self.sections = groupby(_iter_records(self.lines), key=itemgetter(0))
+                self.current = next(self.sections, None)
+            else:
+                self.header = None # JSON antigo: só carregado se for restaurado
+        except (OSError, EOFError, ValueError, KeyError, tarfile.TarError):
+            raise InvalidBackupError("Arquivo de backup inválido ou corrompido")
+        if self.header is None:
+            self.header = {"version": "1.0"}
+        self.header.setdefault("kind", "full")
+
+    @classmethod
+    def open(cls, path: str) -> "BackupReader":
+        fileobj = open(path, "rb")
+        try:
+            return cls(fileobj, owned=True)
+        except BaseException:
+            fileobj.close()
+            raise
+
+    def rows(self, name: str):
+        try:
+            if self.tar is not None:
+                info = self.header.get("tables", {}).get(name)
+                if info is None:
+                    return # Tabela não existia quando o backup foi gerado
+                segment = self.tar.extractfile(info["segment"])
+                for line in io.TextIOWrapper(gzip.GzipFile(fileobj=segment), encoding="utf-8"):
+                    yield json.loads(line)
+            elif self.lines is not None:
+                yield from self._stream_rows(name)
+            else:
+                if self.data is None:
+                    self.fileobj.seek(0)
+                    self.data = json.load(self.fileobj)
+                yield from self.data.get(name, [])
+        except (OSError, EOFError, ValueError, KeyError, tarfile.TarError):
+            raise InvalidBackupError("Arquivo de backup inválido ou corrompido")
+
+    def _stream_rows(self, name: str):
+        # v2: seções na ordem do arquivo; as que ficaram para trás são puladas
+        while self.current is not None and TABLE_ORDER.get(self.current[0], -1) < TABLE_ORDER[name]:
+            self.current = next(self.sections, None)
+        if self.current is None or self.current[0] != name:
+            return # Tabela sem linhas neste arquivo
+        for _, record in self.current[1]:
+            yield record
+        self.current = next(self.sections, None)
+
+    def expected_rows(self, name: str) -> int | None:
+        info = self.header.get("tables", {}).get(name)
+        return info["rows"] if info else None
+
+    def verify(self):
+        """Confere o SHA-256 de cada segmento com o manifesto (só v3; os anteriores não têm checksum)."""
+        if self.tar is None:
+            return
+        try:
+            for name, info in self.header.get("tables", {}).items():
+                digest = hashlib.sha256()
+                segment = self.tar.extractfile(info["segment"])
+                for block in iter(lambda: segment.read(1024 * 1024), b""):
+                    digest.update(block)
+                if digest.hexdigest() != info["sha256"]:
+                    raise InvalidBackupError(f"Backup corrompido: checksum inválido no segmento '{info['segment']}'")
+        except (OSError, KeyError, tarfile.TarError):
+            raise InvalidBackupError("Arquivo de backup inválido ou corrompido")
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+        if self.owned:
+            self.fileobj.close()
+
+
+def read_header(fileobj) -> dict:
+    """Manifesto/cabeçalho do backup (sem ler os dados). JSON antigo: backup completo v1.0."""
+    reader = BackupReader(fileobj)
+    reader.close()
+    fileobj.seek(0)
+    return reader.header
+
+
+def read_header_file(filename: str) -> dict:
+    reader = BackupReader.open(os.path.join(BACKUP_DIR, filename))
+    reader.close()
+    header = reader.header
+    header["filename"] = filename
+    return header
+
+
+def latest_chain_head() -> dict | None:
+    """Backup mais recente que pode servir de base para um incremental (tem marca d'água)."""
+    # Com o mesmo horário, "backup_X.tar" (base compactada) vem antes de "backup_X.delta.tar"
+    # na ordem reversa ("t" > "d"); o mesmo vale para os formatos antigos (.ndjson.gz)
+    for filename in sorted(backup_files(), reverse=True):
+        try:
+            header = read_header_file(filename)
+        except InvalidBackupError:
+            continue
+        if header.get("watermarks"):
+            return header
+    return None
+
+
+def resolve_chain(filename: str) -> list[str]:
+    """Arquivos da cadeia que termina em `filename`, da base completa até ele."""
+    chain = []
+    while filename:
+        if not is_backup_name(filename):
+            raise InvalidBackupError(f"Nome de arquivo de backup inválido: '{filename}'")
+        if filename in chain or not os.path.exists(os.path.join(BACKUP_DIR, filename)):
+            raise InvalidBackupError(f"Cadeia de backup incompleta: '{filename}' não encontrado")
+        chain.append(filename)
+        header = read_header_file(filename)
+        filename = header.get("parent") if header["kind"] == "incremental" else None
+    return chain[::-1]
+
+
+# Tabelas apagadas no restore (inclui as derivadas, que são recalculadas no final)
+RESTORE_TRUNCATE = [model.__tablename__ for _, model in BACKUP_TABLES] + [
+    models.DailySales.__tablename__,
+    models.DailyProductSales.__tablename__,
+    models.ProductSalesTotal.__tablename__,
+]
+
+# Colunas ignoradas no restore: row_version é regerada para os terminais
+# enxergarem todo o catálogo restaurado como alterado no próximo sync
+RESTORE_SKIP_COLUMNS = {"row_version"}
+
+
+def _iter_records(lines):
+    """Gera (tabela, registro) a partir das linhas NDJSON (ignora o cabeçalho)."""
+    current = None
+    try:
+        for line in lines:
+            record = json.loads(line)
+            if "__table__" in record:
+                current = record["__table__"]
+            elif "__backup__" in record:
+                continue
+            elif current is None:
+                raise InvalidBackupError("Arquivo de backup inválido ou corrompido")
+            else:
+                yield current, record
+    except (OSError, EOFError, ValueError):
+        raise InvalidBackupError("Arquivo de backup inválido ou corrompido")
+
+
+def _column_converter(column):
+    """Converte o valor do JSON para o tipo que o COPY (asyncpg) espera."""
+    column_type = column.type
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column_type, Date):
+        return date.fromisoformat
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        enum_class = column_type.enum_class
+        # O SQLAlchemy grava o NOME do enum no banco; o JSON traz o valor ("completed")
+        return lambda value: value if value in enum_class.__members__ else enum_class(value).name
+    if isinstance(column_type, Uuid):
+        return uuid.UUID
+    if isinstance(column_type, JSONB):
+        return json.dumps
+    if isinstance(column_type, Float):
+        return float
+    return None
+
+
+def _to_records(table, columns, rows):
+    converters = [_column_converter(table.c[name]) for name in columns]
+    records = []
+    for row in rows:
+        record = []
+        for name, convert in zip(columns, converters):
+            value = row.get(name)
+            record.append(convert(value) if value is not None and convert else value)
+        records.append(tuple(record))
+    return records
+
+
+def _upsert_sql(table, columns: list[str], source: str) -> str:
+    """INSERT ... SELECT da tabela temporária, atualizando as linhas que já existem (pela PK)."""
+    pk = [c.name for c in table.primary_key.columns]
+    names = ", ".join(f'"{c}"' for c in columns)
+    updates = [f'"{c}" = EXCLUDED."{c}"' for c in columns if c not in pk]
+    if "row_version" in table.c:
+        updates.append(f"row_version = {models.ROW_VERSION.text}")
+    action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+    return (
+        f'INSERT INTO {table.name} ({names}) SELECT {names} FROM {source} '
+        f'ON CONFLICT ({", ".join(pk)}) {action}'
+    )
+
+
+# Efeitos das exclusões registradas em um incremental (mesma limpeza de DELETE /products/{id})
+DELTA_DELETES = {
+    "product_tombstones": [
+        "DELETE FROM stock_movements WHERE product_id IN (SELECT product_id FROM {source})",
+        "DELETE FROM products WHERE id IN (SELECT product_id FROM {source})",
+    ],
+}
+
+
+def _next_batch(rows) -> list:
+    return list(islice(rows, CHUNK_SIZE))
+
+
+async def _load_file(conn, copy_conn, reader: BackupReader, incremental: bool, counts: dict, job=None):
+    """Carrega um arquivo da cadeia: COPY direto (base) ou COPY em tabela temporária + UPSERT (incremental)."""
+    for name, model in BACKUP_TABLES:
+        table = model.__table__
+        rows = reader.rows(name)
+        columns = None
+        loaded = 0
+        full_ids = []
+
+        while True:
+            # Leitura e parse do próximo bloco em thread (não trava o event loop)
+            batch = await asyncio.to_thread(_next_batch, rows)
+            if not batch:
+                break
+
+            # Colunas presentes no backup; as ausentes (backups antigos) ficam com o default
+            if columns is None:
+                columns = [c.name for c in table.columns if c.name in batch[0] and c.name not in RESTORE_SKIP_COLUMNS]
+                if incremental:
+                    await conn.execute(text(
+                        f"CREATE TEMP TABLE IF NOT EXISTS restore_{table.name} "
+                        f"(LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    ))
+            records = _to_records(table, columns, batch)
+
+            if not incremental:
+                await copy_conn.copy_records_to_table(table.name, records=records, columns=columns)
+            else:
+                source = f"restore_{table.name}"
+                await copy_conn.copy_records_to_table(source, records=records, columns=columns)
+                await conn.execute(text(_upsert_sql(table, columns, source)))
+                for statement in DELTA_DELETES.get(name, []):
+                    await conn.execute(text(statement.format(source=source)))
+                await conn.execute(text(f"TRUNCATE {source}"))
+                if name in FULL_TABLES:
+                    full_ids.extend(row["id"] for row in batch)
+
+            loaded += len(records)
+            counts[name] += len(records)
+            if job:
+                job.progress(name, counts[name])
+
+        expected = reader.expected_rows(name)
+        if expected is not None and loaded != expected:
+            raise InvalidBackupError(f"Backup incompleto: '{name}' tem {loaded} linhas, o manifesto indica {expected}")
+
+        # Tabelas copiadas inteiras: o que não veio no incremental foi excluído
+        if full_ids:
+            await conn.execute(
+                text(f"DELETE FROM {table.name} WHERE id <> ALL(:ids)").bindparams(bindparam("ids", full_ids))
+            )
+
+
+async def restore_chain(fileobjs: list, job=None) -> dict:
+    """
+    Substitui todo o conteúdo do banco pela cadeia de backups em `fileobjs`
+    (arquivos binários, da base completa até o último incremental).
+
+    Os checksums de todos os segmentos são conferidos antes de qualquer escrita.
+    Atômico: TRUNCATE, COPYs, UPSERTs dos incrementais, reset das sequências e
+    recálculo dos consolidados rodam na mesma transação; qualquer erro desfaz
+    tudo. `job`: andamento, como em export_backup.
+    """
+    readers = [BackupReader(fileobj) for fileobj in fileobjs]
+    try:
+        headers = [reader.header for reader in readers]
+        if headers[0]["kind"] != "full" or any(h["kind"] != "incremental" for h in headers[1:]):
+            raise InvalidBackupError("A cadeia deve ter um backup completo seguido apenas de incrementais")
+
+        if job:
+            job.set_phase("verificando checksums")
+        for reader in readers:
+            await asyncio.to_thread(reader.verify)
+
+        tables = [model.__table__ for _, model in BACKUP_TABLES]
+        counts = {name: 0 for name, _ in BACKUP_TABLES}
+
+        async with engine.begin() as conn:
+            revision = await conn.scalar(ALEMBIC_REVISION)
+            for header in headers:
+                if header.get("alembic_revision") and header["alembic_revision"] != revision:
+                    # Colunas diferentes são tratadas (ausentes ficam com o default; extras são ignoradas)
+                    print(f"Aviso: backup gerado na revisão {header['alembic_revision']}, banco na revisão {revision}")
+
+            await conn.execute(text(f"TRUNCATE {', '.join(RESTORE_TRUNCATE)}"))
+
+            raw = await conn.get_raw_connection()
+            copy_conn = raw.driver_connection
+
+            for position, reader in enumerate(readers):
+                await _load_file(conn, copy_conn, reader, position > 0, counts, job)
+
+            if job:
+                job.set_phase("sequências")
+            # Correção das sequências (id): próximo valor = MAX(id) + 1
+            for table in tables:
+                if "id" in table.c:
+                    await conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"
+                    ))
+
+            # Consolidados do dashboard são recalculados a partir das vendas restauradas
+            if job:
+                job.set_phase("consolidados")
+            await rollups.rebuild(conn)
+    finally:
+        for reader in readers:
+            reader.close()
+
+    return counts
+
+
+async def restore_backup(fileobj, job=None) -> dict:
+    """Restaura um único backup completo (ver restore_chain)."""
+    return await restore_chain([fileobj], job)
+
+
+# --- Compactação da cadeia ---
+
+def _merge_latest(streams, key_columns):
+    """
+    Merge de fluxos ordenados pela PK; na mesma PK vence o arquivo mais recente
+    (o último da lista). Memória constante: uma linha por arquivo.
+    """
+    keyed = [
+        ((tuple(row[c] for c in key_columns), position, row) for row in stream)
+        for position, stream in enumerate(streams)
+    ]
+    merged = heapq.merge(*keyed, key=itemgetter(0, 1))
+    for _, versions in groupby(merged, key=itemgetter(0)):
+        *_, latest = versions
+        yield latest[2]
+
+
+def compact_chain(filename: str, job=None) -> tuple[str, dict]:
+    """
+    Junta a cadeia que termina em `filename` em um novo backup completo, com a
+    mesma marca d'água (os próximos incrementais continuam a partir dele).
+    Não acessa o banco. Retorna (arquivo gerado, linhas por tabela).
+    `job`: andamento, como em export_backup (chamado na thread que compacta).
+    """
+    chain = resolve_chain(filename)
+    headers = [read_header_file(f) for f in chain]
+    if len(chain) == 1:
+        raise BackupChainError("O backup já é completo; não há incrementais para compactar")
+    if not headers[0].get("watermarks"):
+        raise BackupChainError("A base da cadeia não tem marca d'água (backup antigo)")
+
+    head = headers[-1]
+    output = filename.split(".")[0] + ".tar"
+    final_path = os.path.join(BACKUP_DIR, output)
+    tmp_path = final_path + ".tmp"
+    segment_dir = final_path + ".segments"
+    paths = [os.path.join(BACKUP_DIR, f) for f in chain]
+
+    # Produtos excluídos em algum incremental saem da base (com o histórico de estoque)
+    deleted = set()
+    for path in paths:
+        reader = BackupReader.open(path)
+        try:
+            deleted.update(row["product_id"] for row in reader.rows("product_tombstones"))
+        finally:
+            reader.close()
+
+    readers = []
+    counts = {}
+    try:
+        readers = [BackupReader.open(path) for path in paths]
+        os.makedirs(segment_dir, exist_ok=True)
+
+        for name, model in BACKUP_TABLES:
+            streams = [reader.rows(name) for reader in readers]
+            if name in FULL_TABLES:
+                # Copiada inteira em todo backup: vale a do mais recente
+                # (no v2, as seções dos outros arquivos são puladas no próximo rows())
+                rows = streams[-1]
+            else:
+                key_columns = [c.name for c in model.__table__.primary_key.columns]
+                rows = _merge_latest(streams, key_columns)
+
+            if name == "products":
+                rows = (row for row in rows if row["id"] not in deleted)
+            elif name == "stock_movements":
+                rows = (row for row in rows if row["product_id"] not in deleted)
+
+            counts[name] = 0
+            with gzip.open(os.path.join(segment_dir, segment_name(name)), "wt",
+                           encoding="utf-8", compresslevel=COMPRESS_LEVEL) as fileobj:
+                for row in rows:
+                    fileobj.write(dumps(row) + "\n")
+                    counts[name] += 1
+                    if job and counts[name] % CHUNK_SIZE == 0:
+                        job.progress(name, counts[name])
+            if job:
+                job.progress(name, counts[name])
+
+        manifest = {
+            "version": BACKUP_VERSION,
+            "timestamp": head["timestamp"],
+            "kind": "full",
+            "parent": None,
+            "watermarks": head["watermarks"],
+            "alembic_revision": head.get("alembic_revision"),
+            "compacted_from": chain,
+            "tables": {
+                name: {
+                    "rows": counts[name],
+                    "segment": segment_name(name),
+                    "columns": [c.name for c in model.__table__.columns],
+                }
+                for name, model in BACKUP_TABLES
+            },
+        }
+        _pack_archive(tmp_path, manifest, segment_dir)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        for reader in readers:
+            reader.close()
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    return output, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ferramentas de backup")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="Junta uma cadeia de incrementais em um novo backup completo")
+    compact.add_argument("filename", nargs="?", help="Último backup da cadeia (padrão: o mais recente)")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        filename = args.filename
+        if filename is None:
+            head = latest_chain_head()
+            if head is None:
+                parser.error("Nenhum backup com marca d'água encontrado")
+            filename = head["filename"]
+        output, counts = compact_chain(filename)
+        print(f"Backup completo gerado: {output}")
+        for name, rows in counts.items():
+            print(f"  {name}: {rows}")
+
+
+if __name__ == "__main__":
+    main()
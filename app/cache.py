@@ -0,0 +1,198 @@
+"""
+Utilitários de cache em memória (por processo/worker).
+
+- TTLCache: dicionário LRU limitado por tamanho, com expiração por item e
+  contadores de acerto/erro.
+- SingleFlight: garante que, para uma mesma chave, só uma carga esteja em
+  andamento; requisições simultâneas aguardam o mesmo resultado.
+- ResponseCache: cache de respostas de relatórios com TTL, single-flight,
+  stale-while-revalidate e invalidação explícita.
+
+Cada worker do uvicorn tem seu próprio cache, por isso o TTL limita por quanto
+tempo um worker pode enxergar um dado alterado por outro.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict = {}
+
+    async def do(self, key, loader):
+        """Executa `loader()` uma única vez por chave enquanto houver chamada em andamento."""
+        task = self._inflight.get(key)
+        if task is None:
+            # Task própria: se a requisição que iniciou a carga for cancelada,
+            # as demais que estão aguardando não são afetadas
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+
+# Todos os ResponseCache criados, por nome (para invalidação e estatísticas)
+report_caches: dict = {}
+
+
+def invalidate_reports():
+    """Marca todos os relatórios em cache como desatualizados (vendas/estoque mudaram)."""
+    for cache in report_caches.values():
+        cache.invalidate()
+
+
+class ResponseCache:
+    """
+    Cache de respostas calculadas (ex: dashboard).
+
+    - Dentro do `ttl` a resposta é servida direto da memória.
+    - Depois do `ttl`, e por até `stale_ttl` segundos, a resposta antiga ainda é
+      servida enquanto um único recálculo roda em segundo plano.
+    - Após `invalidate()` (ex: nova venda), a resposta antiga NUNCA é servida: a
+      próxima requisição aguarda o recálculo.
+    - Sem resposta utilizável, requisições simultâneas aguardam um único cálculo
+      (por geração: quem chega depois da invalidação não recebe um cálculo iniciado antes dela).
+
+    `compute` deve abrir a própria sessão de banco: ele pode rodar em segundo plano,
+    depois que a requisição que o disparou já terminou.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float, maxsize: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.computations = 0
+        self.compute_errors = 0
+        self.compute_seconds = 0.0
+        self.last_compute_ms = None
+        self._entries = OrderedDict() # chave -> (valor, calculado_em, geração)
+        self._generation = 0
+        self._flight = SingleFlight()
+        self._background = set()
+        report_caches[name] = self
+
+    async def get(self, key, compute):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, computed_at, generation = entry
+            age = time.monotonic() - computed_at
+            if generation == self._generation:
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+                # Só expirou pelo tempo: serve a antiga e recalcula em segundo plano
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._refresh_in_background(key, compute)
+                    return value
+
+        self.misses += 1
+        return await self._flight.do((key, self._generation), lambda: self._compute(key, compute))
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._generation += 1
+        elif key in self._entries:
+            value, computed_at, _ = self._entries[key]
+            self._entries[key] = (value, computed_at, self._generation - 1)
+
+    def stats(self) -> dict:
+        served = self.hits + self.stale_hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / served, 4) if served else 0.0,
+            "computations": self.computations,
+            "compute_errors": self.compute_errors,
+            "avg_compute_ms": round(self.compute_seconds * 1000 / self.computations, 2) if self.computations else None,
+            "last_compute_ms": self.last_compute_ms
+        }
+
+    async def _compute(self, key, compute):
+        # Guarda a geração do início: se houver invalidação durante o cálculo,
+        # o resultado já nasce desatualizado
+        generation = self._generation
+        start = time.perf_counter()
+        try:
+            value = await compute()
+        except Exception:
+            self.compute_errors += 1
+            raise
+        elapsed = time.perf_counter() - start
+
+        self.computations += 1
+        self.compute_seconds += elapsed
+        self.last_compute_ms = round(elapsed * 1000, 2)
+
+        self._entries[key] = (value, time.monotonic(), generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def _refresh_in_background(self, key, compute):
+        async def refresh():
+            try:
+                await self._flight.do((key, self._generation), lambda: self._compute(key, compute))
+            except Exception as e:
+                print(f"Erro ao recalcular o relatório '{self.name}': {e}")
+
+        task = asyncio.ensure_future(refresh())
+        # Mantém referência até terminar (evita a task ser coletada no meio)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
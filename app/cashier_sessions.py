@@ -0,0 +1,100 @@
+"""
+Sessões de caixa abertas e seus totais acumulados.
+
+O mapeamento terminal -> sessão aberta fica em memória; como outro worker pode
+fechar o caixa, toda gravação de venda confirma no próprio UPDATE dos totais
+(`WHERE status = 'open'`) que a sessão continua aberta.
+"""
+from sqlalchemy import select, update, func, literal, Float, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+from app import models
+from app.cache import TTLCache
+
+# terminal_id -> id da sessão aberta
+open_session_cache = TTLCache(maxsize=1000, ttl=600)
+
+
+def remember_session(terminal_id: str, session_id: int):
+    open_session_cache.set(terminal_id, session_id)
+
+
+def forget_terminal(terminal_id: str):
+    open_session_cache.invalidate(terminal_id)
+
+
+async def find_open_session_id(db: AsyncSession, terminal_id: str) -> int | None:
+    session_id = open_session_cache.get(terminal_id)
+    if session_id is None:
+        session_id = await db.scalar(select(models.CashierSession.id).where(
+            models.CashierSession.terminal_id == terminal_id,
+            models.CashierSession.status == "open"
+        ))
+        if session_id is not None:
+            remember_session(terminal_id, session_id)
+    return session_id
+
+
+async def get_open_session(db: AsyncSession, terminal_id: str) -> models.CashierSession | None:
+    session_id = open_session_cache.get(terminal_id)
+    if session_id is not None:
+        # Busca pela chave primária e confere se ainda está aberta
+        session = await db.get(models.CashierSession, session_id)
+        if session is not None and session.status == "open":
+            return session
+        forget_terminal(terminal_id)
+
+    result = await db.execute(select(models.CashierSession).where(
+        models.CashierSession.terminal_id == terminal_id,
+        models.CashierSession.status == "open"
+    ))
+    session = result.scalars().first()
+    if session is not None:
+        remember_session(terminal_id, session.id)
+    return session
+
+
+async def register_sales(db: AsyncSession, terminal_id: str, payment_totals: dict[str, float], sale_count: int) -> int | None:
+    """
+    Soma as vendas aos totais da sessão aberta do terminal (mesma transação da venda).
+
+    `payment_totals` é {forma de pagamento: valor}. Retorna o id da sessão usada,
+    ou None se o terminal não tem caixa aberto.
+    """
+    session_id = await find_open_session_id(db, terminal_id)
+    if session_id is not None and await add_to_totals(db, session_id, payment_totals, sale_count):
+        return session_id
+
+    # Cache desatualizado (caixa fechado/reaberto em outro worker): consulta o banco
+    forget_terminal(terminal_id)
+    session_id = await find_open_session_id(db, terminal_id)
+    if session_id is not None and await add_to_totals(db, session_id, payment_totals, sale_count):
+        return session_id
+    return None
+
+
+async def add_to_totals(db: AsyncSession, session_id: int, payment_totals: dict[str, float], sale_count: int) -> bool:
+    totals = models.CashierSession.payment_totals
+    for method, amount in payment_totals.items():
+        current = func.coalesce(models.CashierSession.payment_totals[method].astext.cast(Float), 0.0)
+        totals = totals.op("||", return_type=JSONB)(
+            func.jsonb_build_object(literal(method, String), current + amount)
+        )
+
+    stmt = (
+        update(models.CashierSession)
+        .where(
+            models.CashierSession.id == session_id,
+            models.CashierSession.status == "open"
+        )
+        .values(
+            total_sold=models.CashierSession.total_sold + sum(payment_totals.values()),
+            sale_count=models.CashierSession.sale_count + sale_count,
+            payment_totals=totals
+        )
+        .returning(models.CashierSession.id)
+        .execution_options(synchronize_session=False)
+    )
+    return (await db.execute(stmt)).scalar() is not None
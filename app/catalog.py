@@ -0,0 +1,80 @@
+"""
+Índice em memória código de barras -> produto, usado na leitura do scanner.
+
+É aquecido na inicialização, invalidado pelas rotas de cadastro/edição/exclusão
+e protegido por single-flight: uma rajada de leituras do mesmo item novo gera
+só uma consulta ao banco. Guarda apenas dados de cadastro (sem estoque), que
+mudam raramente, e só de produtos ativos (inativo não passa no caixa: 404).
+
+Cada invalidação muda a geração do índice: uma carga que começou antes dela
+não grava o resultado (que pode ser o cadastro antigo ou um produto já
+excluído), e quem chega depois não aguarda essa carga.
+"""
+from sqlalchemy import select
+
+
+from app import models, schemas
+from app.cache import TTLCache, SingleFlight
+from app.config import settings
+from app.database import SessionLocal
+
+barcode_cache = TTLCache(maxsize=settings.BARCODE_CACHE_SIZE, ttl=settings.BARCODE_CACHE_TTL)
+_barcode_flight = SingleFlight()
+_generation = 0
+
+
+def _to_entry(product: models.Product) -> dict:
+    return schemas.ProductScanResponse.model_validate(product).model_dump()
+
+
+def _active_products():
+    return select(models.Product).where(models.Product.is_active == True)
+
+
+async def warm_barcode_cache():
+    """Carrega os produtos ativos com código de barras (até o limite do cache)."""
+    generation = _generation
+    async with SessionLocal() as db:
+        result = await db.execute(
+            _active_products().where(models.Product.barcode.is_not(None)).limit(settings.BARCODE_CACHE_SIZE)
+        )
+        products = result.scalars().all()
+    if generation == _generation:
+        for product in products:
+            barcode_cache.set(product.barcode, _to_entry(product))
+    return len(barcode_cache)
+
+
+async def lookup_barcode(barcode: str) -> dict | None:
+    entry = barcode_cache.get(barcode)
+    if entry is not None:
+        return entry
+    return await _barcode_flight.do((barcode, _generation), lambda: _load_barcode(barcode))
+
+
+async def _load_barcode(barcode: str) -> dict | None:
+    generation = _generation
+    async with SessionLocal() as db:
+        result = await db.execute(_active_products().where(models.Product.barcode == barcode))
+        product = result.scalars().first()
+    if product is None:
+        # Não guardamos "não encontrado": o produto pode ser cadastrado em outro worker a qualquer momento
+        return None
+    entry = _to_entry(product)
+    if generation == _generation:
+        barcode_cache.set(barcode, entry)
+    return entry
+
+
+def invalidate_barcode(*barcodes: str | None):
+    global _generation
+    _generation += 1
+    for barcode in barcodes:
+        if barcode:
+            barcode_cache.invalidate(barcode)
+
+
+def clear_barcode_cache():
+    global _generation
+    _generation += 1
+    barcode_cache.clear()
@@ -6,6 +6,59 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 12 # 12 horas (turno de trabalho)
     URL_FRONTEND: str
+    STORE_TIMEZONE: str = "America/Sao_Paulo" # Define o "dia" dos relatórios
+
+    # Pool de conexões do primário (por worker). Padrões = os do SQLAlchemy
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10 # Conexões extras além do pool em picos
+    DB_POOL_TIMEOUT: float = 30 # Segundos esperando uma conexão livre
+    DB_POOL_RECYCLE: int = -1 # Reabre conexões mais velhas que isso (segundos; -1 = nunca)
+    DB_POOL_PRE_PING: bool = False # Testa a conexão antes de usar (após queda do banco/firewall)
+    # Conexão via PgBouncer (modo transaction): sem pool local e sem cache de prepared statements.
+    # Desliga o advisory lock entre workers dos jobs de backup/restauração (ver app/jobs.py)
+    DB_PGBOUNCER: bool = False
+
+    # Réplicas de leitura (JSON, ex: ["postgresql+asyncpg://...@replica1/pdv"]).
+    # Dashboard, históricos e backup leem delas; vazio = tudo no primário
+    DATABASE_REPLICA_URLS: list[str] = []
+    DB_REPLICA_POOL_SIZE: int = 5
+    DB_REPLICA_MAX_OVERFLOW: int = 10
+
+    # Cache de código de barras (por worker)
+    BARCODE_CACHE_SIZE: int = 200_000
+    BARCODE_CACHE_TTL: int = 300 # segundos
+
+    # Cache de usuários autenticados (por worker). Inativação, troca de perfil ou de
+    # senha chegam aos outros workers por LISTEN/NOTIFY (app/invalidation.py); o TTL
+    # só limita a memória. Desligado com DB_PGBOUNCER (sem LISTEN)
+    USER_CACHE_SIZE: int = 1000
+    USER_CACHE_TTL: int = 30 # segundos
+
+    # Cache de relatórios: TTL por rota (segundos) e quanto tempo a resposta antiga
+    # ainda pode ser servida enquanto é recalculada em segundo plano
+    REPORT_CACHE_TTL: dict[str, float] = {"dashboard": 15}
+    REPORT_CACHE_STALE_TTL: float = 60
+
+    # Hash de senha (Argon2): custo e threads dedicadas (por worker).
+    # Ao mudar os custos, as senhas são refeitas no próximo login de cada usuário.
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536 # KiB (64 MiB por hash em andamento)
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # Backup: tabelas lidas/comprimidas ao mesmo tempo (cada uma usa uma conexão do pool)
+    BACKUP_PARALLEL_DUMPS: int = 4
+
+    # Partições mensais de stock_movements (python -m app.partitions): meses criados
+    # à frente, idade a partir da qual os meses viram partições anuais e o tablespace delas
+    PARTITION_MONTHS_AHEAD: int = 3
+    ARCHIVE_AFTER_MONTHS: int = 12
+    ARCHIVE_TABLESPACE: str | None = None
+
+    # Métricas no formato do Prometheus em GET /metrics (por worker).
+    # Com METRICS_TOKEN, o scrape precisa enviar "Authorization: Bearer <token>"
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str | None = None
     
     class Config:
         env_file = ".env"
@@ -1,18 +1,75 @@
+import itertools
+import uuid
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 
 
 from app.config import settings
 
+
+def _engine_options(pool_size: int, max_overflow: int) -> dict:
+    if settings.DB_PGBOUNCER:
+        # PgBouncer (modo transaction) já faz o pool e troca a conexão do servidor a cada
+        # transação: sem pool local e sem cache de prepared statements (o nome de um
+        # statement preparado em uma conexão do servidor não existe nas outras)
+        return {
+            "poolclass": NullPool,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+            "connect_args": {
+                "statement_cache_size": 0, # cache do asyncpg
+                "prepared_statement_cache_size": 0, # cache do SQLAlchemy
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            },
+        }
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
 # O driver deve ser postgresql+asyncpg://...
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+engine = create_async_engine(
+    settings.DATABASE_URL, echo=False, **_engine_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+)
+
+# Réplicas de leitura (opcionais): relatórios, históricos e backup não disputam o pool das vendas
+replica_engines = [
+    create_async_engine(
+        url, echo=False, **_engine_options(settings.DB_REPLICA_POOL_SIZE, settings.DB_REPLICA_MAX_OVERFLOW)
+    )
+    for url in settings.DATABASE_REPLICA_URLS
+]
 
 SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+_replica_sessions = itertools.cycle(
+    [async_sessionmaker(bind=replica, class_=AsyncSession, expire_on_commit=False) for replica in replica_engines]
+    or [SessionLocal]
+)
+
 class Base(DeclarativeBase):
     pass
 
+def ReadSessionLocal() -> AsyncSession:
+    """Sessão somente leitura: alterna entre as réplicas (ou usa o primário, se não houver)."""
+    return next(_replica_sessions)()
+
+def backup_engine():
+    """Engine do backup: sempre a mesma réplica (a marca d'água da cadeia não pode voltar no tempo)."""
+    return replica_engines[0] if replica_engines else engine
+
 # Dependência para injetar a sessão nas rotas
 async def get_db():
     async with SessionLocal() as db:
-        yield db
\ No newline at end of file
+        yield db
+
+# Rotas só de leitura (relatórios, históricos). A réplica pode estar alguns
+# instantes atrás do primário: não use em rotas que leem o que acabaram de gravar.
+async def get_read_db():
+    async with ReadSessionLocal() as db:
+        yield db
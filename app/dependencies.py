@@ -8,9 +8,34 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.config import settings
 from app.models import User, UserRole
+from app.cache import TTLCache
+from app import invalidation
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Usuários autenticados por username. Só vale se a versão da credencial bater com a do token.
+# Evita um SELECT em users a cada requisição (ex: /cashier/status, consultado o tempo todo).
+# Alterações chegam a todos os workers por LISTEN/NOTIFY (app/invalidation.py); sem a
+# escuta ativa o cache não é usado.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+# Muda a cada invalidação: uma consulta iniciada antes dela não volta para o cache
+_user_cache_generation = 0
+
+def invalidate_user(username: str | None = None):
+    """Remove o usuário (ou todos, com None) do cache deste worker."""
+    global _user_cache_generation
+    _user_cache_generation += 1
+    if username is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(username)
+
+invalidation.register("user", invalidate_user)
+
+async def publish_user_change(db, username: str | None = None):
+    """Invalida o usuário em todos os workers no commit de `db`. Chamar antes do commit da alteração."""
+    await invalidation.publish(db, "user", username)
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,17 +45,29 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
+        # Tokens emitidos antes da versão de credencial existir valem como versão 1
+        token_version: int = payload.get("ver", 1)
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    user = user_cache.get(username)
+    if user is not None and user.credential_version == token_version:
+        return user
     
     # Busca o usuário no banco
+    generation = _user_cache_generation
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalars().first()
     
-    if user is None:
+    if user is None or not user.is_active or user.credential_version != token_version:
         raise credentials_exception
+
+    # Desanexa da sessão: o objeto é compartilhado (somente leitura) entre requisições
+    db.expunge(user)
+    if invalidation.is_listening() and generation == _user_cache_generation:
+        user_cache.set(username, user)
     return user
 
 class RoleChecker:
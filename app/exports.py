@@ -0,0 +1,197 @@
+"""
+Exportações para a contabilidade (CSV e XLSX) em streaming.
+
+As linhas vêm do banco em blocos de CHUNK_SIZE por um cursor no servidor e cada
+bloco é formatado e enviado ao cliente assim que chega: a memória fica constante
+e o download começa na hora, mesmo para um ano de vendas.
+
+- CSV: UTF-8 com BOM (o Excel reconhece os acentos). Com separador ";" (padrão,
+  Excel em português) os decimais usam vírgula; com "," usam ponto.
+- XLSX: planilha mínima escrita à mão (sem dependência extra), comprimida em
+  streaming. Passando do limite de linhas do Excel, continua em outra aba.
+"""
+import asyncio
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from enum import Enum
+from xml.sax.saxutils import escape
+
+from app.database import ReadSessionLocal
+from app.rollups import STORE_TZ
+
+CHUNK_SIZE = 5000
+XLSX_MAX_ROWS = 1_048_576 # Limite do Excel por aba (inclui o cabeçalho)
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Caracteres de controle não são aceitos em XML
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+async def stream_rows(query):
+    """Blocos de linhas da consulta, lidos da réplica (se houver) por cursor no servidor."""
+    async with ReadSessionLocal() as db:
+        result = await db.stream(query, execution_options={"yield_per": CHUNK_SIZE})
+        async for rows in result.partitions(CHUNK_SIZE):
+            yield rows
+
+
+def _plain(value):
+    """Valor do banco -> texto/número da planilha (datas no fuso da loja)."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.astimezone(STORE_TZ).strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value) # UUID etc.
+
+
+# --- CSV ---
+
+def _csv_value(value, decimal: str):
+    value = _plain(value)
+    if isinstance(value, float):
+        # ".15g" evita artefatos de ponto flutuante (0.30000000000000004)
+        return format(value, ".15g").replace(".", decimal)
+    return value
+
+
+async def csv_chunks(header: list[str], batches, sep: str = ";"):
+    decimal = "," if sep == ";" else "."
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=sep, lineterminator="\r\n")
+    buffer.write("\ufeff") # BOM
+    writer.writerow(header)
+    yield buffer.getvalue().encode("utf-8")
+
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value, decimal) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+# --- XLSX ---
+
+_NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def _xlsx_cell(value) -> str:
+    value = _plain(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value!r}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(row) -> bytes:
+    return ("<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>").encode("utf-8")
+
+
+def _xlsx_parts(n_sheets: int) -> dict[str, str]:
+    """Arquivos fixos do pacote (gravados no fim, quando já se sabe quantas abas há)."""
+    sheets = range(1, n_sheets + 1)
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in sheets
+    )
+    return {
+        "[Content_Types].xml": (
+            f'{_XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{overrides}</Types>'
+        ),
+        "_rels/.rels": (
+            f'{_XML_DECL}<Relationships xmlns="{_NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'{_XML_DECL}<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>'
+            + "".join(f'<sheet name="Dados {i}" sheetId="{i}" r:id="rId{i}"/>' for i in sheets)
+            + '</sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'{_XML_DECL}<Relationships xmlns="{_NS_PKG_REL}">'
+            + "".join(f'<Relationship Id="rId{i}" Type="{_NS_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                      for i in sheets)
+            + '</Relationships>'
+        ),
+    }
+
+
+class _Sink:
+    """Destino do zip: acumula os bytes comprimidos até o gerador repassá-los ao cliente."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def xlsx_chunks(header: list[str], batches):
+    sink = _Sink()
+    # Sem seek: o zipfile grava os tamanhos depois de cada arquivo (data descriptor)
+    archive = zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED)
+    state = {"sheets": 0, "rows": 0, "sheet": None}
+
+    def close_sheet():
+        state["sheet"].write(b"</sheetData></worksheet>")
+        state["sheet"].close()
+
+    def new_sheet():
+        if state["sheet"]:
+            close_sheet()
+        state["sheets"] += 1
+        state["sheet"] = archive.open(f"xl/worksheets/sheet{state['sheets']}.xml", "w", force_zip64=True)
+        state["sheet"].write(f'{_XML_DECL}<worksheet xmlns="{_NS_MAIN}"><sheetData>'.encode("utf-8"))
+        state["sheet"].write(_xlsx_row(header))
+        state["rows"] = 1
+
+    def write_rows(rows):
+        for row in rows:
+            if state["rows"] >= XLSX_MAX_ROWS:
+                new_sheet()
+            state["sheet"].write(_xlsx_row(row))
+            state["rows"] += 1
+
+    def finish():
+        close_sheet()
+        for name, content in _xlsx_parts(state["sheets"]).items():
+            archive.writestr(name, content)
+        archive.close()
+
+    new_sheet() # Mesmo sem nenhuma linha, o arquivo sai com o cabeçalho
+    async for rows in batches:
+        # Compressão fora do event loop (os caixas continuam sendo atendidos)
+        await asyncio.to_thread(write_rows, rows)
+        data = sink.take()
+        if data:
+            yield data
+
+    await asyncio.to_thread(finish)
+    yield sink.take()
@@ -0,0 +1,108 @@
+"""
+Invalidação de caches em memória entre workers (LISTEN/NOTIFY do PostgreSQL).
+
+Quem altera um dado em cache publica o aviso na MESMA transação da alteração
+(publish): o PostgreSQL só entrega o NOTIFY no commit, e não entrega se houver
+rollback. Cada worker mantém uma conexão própria escutando o canal e repassa o
+aviso ao cache registrado para aquele tipo (register).
+
+Um worker só pode confiar no próprio cache enquanto está escutando
+(is_listening): ao conectar e ao perder a conexão, todos os caches registrados
+são esvaziados (avisos podem ter se perdido nesse meio tempo). Atrás do
+PgBouncer em modo transaction o LISTEN não funciona: a escuta não é iniciada e
+os caches que dependem dela ficam desligados.
+"""
+import asyncio
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+CHANNEL = "pdv_cache_invalidation"
+RETRY_INTERVAL = 5.0 # segundos até tentar reconectar
+CHECK_INTERVAL = 10.0 # segundos entre os testes da conexão (queda sem aviso de rede)
+
+# Só para a escuta: uma conexão por worker, fora do pool das vendas e sem transação
+_listen_engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+
+# tipo -> função(chave); chave None = esvaziar tudo
+_handlers: dict[str, Callable[[str | None], None]] = {}
+_listening = False
+_task: asyncio.Task | None = None
+
+
+def register(kind: str, handler: Callable[[str | None], None]):
+    _handlers[kind] = handler
+
+
+def is_listening() -> bool:
+    return _listening
+
+
+async def publish(db, kind: str, key: str | None = None):
+    """Avisa todos os workers (inclusive este) no commit da transação de `db` (sessão ou conexão)."""
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": f"{kind}:{key or ''}"})
+
+
+def _dispatch(payload: str):
+    kind, _, key = payload.partition(":")
+    handler = _handlers.get(kind)
+    if handler:
+        handler(key or None)
+
+
+def _drop_all():
+    for handler in _handlers.values():
+        handler(None)
+
+
+async def _listen():
+    global _listening
+    while True:
+        try:
+            async with _listen_engine.connect() as conn:
+                raw = (await conn.get_raw_connection()).driver_connection
+                closed = asyncio.Event()
+                raw.add_termination_listener(lambda _: closed.set())
+                await raw.add_listener(CHANNEL, lambda _conn, _pid, _channel, payload: _dispatch(payload))
+                # Avisos perdidos antes da escuta começar: recomeça com os caches vazios
+                _drop_all()
+                _listening = True
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), CHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(raw.fetchval("SELECT 1"), CHECK_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Escuta de invalidação de cache interrompida: {e}")
+        finally:
+            if _listening:
+                _listening = False
+                _drop_all()
+        await asyncio.sleep(RETRY_INTERVAL)
+
+
+def start():
+    global _task
+    if settings.DB_PGBOUNCER:
+        print("PgBouncer: sem LISTEN/NOTIFY, o cache de usuários fica desligado")
+        return
+    if _task is None:
+        _task = asyncio.ensure_future(_listen())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await _listen_engine.dispose()
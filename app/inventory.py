@@ -0,0 +1,148 @@
+"""
+Camada de movimentação de estoque.
+
+Toda alteração de `Product.stock_quantity` (vendas e reposições) passa por aqui.
+Cada alteração é um único UPDATE condicional (`WHERE stock_quantity >= :q`) com
+RETURNING, então o banco decide de forma atômica se há saldo: dois terminais
+vendendo o mesmo item nunca perdem atualização nem deixam o estoque negativo.
+Antes do UPDATE, as linhas do carrinho são travadas em ordem de id (SELECT ...
+ORDER BY id FOR UPDATE), o que evita deadlock entre carrinhos com os mesmos
+produtos em ordens diferentes.
+"""
+from sqlalchemy import select, update, insert, values, column, Integer, Float, Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+from app import models, schemas
+
+
+class ProductNotFoundError(Exception):
+    def __init__(self, product_id: int):
+        self.product_id = product_id
+        super().__init__(f"Produto ID {product_id} não encontrado")
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, shortages: list[schemas.StockShortage]):
+        self.shortages = shortages
+        super().__init__("; ".join(
+            f"Estoque insuficiente para '{s.name}'. Disponível: {s.available}" for s in shortages
+        ))
+
+
+async def remove_stock(db: AsyncSession, quantities: dict[int, float], lock: bool = True) -> dict[int, Row]:
+    """
+    Baixa o estoque de vários produtos em um único UPDATE ... FROM (VALUES ...).
+
+    Retorna {product_id: linha atualizada (id, name, price, is_weighted, stock_quantity)}.
+    Se qualquer produto não existir ou não tiver saldo, nada é aplicado pelo chamador
+    (deve dar rollback) e a exceção traz a falta de cada linha.
+    `lock=False` quando o chamador já travou os produtos (lock_products).
+    """
+    if not quantities:
+        return {}
+
+    if lock:
+        # A ordem em que o UPDATE ... FROM (VALUES) trava as linhas depende do plano
+        # (hash/merge join), não da lista: a trava em ordem de id vem antes, em separado
+        await db.execute(
+            select(models.Product.id)
+            .where(models.Product.id.in_(quantities))
+            .order_by(models.Product.id)
+            .with_for_update()
+        )
+
+    requested = values(
+        column("id", Integer), column("qty", Float), name="requested"
+    ).data(sorted(quantities.items()))
+
+    stmt = (
+        update(models.Product)
+        .where(
+            models.Product.id == requested.c.id,
+            models.Product.stock_quantity >= requested.c.qty
+        )
+        .values(stock_quantity=models.Product.stock_quantity - requested.c.qty)
+        .returning(
+            models.Product.id,
+            models.Product.name,
+            models.Product.price,
+            models.Product.is_weighted,
+            models.Product.stock_quantity
+        )
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    updated = {row.id: row for row in result}
+
+    missing = [product_id for product_id in quantities if product_id not in updated]
+    if missing:
+        await _raise_shortages(db, {product_id: quantities[product_id] for product_id in missing})
+
+    return updated
+
+
+async def lock_products(db: AsyncSession, product_ids) -> dict[int, Row]:
+    """
+    Trava (FOR UPDATE) e devolve os produtos informados em uma única consulta.
+
+    Usado quando o chamador precisa decidir em memória, antes de baixar o estoque,
+    quais vendas cabem no saldo (ex: envio em lote). Ordenado por id para evitar deadlock.
+    """
+    result = await db.execute(
+        select(
+            models.Product.id,
+            models.Product.name,
+            models.Product.price,
+            models.Product.is_weighted,
+            models.Product.stock_quantity
+        )
+        .where(models.Product.id.in_(set(product_ids)))
+        .order_by(models.Product.id)
+        .with_for_update()
+    )
+    return {row.id: row for row in result}
+
+
+async def add_stock(db: AsyncSession, product_id: int, quantity: float) -> float:
+    """Soma `quantity` ao estoque de forma atômica e retorna o novo saldo."""
+    stmt = (
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(stock_quantity=models.Product.stock_quantity + quantity)
+        .returning(models.Product.stock_quantity)
+        .execution_options(synchronize_session=False)
+    )
+    new_quantity = (await db.execute(stmt)).scalar()
+    if new_quantity is None:
+        raise ProductNotFoundError(product_id)
+    return new_quantity
+
+
+async def record_movements(db: AsyncSession, movements: list[dict]):
+    """Grava a auditoria (StockMovement) de várias linhas em um único INSERT."""
+    if movements:
+        await db.execute(insert(models.StockMovement), movements)
+
+
+async def _raise_shortages(db: AsyncSession, quantities: dict[int, float]):
+    # Só roda no caminho de erro: descobre se o produto não existe ou se faltou saldo
+    result = await db.execute(
+        select(models.Product.id, models.Product.name, models.Product.stock_quantity)
+        .where(models.Product.id.in_(quantities))
+    )
+    found = {row.id: row for row in result}
+
+    for product_id in quantities:
+        if product_id not in found:
+            raise ProductNotFoundError(product_id)
+
+    raise InsufficientStockError([
+        schemas.StockShortage(
+            product_id=product_id,
+            name=found[product_id].name,
+            requested=quantity,
+            available=found[product_id].stock_quantity
+        )
+        for product_id, quantity in quantities.items()
+    ])
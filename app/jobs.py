@@ -0,0 +1,209 @@
+"""
+Jobs em segundo plano (backup, restauração, compactação de backups).
+
+A requisição só registra o job e devolve o id; o trabalho roda em uma task
+asyncio do próprio processo, com conexão própria ao banco (não usa a sessão da
+requisição). O andamento fica em memória, no worker que recebeu o job:
+
+- status: queued, running, completed, failed, cancelled
+- phase: etapa atual (tabela sendo lida/gravada, "consolidados", ...)
+- rows: linhas processadas por tabela, e a vazão (linhas/s) calculada a partir delas
+
+Jobs pesados rodam um de cada vez: os demais ficam na fila ("queued"). Além do
+lock em memória, o job segura um advisory lock do PostgreSQL (de sessão, em uma
+conexão própria fora do pool e fora de transação), que vale também entre
+workers do uvicorn. Com DB_PGBOUNCER=true só o lock em memória vale: em modo
+transaction, lock e unlock poderiam cair em conexões diferentes do servidor.
+"""
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+# Chave do advisory lock dos jobs pesados (qualquer inteiro fixo, único na aplicação)
+HEAVY_JOB_LOCK_KEY = 4_207_001
+LOCK_POLL_INTERVAL = 1.0 # segundos entre tentativas, enquanto outro worker roda um job
+
+# Só para o advisory lock: uma conexão por job, sem transação aberta (não ocupa o
+# pool das vendas nem esbarra em idle_in_transaction_session_timeout)
+_lock_engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+MAX_FINISHED_JOBS = 50
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, description: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.description = description
+        self.status = "queued"
+        self.phase = "na fila"
+        self.rows: dict[str, int] = {}
+        self.error: str | None = None
+        self.result = None
+        self.created_at = datetime.now()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.cancel_requested = False
+        self._started = None # time.monotonic() do início, para a vazão
+        self._elapsed = None
+        self._task: asyncio.Task | None = None
+        self.cleanups = [] # Chamadas ao encerrar, mesmo se cancelado antes de começar (ex.: apagar upload)
+
+    # --- Chamados pelo trabalho em andamento (também de threads, ex.: compactação) ---
+
+    def set_phase(self, phase: str):
+        self.check_cancelled()
+        self.phase = phase
+
+    def progress(self, table: str, rows: int):
+        """Total de linhas já processadas da tabela (acumulado, não incremento)."""
+        self.check_cancelled()
+        self.phase = table
+        self.rows[table] = rows
+
+    def check_cancelled(self):
+        # Trabalho em thread não recebe o cancelamento da task: para no próximo aviso de andamento
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    # --- Controle ---
+
+    def cancel(self) -> bool:
+        if self.status in FINISHED:
+            return False
+        self.cancel_requested = True
+        if self._task:
+            self._task.cancel()
+        return True
+
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0.0
+        if self._elapsed is not None:
+            return self._elapsed
+        return time.monotonic() - self._started
+
+    def _finish(self):
+        self.finished_at = datetime.now()
+        if self._started is not None:
+            self._elapsed = time.monotonic() - self._started
+        for cleanup in self.cleanups:
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"Erro ao finalizar job {self.id}: {e}")
+        self.cleanups = []
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed()
+        total = sum(self.rows.values())
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "phase": self.phase,
+            "rows": self.rows,
+            "total_rows": total,
+            "rows_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+            "elapsed_seconds": round(elapsed, 1),
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+jobs: dict[str, Job] = {}
+_heavy_lock = asyncio.Lock()
+
+
+def _prune():
+    # Mantém todos os ativos e só os últimos MAX_FINISHED_JOBS encerrados
+    finished = [job for job in jobs.values() if job.status in FINISHED]
+    for job in finished[:-MAX_FINISHED_JOBS]:
+        del jobs[job.id]
+
+
+def submit(kind: str, description: str, work, *args, cleanup=None) -> Job:
+    """Registra e agenda `work(job, *args)` (corrotina). Retorna o job sem esperar."""
+    _prune()
+    job = Job(kind, description)
+    if cleanup:
+        job.cleanups.append(cleanup)
+    jobs[job.id] = job
+    job._task = asyncio.create_task(_run(job, work, args))
+    job._task.add_done_callback(_cancelled_before_start)
+    return job
+
+
+def _cancelled_before_start(task: asyncio.Task):
+    # Task cancelada antes de começar não chega a executar o tratamento de _run
+    if task.cancelled():
+        for job in jobs.values():
+            if job._task is task and job.status not in FINISHED:
+                job.status = "cancelled"
+                job.phase = "cancelado"
+                job._finish()
+
+
+def get_job(job_id: str) -> Job | None:
+    return jobs.get(job_id)
+
+
+def list_jobs() -> list[Job]:
+    return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+
+@asynccontextmanager
+async def _advisory_lock(job: Job):
+    """Advisory lock de sessão entre workers (liberado no fim, ou ao fechar a conexão)."""
+    if settings.DB_PGBOUNCER:
+        yield
+        return
+    async with _lock_engine.connect() as conn:
+        # try_ + espera no event loop: o job continua cancelável enquanto aguarda
+        while not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": HEAVY_JOB_LOCK_KEY}):
+            job.phase = "aguardando job em outro worker"
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": HEAVY_JOB_LOCK_KEY})
+
+
+async def _run(job: Job, work, args):
+    try:
+        async with _heavy_lock:
+            async with _advisory_lock(job):
+                job.status = "running"
+                job.phase = "iniciando"
+                job.started_at = datetime.now()
+                job._started = time.monotonic()
+                job.result = await work(job, *args)
+                job.status = "completed"
+                job.phase = "concluído"
+    except (asyncio.CancelledError, JobCancelled):
+        job.status = "cancelled"
+        job.phase = "cancelado"
+    except Exception as e:
+        print(f"Erro no job {job.kind} {job.id}: {e}")
+        job.status = "failed"
+        job.phase = "falhou"
+        job.error = str(e)
+    finally:
+        job._finish()
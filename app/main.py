@@ -3,12 +3,14 @@ from sqlalchemy import select
 from fastapi.middleware.cors import CORSMiddleware
 
 
-from app.routers import sales, products, cashier, auth, users, stock, reports, backup
-from app.database import engine, Base, SessionLocal
+from app.routers import sales, products, cashier, auth, users, stock, reports, backup, exports, metrics as metrics_router
+from app.database import engine, replica_engines, Base, SessionLocal
+from app.catalog import warm_barcode_cache
 from app.models import User
-from app.auth import get_password_hash
+from app.auth import hash_password
 from app.models import UserRole
 from app.config import settings
+from app import metrics, partitions, search, invalidation
 
 app = FastAPI(title="PDV System API")
 
@@ -21,15 +23,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"], # Lidos pelo front (cache do catálogo e paginação)
 )
 
+# Métricas (latência por rota, comandos SQL por requisição, pool). Fica por fora
+# do CORS para medir também as requisições recusadas por ele.
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine)
+    for position, replica in enumerate(replica_engines, 1):
+        metrics.instrument_engine(replica, f"replica{position}")
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Criar tabelas ao iniciar (apenas para dev/teste rápido)
 # Em produção, use Alembic para migrações
 @app.on_event("startup")
 async def startup():
     # 1. Cria as tabelas no banco se não existirem (sempre roda para garantir)
     async with engine.begin() as conn:
+        await search.ensure_search_functions(conn) # Usadas pelos índices de busca de produtos
         await conn.run_sync(Base.metadata.create_all)
+        # Partições de stock_movements do mês atual e dos próximos (app/partitions.py)
+        created = await partitions.maintain(conn)
+        if created:
+            print(f"Partições criadas: {', '.join(created)}")
     
     # 2. Verifica se precisa criar o Admin Padrão
     async with SessionLocal() as db:
@@ -45,7 +61,7 @@ async def startup():
             admin_user = User(
                 name="Administrador do Sistema",
                 username="admin",
-                hashed_password=get_password_hash("admin123"), # Senha padrão: admin
+                hashed_password=await hash_password("admin123"), # Senha padrão: admin
                 role=UserRole.ADMIN,
                 is_active=True
             )
@@ -58,6 +74,17 @@ async def startup():
         else:
             print("\n--- Inicialização: O sistema já possui usuários cadastrados. ---\n")
 
+    # 3. Aquece o cache de código de barras (leitura do scanner)
+    total = await warm_barcode_cache()
+    print(f"Cache de código de barras carregado: {total} produtos")
+
+    # 4. Escuta as invalidações do cache de usuários feitas pelos outros workers
+    invalidation.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await invalidation.stop()
+
 # Registrar Rotas
 app.include_router(auth.router)
 app.include_router(products.router)
@@ -67,6 +94,9 @@ app.include_router(users.router)
 app.include_router(stock.router)
 app.include_router(reports.router)
 app.include_router(backup.router)
+app.include_router(exports.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,244 @@
+"""
+Métricas da aplicação no formato de texto do Prometheus (GET /metrics).
+
+- HTTP: contagem e histograma de latência por rota (o template, ex:
+  /products/{product_id}, nunca a URL com ids) e status;
+- banco: comandos SQL e tempo de banco por requisição, medidos pelos eventos
+  do engine do SQLAlchemy (valem também para jobs e tarefas fora de requisição,
+  que entram só nos totais);
+- pool de conexões: em uso, overflow e tamanho, lidos na hora do scrape;
+- negócio: vendas gravadas, itens vendidos, falhas de login.
+
+Tudo é mantido em memória com somas simples (sem lock: o event loop é uma
+thread só), então pode ficar ligado em produção. Os valores são por processo:
+com vários workers do uvicorn, cada scrape cai em um deles; para ter o total,
+exponha um target por worker ou some no Prometheus por instância.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos (requisições e comandos SQL)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Comandos SQL por requisição
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if value not in (float("inf"), float("-inf")) else ("+Inf" if value > 0 else "-Inf")
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        registry.append(self)
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        for labelvalues, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Gauge:
+    """Valor lido na hora do scrape: `collect()` devolve {(valores dos rótulos): valor}."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        registry.append(self)
+
+    def samples(self):
+        for labelvalues, value in self.collect().items():
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Por rótulos: [contagem de cada faixa (não acumulada) + faixa +Inf, soma]
+        self._values = {}
+        registry.append(self)
+
+    def observe(self, value: float, *labelvalues):
+        entry = self._values.get(labelvalues)
+        if entry is None:
+            entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        # `le` é inclusivo: o valor cai na primeira faixa >= valor
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labelvalues, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labelvalues, le), cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Métricas ---
+
+http_requests_total = Counter(
+    "http_requests_total", "Requisições HTTP atendidas", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route", "status")
+)
+http_request_db_statements = Histogram(
+    "http_request_db_statements", "Comandos SQL executados por requisição", ("method", "route"),
+    buckets=STATEMENT_BUCKETS
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Tempo de banco (soma dos comandos SQL) por requisição", ("method", "route")
+)
+db_statements_total = Counter("db_statements_total", "Comandos SQL executados (requisições e jobs)")
+db_statement_duration = Histogram("db_statement_duration_seconds", "Duração de cada comando SQL")
+
+sales_created_total = Counter("pdv_sales_created_total", "Vendas gravadas", ("source",)) # single, batch
+sale_items_total = Counter("pdv_sale_items_total", "Itens (linhas) de venda gravados")
+sales_amount_total = Counter("pdv_sales_amount_total", "Valor total das vendas gravadas")
+login_failures_total = Counter("pdv_login_failures_total", "Tentativas de login recusadas", ("reason",))
+
+# Pools dos engines instrumentados (primário e réplicas), lidos na hora do scrape
+_pools = {}
+Gauge("db_pool_checked_out", "Conexões do pool em uso",
+      lambda: {(name,): pool.checkedout() for name, pool in _pools.items()}, ("engine",))
+Gauge("db_pool_overflow", "Conexões abertas além do pool_size (negativo: ainda há vagas no pool)",
+      lambda: {(name,): pool.overflow() for name, pool in _pools.items()}, ("engine",))
+Gauge("db_pool_size", "Tamanho configurado do pool",
+      lambda: {(name,): pool.size() for name, pool in _pools.items()}, ("engine",))
+
+
+# --- Banco ---
+
+# [comandos, segundos] da requisição em andamento (None fora de requisição)
+_request_db: ContextVar[list | None] = ContextVar("request_db", default=None)
+# Texto dos comandos, só dentro de capture_statements() (orçamento de consultas)
+_statement_log: ContextVar[list | None] = ContextVar("statement_log", default=None)
+_instrumented = set()
+
+
+@contextmanager
+def capture_statements():
+    """
+    Lista dos comandos SQL executados dentro do bloco, inclusive pela aplicação
+    chamada no mesmo contexto (ex: requisição ASGI no próprio processo).
+    Requer instrument_engine().
+    """
+    log = []
+    token = _statement_log.set(log)
+    try:
+        yield log
+    finally:
+        _statement_log.reset(token)
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Conta comandos/tempo de banco e expõe os números do pool do engine (rótulo `engine`)."""
+    sync_engine = engine.sync_engine
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_start
+        db_statements_total.inc()
+        db_statement_duration.observe(elapsed)
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+        log = _statement_log.get()
+        if log is not None:
+            log.append(statement)
+
+    # NullPool (modo PgBouncer) não tem pool local para medir
+    if hasattr(sync_engine.pool, "checkedout"):
+        _pools[name] = sync_engine.pool
+
+
+# --- HTTP ---
+
+class MetricsMiddleware:
+    """Middleware ASGI puro (sem BaseHTTPMiddleware, que custa uma task por requisição)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500] # Exceção não tratada vira 500 no ServerErrorMiddleware, acima deste
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        db = [0, 0.0]
+        token = _request_db.set(db)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            # O roteador grava a rota encontrada no scope; sem rota (404), um rótulo só
+            route = getattr(scope.get("route"), "path_format", None) or "unmatched"
+            method = scope["method"]
+            http_requests_total.inc(method, route, status[0])
+            http_request_duration.observe(elapsed, method, route, status[0])
+            http_request_db_statements.observe(db[0], method, route)
+            http_request_db_duration.observe(db[1], method, route)
@@ -1,13 +1,19 @@
-from sqlalchemy import String, Float, ForeignKey, DateTime, Boolean, Enum
+from sqlalchemy import String, Float, ForeignKey, DateTime, Date, Boolean, Enum, Uuid, BigInteger, Integer, Index, text
 import enum
-from datetime import datetime
+import uuid
+from datetime import datetime, date
 from sqlalchemy.orm._orm_constructors import backref
 from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 
 
 from app.database import Base
 
+# Versão de linha usada no sync incremental do catálogo e no backup incremental: id da
+# transação que gravou a linha (PostgreSQL 13+). Ver /products/changes para a regra de visibilidade.
+ROW_VERSION = text("pg_current_xact_id()::text::bigint")
+
 # Enums para status e tipos
 class SaleStatus(str, enum.Enum):
     COMPLETED = "completed"
@@ -32,6 +38,8 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String)
     role: Mapped[UserRole] = mapped_column(Enum(UserRole), default=UserRole.SELLER)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Incrementada na troca de senha/inativação: invalida os tokens já emitidos
+    credential_version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
 
     # Relacionamentos
     sales = relationship("Sale", back_populates="seller")
@@ -50,23 +58,61 @@ class Product(Base):
     min_stock: Mapped[float] = mapped_column(Float, default=5.0) # Para alertas
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_weighted: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
+    # Atualizada automaticamente em todo INSERT/UPDATE (cadastro, edição, estoque, vendas)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, onupdate=ROW_VERSION, index=True)
+
+    __table_args__ = (
+        # Parcial: só os produtos abaixo do mínimo (alerta de estoque baixo do dashboard)
+        Index("ix_products_low_stock", "id", postgresql_where=text("stock_quantity < min_stock AND is_active")),
+    )
+
+# Busca por digitação (app/search.py): nome/categoria sem acentos e minúsculas.
+# f_unaccent é criada pela migração ou por search.ensure_search_functions()
+_product_name_search = func.f_unaccent(func.lower(Product.name)).label("name_search")
+Index("ix_products_name_prefix", _product_name_search, postgresql_ops={"name_search": "text_pattern_ops"})
+Index("ix_products_name_trgm", _product_name_search,
+      postgresql_using="gin", postgresql_ops={"name_search": "gin_trgm_ops"})
+Index("ix_products_category_trgm", func.f_unaccent(func.lower(Product.category)).label("category_search"),
+      postgresql_using="gin", postgresql_ops={"category_search": "gin_trgm_ops"})
+Index("ix_products_barcode_prefix", Product.barcode, postgresql_ops={"barcode": "varchar_pattern_ops"})
+
+class ProductTombstone(Base):
+    """Produtos excluídos, para os terminais removerem do catálogo local no sync"""
+    __tablename__ = "product_tombstones"
+
+    product_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, index=True)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 class CashierSession(Base):
     __tablename__ = "cashier_sessions"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    terminal_id: Mapped[str] = mapped_column(String, index=True, nullable=False)
-    start_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    terminal_id: Mapped[str] = mapped_column(String, nullable=False)
+    start_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
     end_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     initial_balance: Mapped[float] = mapped_column(Float, default=0.0) # Fundo de caixa
     final_balance: Mapped[float] = mapped_column(Float, nullable=True) # Valor no fechamento
     status: Mapped[str] = mapped_column(String, default="open") # open, closed
+    # Totais acumulados, atualizados na mesma transação de cada venda
+    total_sold: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+    sale_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    payment_totals: Mapped[dict] = mapped_column(JSONB, default=dict, server_default=text("'{}'::jsonb")) # {forma de pagamento: valor}
+    # Versão de linha para o backup incremental (muda a cada venda e no fechamento)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, onupdate=ROW_VERSION, index=True)
 
     user = relationship("User", back_populates="sessions")
     sales = relationship("Sale", back_populates="session")
 
+    __table_args__ = (
+        Index("ix_cashier_sessions_terminal_id_status", "terminal_id", "status"),
+        # No máximo UM caixa aberto por terminal (garantido pelo banco, não só pela rota /open)
+        Index("uq_cashier_sessions_open_terminal", "terminal_id", unique=True, postgresql_where=text("status = 'open'")),
+    )
+
 class Sale(Base):
+    # Não particionada (ver app/partitions.py): sale_uuid precisa ser único em toda a tabela
     __tablename__ = "sales"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
@@ -76,32 +122,79 @@ class Sale(Base):
     payment_method: Mapped[str] = mapped_column(String) # dinheiro, credito, debito, pix
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     status: Mapped[SaleStatus] = mapped_column(Enum(SaleStatus), default=SaleStatus.COMPLETED)
+    # UUID gerado pelo terminal: permite detectar reenvio da mesma venda (idempotência)
+    sale_uuid: Mapped[uuid.UUID] = mapped_column(Uuid, unique=True, index=True, nullable=True)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, onupdate=ROW_VERSION, index=True)
 
     seller = relationship("User", back_populates="sales")
     session = relationship("CashierSession", back_populates="sales")
     items = relationship("SaleItem", back_populates="sale")
 
+    __table_args__ = (
+        Index("ix_sales_session_id_status", "session_id", "status"),
+        Index("ix_sales_timestamp_id", "timestamp", "id"), # Listagem paginada e filtros por data
+    )
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    sale_id: Mapped[int] = mapped_column(ForeignKey("sales.id"))
-    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
+    sale_id: Mapped[int] = mapped_column(ForeignKey("sales.id"), index=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), index=True)
     quantity: Mapped[float] = mapped_column(Float)
     unit_price: Mapped[float] = mapped_column(Float) # Preço NA HORA da venda (histórico)
     subtotal: Mapped[float] = mapped_column(Float)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, index=True)
     product = relationship("Product", backref="sales")
     sale = relationship("Sale", back_populates="items")
     # Não criamos relacionamento direto com Product para evitar carregar dados desnecessários, 
     # mas em queries complexas podemos fazer join.
 
 class StockMovement(Base):
-    """Tabela de Auditoria de Estoque"""
+    """Tabela de Auditoria de Estoque (particionada por mês: app/partitions.py)"""
     __tablename__ = "stock_movements"
     
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    # A chave de partição precisa fazer parte da chave primária
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     quantity_change: Mapped[float] = mapped_column(Float) # Pode ser positivo ou negativo
     movement_type: Mapped[StockMovementType] = mapped_column(Enum(StockMovementType))
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    description: Mapped[str] = mapped_column(String, nullable=True)
\ No newline at end of file
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    description: Mapped[str] = mapped_column(String, nullable=True)
+    row_version: Mapped[int] = mapped_column(BigInteger, server_default=ROW_VERSION, index=True)
+
+    __table_args__ = (
+        Index("ix_stock_movements_product_id_timestamp", "product_id", "timestamp"),
+        Index("ix_stock_movements_timestamp_id", "timestamp", "id"), # Histórico paginado
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+# --- Consolidados (rollups) de vendas ---
+# Mantidos a cada venda (app/rollups.py) para o dashboard não varrer sales/sale_items.
+# Reconstrução completa: python -m app.rollups
+
+class DailySales(Base):
+    """Total vendido por dia e terminal (separado por terminal para evitar disputa de lock)"""
+    __tablename__ = "daily_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    terminal_id: Mapped[str] = mapped_column(String, primary_key=True)
+    total_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    sale_count: Mapped[int] = mapped_column(Integer, default=0)
+
+class DailyProductSales(Base):
+    """Quantidade e faturamento por dia e produto"""
+    __tablename__ = "daily_product_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    quantity: Mapped[float] = mapped_column(Float, default=0.0)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
+
+class ProductSalesTotal(Base):
+    """Quantidade e faturamento acumulados (desde sempre) por produto"""
+    __tablename__ = "product_sales_totals"
+
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    quantity: Mapped[float] = mapped_column(Float, default=0.0, index=True)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0)
@@ -0,0 +1,67 @@
+"""
+Paginação por cursor (keyset) compartilhada pelas rotas de listagem.
+
+Em vez de OFFSET (que lê e descarta todas as linhas anteriores), cada página
+continua a partir da última chave vista, ex: `WHERE (timestamp, id) < (:t, :id)`.
+O custo por página fica constante, não importa o tamanho da tabela.
+
+O cursor é opaco para o cliente (base64 de um JSON) e volta no header
+`X-Next-Cursor` quando há mais páginas; a listagem continua sendo a mesma lista
+de antes no corpo da resposta.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_, Select
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(columns):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if column.type.python_type is datetime else value
+            for column, value in zip(columns, values)
+        )
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def paginate(query: Select, columns: list, cursor: str | None, limit: int, descending: bool = True) -> Select:
+    """
+    Aplica ordenação estável por `columns` (a última deve ser única, ex: id), o filtro
+    do cursor e LIMIT + 1 (a linha extra indica se existe próxima página).
+    """
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        query = query.where(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(clamp_limit(limit) + 1)
+
+
+def finish_page(rows: list, limit: int, response: Response, key) -> list:
+    """Corta a linha extra e, se houver mais páginas, envia o próximo cursor no header."""
+    limit = clamp_limit(limit)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(rows[-1]))
+    return rows
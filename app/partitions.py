@@ -0,0 +1,233 @@
+"""
+Particionamento mensal de stock_movements por `timestamp` (meses no fuso da loja).
+
+- stock_movements_pAAAA_MM: um mês (partições "quentes", as que recebem escrita);
+- stock_movements_pAAAA: um ano já arquivado (partição "fria"), opcionalmente
+  em outro tablespace (ARCHIVE_TABLESPACE, ex: disco mais barato);
+- stock_movements_default: o que não cair em nenhuma partição (ex: venda
+  offline com o relógio do terminal errado). Ao criar a partição do período,
+  as linhas são movidas da default para ela.
+
+Todas as partições continuam anexadas à tabela: /stock/history, exportações e
+backups enxergam dados quentes e frios do mesmo jeito, e o filtro por data só
+lê as partições do período.
+
+sales e sale_items NÃO são particionadas: em tabela particionada toda chave
+única precisa incluir a data, e isso quebraria o sale_uuid único (reenvio
+idempotente das vendas, inclusive offline com a hora do terminal) e a chave
+estrangeira sale_items -> sales. O crescimento delas é absorvido pelos
+índices por sessão/data e pelos consolidados (o dashboard não as varre).
+
+    python -m app.partitions maintain            # cria as partições dos próximos meses (também roda na inicialização)
+    python -m app.partitions archive [--months 12]  # junta os meses antigos em partições anuais
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import settings
+from app.rollups import STORE_TZ
+
+# Tabela particionada -> coluna da chave de partição
+PARTITIONED_TABLES = {"stock_movements": "timestamp"}
+
+# Advisory lock da manutenção (vários workers iniciando ao mesmo tempo)
+PARTITION_LOCK_KEY = 4_207_002
+
+
+def month_start(moment: datetime) -> datetime:
+    local = moment.astimezone(STORE_TZ)
+    return datetime(local.year, local.month, 1, tzinfo=STORE_TZ)
+
+
+def add_months(start: datetime, months: int) -> datetime:
+    index = start.year * 12 + start.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=STORE_TZ)
+
+
+def month_partition(table: str, start: datetime) -> str:
+    return f"{table}_p{start.year}_{start.month:02d}"
+
+
+def year_partition(table: str, year: int) -> str:
+    return f"{table}_p{year}"
+
+
+async def _exists(conn: AsyncConnection, name: str) -> bool:
+    return await conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+
+
+async def _is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    # Banco ainda não migrado (tabela comum): a manutenção não faz nada
+    return await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+    ), {"table": table})
+
+
+async def _create_filled(conn: AsyncConnection, table: str, column: str, name: str,
+                         start: datetime, end: datetime, tablespace: str | None = None):
+    """
+    Tabela avulsa com a estrutura da particionada (inclusive chave primária e
+    índices) e um CHECK do intervalo [start, end). Com os mesmos índices, o
+    ATTACH só os adota, em vez de construí-los com a tabela-mãe travada.
+    """
+    where = f"TABLESPACE {tablespace}" if tablespace else ""
+    await conn.execute(text(
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES) {where}"
+    ))
+    # Com o CHECK igual ao intervalo, o ATTACH não precisa varrer a tabela para validar
+    await conn.execute(text(
+        f'ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK ("{column}" IS NOT NULL '
+        f"AND \"{column}\" >= '{start.isoformat()}' AND \"{column}\" < '{end.isoformat()}')"
+    ))
+
+
+async def _move_from_default(conn: AsyncConnection, table: str, column: str, name: str, start: datetime, end: datetime):
+    await conn.execute(text(
+        f'WITH moved AS (DELETE FROM {table}_default WHERE "{column}" >= :start AND "{column}" < :end RETURNING *) '
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end})
+
+
+async def _attach(conn: AsyncConnection, table: str, name: str, start: datetime, end: datetime):
+    await conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range"))
+
+
+async def create_month(conn: AsyncConnection, table: str, column: str, start: datetime) -> str | None:
+    """Cria a partição do mês (trazendo as linhas dele da default). None se já coberto."""
+    name = month_partition(table, start)
+    if await _exists(conn, name) or await _exists(conn, year_partition(table, start.year)):
+        return None
+    end = add_months(start, 1)
+    await _create_filled(conn, table, column, name, start, end)
+    await _move_from_default(conn, table, column, name, start, end)
+    await _attach(conn, table, name, start, end)
+    return name
+
+
+async def maintain(conn: AsyncConnection, months_ahead: int | None = None) -> list[str]:
+    """
+    Garante a partição default, as do mês atual e dos próximos `months_ahead`
+    meses, e separa em partições próprias os meses que caíram na default.
+    Retorna as partições criadas.
+    """
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    created = []
+    for table, column in PARTITIONED_TABLES.items():
+        if not await _is_partitioned(conn, table):
+            continue
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+        current = month_start(datetime.now(STORE_TZ))
+        months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+        # Ex: backup restaurado com meses antigos, que foram parar na default
+        stray = await conn.scalars(text(
+            f'SELECT DISTINCT date_trunc(\'month\', "{column}", :tz) FROM {table}_default'
+        ), {"tz": settings.STORE_TIMEZONE})
+        months.update(month_start(moment) for moment in stray if moment is not None)
+
+        for start in sorted(months):
+            name = await create_month(conn, table, column, start)
+            if name:
+                created.append(name)
+    return created
+
+
+async def archive_year(conn: AsyncConnection, table: str, column: str, year: int, tablespace: str | None = None) -> int:
+    """
+    Junta os meses de `year` em uma partição anual (fria). Durante a cópia os
+    meses ficam só com trava SHARE (leitura liberada; vendas do mês atual não
+    são afetadas). A tabela-mãe só é travada na troca final (DETACH/ATTACH),
+    que não reconstrói nada: a partição anual já tem os índices e o CHECK.
+    Retorna as linhas arquivadas.
+    """
+    months = [
+        month_partition(table, start)
+        for start in (datetime(year, month, 1, tzinfo=STORE_TZ) for month in range(1, 13))
+    ]
+    months = [name for name in months if await _exists(conn, name)]
+    start = datetime(year, 1, 1, tzinfo=STORE_TZ)
+    end = datetime(year + 1, 1, 1, tzinfo=STORE_TZ)
+    name = year_partition(table, year)
+
+    # 1. Bloqueia escrita nos meses antigos antes da cópia: o conteúdo copiado é o definitivo
+    for month in months:
+        await conn.execute(text(f"LOCK TABLE {month} IN SHARE MODE"))
+
+    # 2. Cópia para a partição anual (já com chave primária e índices)
+    await _create_filled(conn, table, column, name, start, end, tablespace)
+    for month in months:
+        await conn.execute(text(f"INSERT INTO {name} SELECT * FROM {month}"))
+
+    # 3. Troca rápida: sai os meses, entra o ano (o CHECK dispensa a validação e os índices são adotados)
+    for month in months:
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {month}"))
+    await _move_from_default(conn, table, column, name, start, end)
+    await _attach(conn, table, name, start, end)
+    for month in months:
+        await conn.execute(text(f"DROP TABLE {month}"))
+    return await conn.scalar(text(f"SELECT count(*) FROM {name}"))
+
+
+async def archive(engine, months: int | None = None, tablespace: str | None = None) -> dict[str, int]:
+    """Arquiva os anos inteiros anteriores ao horizonte (padrão: ARCHIVE_AFTER_MONTHS). Um ano por transação."""
+    months = settings.ARCHIVE_AFTER_MONTHS if months is None else months
+    tablespace = tablespace or settings.ARCHIVE_TABLESPACE
+    horizon = add_months(month_start(datetime.now(STORE_TZ)), -months)
+    archived = {}
+    for table, column in PARTITIONED_TABLES.items():
+        async with engine.connect() as conn:
+            if not await _is_partitioned(conn, table):
+                continue
+            years = await conn.scalars(text(
+                "SELECT DISTINCT substring(c.relname from :pattern)::int FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table) "
+                "AND c.relname ~ :regex"
+            ), {"table": table, "pattern": f"^{table}_p([0-9]{{4}})_", "regex": f"^{table}_p[0-9]{{4}}_[0-9]{{2}}$"})
+            years = sorted(years)
+        for year in years:
+            # Só anos inteiros: o último mês do ano tem que estar antes do horizonte
+            if datetime(year + 1, 1, 1, tzinfo=STORE_TZ) > horizon:
+                continue
+            async with engine.begin() as conn:
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+                archived[year_partition(table, year)] = await archive_year(conn, table, column, year, tablespace)
+    return archived
+
+
+async def main():
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Partições de stock_movements")
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain_cmd = commands.add_parser("maintain", help="Cria as partições dos próximos meses")
+    maintain_cmd.add_argument("--ahead", type=int, default=None, help="Meses à frente (padrão: PARTITION_MONTHS_AHEAD)")
+    archive_cmd = commands.add_parser("archive", help="Junta os meses antigos em partições anuais")
+    archive_cmd.add_argument("--months", type=int, default=None, help="Horizonte em meses (padrão: ARCHIVE_AFTER_MONTHS)")
+    archive_cmd.add_argument("--tablespace", default=None, help="Tablespace das partições frias (padrão: ARCHIVE_TABLESPACE)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "maintain":
+            async with engine.begin() as conn:
+                created = await maintain(conn, args.ahead)
+            print(f"Partições criadas: {', '.join(created) if created else 'nenhuma (já existiam)'}")
+        else:
+            archived = await archive(engine, args.months, args.tablespace)
+            for name, rows in archived.items():
+                print(f"{name}: {rows} linhas")
+            if not archived:
+                print("Nenhum ano completo antes do horizonte para arquivar.")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+"""
+Importação em massa de produtos (cadastro de loja nova, tabela de preços do fornecedor).
+
+O arquivo é validado linha a linha em memória; as linhas válidas vão por COPY
+para uma tabela temporária e entram em products com um único
+INSERT ... ON CONFLICT (barcode) DO UPDATE. As entradas de estoque viram
+movimentações em um único INSERT ... SELECT. Tudo na mesma transação do
+chamador: as linhas com erro são devolvidas no relatório e as demais entram
+juntas (ou nenhuma, se o banco recusar).
+
+- CSV: cabeçalho com os nomes dos campos de schemas.ProductImportRow, separador
+  ";" (decimais com vírgula, como nas exportações) ou ",". UTF-8 ou Windows-1252
+  (CSV salvo pelo Excel).
+- JSON: lista de objetos, ou {"products": [...]}.
+
+Produto existente (mesmo código de barras): só os campos preenchidos na linha
+são atualizados (ex: tabela do fornecedor só com barcode e price), e
+stock_quantity é SOMADO ao saldo (entrada de estoque). Produto novo precisa de
+name, price e cost_price; os demais campos recebem o padrão do cadastro.
+"""
+import csv
+import io
+import json
+
+import asyncpg
+from pydantic import ValidationError
+from sqlalchemy import select, delete, update, exists, or_, func, table, column, literal, literal_column, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, schemas
+
+FIELDS = list(schemas.ProductImportRow.model_fields)
+NUMERIC_FIELDS = {"price", "cost_price", "min_stock", "stock_quantity"}
+BOOLEAN_FIELDS = {"is_active", "is_weighted"}
+BOOLEAN_WORDS = {"sim": "true", "s": "true", "não": "false", "nao": "false", "n": "false"}
+
+MOVEMENT_DESCRIPTION = "Importação de produtos"
+
+# Produto novo: campos obrigatórios e padrões dos demais (os mesmos do cadastro manual)
+REQUIRED_FOR_NEW = ("name", "price", "cost_price")
+NEW_PRODUCT_DEFAULTS = {name: schemas.ProductBase.model_fields[name].default for name in ("min_stock", "is_active", "is_weighted")}
+
+STAGING = "import_products"
+staging = table(STAGING, *(column(name) for name in FIELDS))
+
+
+class InvalidImportError(Exception):
+    pass
+
+
+# --- Leitura do arquivo ---
+
+def _decode(content: bytes) -> str:
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("cp1252")
+
+
+def _csv_value(name: str, value: str, sep: str) -> str:
+    if name in NUMERIC_FIELDS and sep == ";" and "," in value:
+        return value.replace(".", "").replace(",", ".") # 1.234,56 -> 1234.56
+    if name in BOOLEAN_FIELDS:
+        return BOOLEAN_WORDS.get(value.lower(), value)
+    return value
+
+
+def parse_csv(content: bytes) -> list[tuple[int, dict]]:
+    data = _decode(content)
+    first_line = data.split("\n", 1)[0]
+    sep = ";" if first_line.count(";") >= first_line.count(",") else ","
+    reader = csv.DictReader(io.StringIO(data, newline=""), delimiter=sep)
+    if not reader.fieldnames:
+        raise InvalidImportError("Arquivo vazio")
+    header = {name.strip().lower(): name for name in reader.fieldnames if name}
+
+    rows = []
+    for record in reader:
+        row = {}
+        for name, original in header.items():
+            value = (record.get(original) or "").strip()
+            if value: # Célula vazia = valor padrão
+                row[name] = _csv_value(name, value, sep)
+        rows.append((reader.line_num, row))
+    return rows
+
+
+def parse_json(content: bytes) -> list[tuple[int, dict]]:
+    try:
+        data = json.loads(_decode(content))
+    except ValueError:
+        raise InvalidImportError("JSON inválido")
+    if isinstance(data, dict):
+        data = data.get("products")
+    if not isinstance(data, list):
+        raise InvalidImportError('O JSON deve ser uma lista de produtos (ou {"products": [...]})')
+
+    rows = []
+    for position, row in enumerate(data, 1):
+        if isinstance(row, dict):
+            # null = campo não informado (como a célula vazia do CSV)
+            row = {name: value for name, value in row.items() if value is not None}
+            # Código de barras numérico no JSON (sem aspas) também é aceito
+            if isinstance(row.get("barcode"), int):
+                row["barcode"] = str(row["barcode"])
+        rows.append((position, row))
+    return rows
+
+
+def parse(content: bytes, filename: str | None = None) -> list[tuple[int, dict]]:
+    """Linhas do arquivo [(número da linha, campos preenchidos)]."""
+    is_json = (filename or "").lower().endswith(".json") or content.lstrip(b"\xef\xbb\xbf \r\n\t")[:1] in (b"[", b"{")
+    return parse_json(content) if is_json else parse_csv(content)
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'linha'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def validate(rows: list[tuple[int, dict]]) -> tuple[list[tuple[int, schemas.ProductImportRow]], list[schemas.ProductImportError]]:
+    valid, errors, seen = [], [], {}
+    for row_number, row in rows:
+        barcode = row.get("barcode") if isinstance(row, dict) else None
+        try:
+            item = schemas.ProductImportRow.model_validate(row)
+        except ValidationError as e:
+            errors.append(schemas.ProductImportError(
+                row=row_number, barcode=barcode if isinstance(barcode, str) else None, detail=_describe(e)
+            ))
+            continue
+
+        item.barcode = item.barcode.strip()
+        if item.name:
+            item.name = item.name.strip() or None
+        if item.barcode in seen:
+            # O ON CONFLICT não aceita a mesma linha duas vezes no mesmo comando
+            errors.append(schemas.ProductImportError(
+                row=row_number, barcode=item.barcode,
+                detail=f"Código de barras repetido no arquivo (linha {seen[item.barcode]})"
+            ))
+            continue
+        seen[item.barcode] = row_number
+        valid.append((row_number, item))
+    return valid, errors
+
+
+# --- Gravação ---
+
+def describe_db_error(error: Exception) -> str:
+    """Mensagem do PostgreSQL, sem o SQL e o nome da classe que o SQLAlchemy acrescenta."""
+    if isinstance(error, DBAPIError):
+        error = error.orig.__cause__ or error.orig
+    return str(error).strip()
+
+
+async def import_rows(db: AsyncSession, items: list[tuple[int, schemas.ProductImportRow]]) -> dict:
+    """
+    Grava as linhas validadas (sem commit). Retorna as contagens, os códigos de
+    barras afetados (para invalidar o cache do scanner) e as linhas recusadas
+    (produto novo sem os campos obrigatórios).
+    """
+    conn = await db.connection()
+    names = ", ".join(FIELDS)
+    await conn.execute(text(
+        f"CREATE TEMP TABLE {STAGING} ON COMMIT DROP AS SELECT {names} FROM products WITH NO DATA"
+    ))
+    raw = await conn.get_raw_connection()
+    try:
+        await raw.driver_connection.copy_records_to_table(
+            STAGING, records=[tuple(getattr(item, name) for name in FIELDS) for _, item in items], columns=FIELDS
+        )
+    except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        # COPY direto no asyncpg: o erro não passa pelo SQLAlchemy
+        raise InvalidImportError(describe_db_error(e))
+
+    # Produtos novos: sem os obrigatórios a linha é recusada; os demais campos vazios recebem o padrão
+    is_new = ~exists().where(models.Product.barcode == staging.c.barcode)
+    refused = await conn.execute(
+        delete(staging)
+        .where(is_new, or_(*(staging.c[name].is_(None) for name in REQUIRED_FOR_NEW)))
+        .returning(*(staging.c[name] for name in ("barcode", *REQUIRED_FOR_NEW)))
+    )
+    row_numbers = {item.barcode: row_number for row_number, item in items}
+    errors = [
+        schemas.ProductImportError(
+            row=row_numbers[row.barcode], barcode=row.barcode,
+            detail="Produto novo: preencha " + ", ".join(name for name in REQUIRED_FOR_NEW if getattr(row, name) is None)
+        )
+        for row in refused
+    ]
+    await conn.execute(update(staging).where(is_new).values(
+        {name: func.coalesce(staging.c[name], default) for name, default in NEW_PRODUCT_DEFAULTS.items()}
+    ))
+
+    # Ordenado pelo código de barras: importações simultâneas travam as linhas na mesma ordem.
+    # Produto existente: campo vazio na linha (NULL) mantém o valor cadastrado
+    stmt = insert(models.Product).from_select(FIELDS, select(*staging.c).order_by(staging.c.barcode))
+    updates = {
+        name: func.coalesce(stmt.excluded[name], models.Product.__table__.c[name])
+        for name in FIELDS if name not in ("barcode", "stock_quantity")
+    }
+    updates["stock_quantity"] = models.Product.stock_quantity + stmt.excluded.stock_quantity
+    updates["row_version"] = models.ROW_VERSION
+    stmt = stmt.on_conflict_do_update(index_elements=[models.Product.barcode], set_=updates).returning(
+        models.Product.barcode,
+        literal_column("xmax = 0").label("inserted"), # xmax zerado: linha nova (não houve conflito)
+    )
+    result = (await conn.execute(stmt)).all()
+
+    movements = await conn.execute(
+        insert(models.StockMovement).from_select(
+            ["product_id", "quantity_change", "movement_type", "description"],
+            select(
+                models.Product.id,
+                staging.c.stock_quantity,
+                literal(models.StockMovementType.ENTRY, models.StockMovement.__table__.c.movement_type.type),
+                literal(MOVEMENT_DESCRIPTION),
+            )
+            .join_from(staging, models.Product, models.Product.barcode == staging.c.barcode)
+            .where(staging.c.stock_quantity > 0)
+        )
+    )
+
+    created = sum(1 for row in result if row.inserted)
+    return {
+        "created": created,
+        "updated": len(result) - created,
+        "stock_entries": movements.rowcount,
+        "barcodes": [row.barcode for row in result],
+        "errors": errors,
+    }
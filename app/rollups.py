@@ -0,0 +1,170 @@
+"""
+Consolidados de vendas (rollups) usados pelo dashboard.
+
+- daily_sales: total e quantidade de vendas por dia/terminal
+- daily_product_sales: quantidade e faturamento por dia/produto
+- product_sales_totals: quantidade e faturamento acumulados por produto
+
+São atualizados com UPSERT na mesma transação da venda (sign=-1 para estornar
+uma venda cancelada). Para recalcular tudo a partir de sales/sale_items:
+
+    python -m app.rollups
+"""
+import asyncio
+from datetime import datetime, date
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, delete, insert, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+from app import models
+from app.config import settings
+
+STORE_TZ = ZoneInfo(settings.STORE_TIMEZONE)
+
+
+def business_day(timestamp: datetime) -> date:
+    """Dia da venda no fuso da loja."""
+    return timestamp.astimezone(STORE_TZ).date()
+
+
+def today() -> date:
+    return datetime.now(STORE_TZ).date()
+
+
+async def apply_sales(db: AsyncSession, terminal_id: str, sales: list[dict], sign: int = 1):
+    """
+    Soma (sign=1) ou estorna (sign=-1) vendas nos consolidados.
+
+    Cada venda é {"timestamp", "total_amount", "items": [{"product_id", "quantity", "subtotal"}]}.
+    """
+    daily = {}
+    daily_products = {}
+    lifetime = {}
+    for sale in sales:
+        day = business_day(sale["timestamp"])
+        total, count = daily.get(day, (0.0, 0))
+        daily[day] = (total + sign * sale["total_amount"], count + sign)
+        for item in sale["items"]:
+            key = (day, item["product_id"])
+            quantity, revenue = daily_products.get(key, (0.0, 0.0))
+            daily_products[key] = (quantity + sign * item["quantity"], revenue + sign * item["subtotal"])
+            quantity, revenue = lifetime.get(item["product_id"], (0.0, 0.0))
+            lifetime[item["product_id"]] = (quantity + sign * item["quantity"], revenue + sign * item["subtotal"])
+
+    if not daily:
+        return
+
+    # Linhas ordenadas pela chave: vendas concorrentes travam na mesma ordem (sem deadlock)
+    stmt = pg_insert(models.DailySales)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.DailySales.day, models.DailySales.terminal_id],
+            set_={
+                "total_amount": models.DailySales.total_amount + stmt.excluded.total_amount,
+                "sale_count": models.DailySales.sale_count + stmt.excluded.sale_count
+            }
+        ),
+        [
+            {"day": day, "terminal_id": terminal_id, "total_amount": total, "sale_count": count}
+            for day, (total, count) in sorted(daily.items())
+        ]
+    )
+
+    if not daily_products:
+        return
+
+    stmt = pg_insert(models.DailyProductSales)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.DailyProductSales.day, models.DailyProductSales.product_id],
+            set_={
+                "quantity": models.DailyProductSales.quantity + stmt.excluded.quantity,
+                "revenue": models.DailyProductSales.revenue + stmt.excluded.revenue
+            }
+        ),
+        [
+            {"day": day, "product_id": product_id, "quantity": quantity, "revenue": revenue}
+            for (day, product_id), (quantity, revenue) in sorted(daily_products.items())
+        ]
+    )
+
+    stmt = pg_insert(models.ProductSalesTotal)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.ProductSalesTotal.product_id],
+            set_={
+                "quantity": models.ProductSalesTotal.quantity + stmt.excluded.quantity,
+                "revenue": models.ProductSalesTotal.revenue + stmt.excluded.revenue
+            }
+        ),
+        [
+            {"product_id": product_id, "quantity": quantity, "revenue": revenue}
+            for product_id, (quantity, revenue) in sorted(lifetime.items())
+        ]
+    )
+
+
+async def rebuild(db: AsyncSession):
+    """Recalcula todos os consolidados a partir das vendas concluídas (não faz commit)."""
+    await db.execute(delete(models.DailySales))
+    await db.execute(delete(models.DailyProductSales))
+    await db.execute(delete(models.ProductSalesTotal))
+
+    # literal_execute: o fuso vai como literal no SQL para o GROUP BY reconhecer a mesma expressão
+    sale_day = func.date(func.timezone(literal(settings.STORE_TIMEZONE, literal_execute=True), models.Sale.timestamp))
+    completed = models.Sale.status == models.SaleStatus.COMPLETED
+
+    await db.execute(insert(models.DailySales).from_select(
+        ["day", "terminal_id", "total_amount", "sale_count"],
+        select(
+            sale_day,
+            models.CashierSession.terminal_id,
+            func.sum(models.Sale.total_amount),
+            func.count(models.Sale.id)
+        )
+        .join(models.CashierSession, models.CashierSession.id == models.Sale.session_id)
+        .where(completed)
+        .group_by(sale_day, models.CashierSession.terminal_id)
+    ))
+
+    await db.execute(insert(models.DailyProductSales).from_select(
+        ["day", "product_id", "quantity", "revenue"],
+        select(
+            sale_day,
+            models.SaleItem.product_id,
+            func.sum(models.SaleItem.quantity),
+            func.sum(models.SaleItem.subtotal)
+        )
+        .join(models.Sale, models.Sale.id == models.SaleItem.sale_id)
+        .where(completed)
+        .group_by(sale_day, models.SaleItem.product_id)
+    ))
+
+    await db.execute(insert(models.ProductSalesTotal).from_select(
+        ["product_id", "quantity", "revenue"],
+        select(
+            models.SaleItem.product_id,
+            func.sum(models.SaleItem.quantity),
+            func.sum(models.SaleItem.subtotal)
+        )
+        .join(models.Sale, models.Sale.id == models.SaleItem.sale_id)
+        .where(completed)
+        .group_by(models.SaleItem.product_id)
+    ))
+
+
+async def main():
+    from app.database import SessionLocal, engine
+
+    async with SessionLocal() as db:
+        await rebuild(db)
+        await db.commit()
+    await engine.dispose()
+    print("Consolidados de vendas reconstruídos.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
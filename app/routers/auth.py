@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.database import get_db
-from app import models, auth
+from app import models, auth, metrics
 from app.dependencies import allow_admin_only
 from pydantic import BaseModel
 
@@ -23,7 +23,7 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Username já existe")
     
-    hashed_pw = auth.get_password_hash(user.password)
+    hashed_pw = await auth.hash_password(user.password)
     
     new_user = models.User(
         username=user.username,
@@ -46,20 +46,28 @@ async def login_for_access_token(
     
     # VERIFICAÇÃO DE STATUS
     if user and not user.is_active:
+         metrics.login_failures_total.inc("inactive")
          raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Usuário inativo. Contate o administrador."
         )
 
-    # Verificação de Senha
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    # Verificação de Senha (fora do event loop)
+    valid, new_hash = await auth.check_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
+        metrics.login_failures_total.inc("invalid_credentials")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuário ou senha incorretos",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = auth.create_access_token(data={"sub": user.username})
+    # Parâmetros do Argon2 mudaram: regrava o hash com os atuais (mesma senha, tokens continuam válidos)
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    access_token = auth.create_access_token(data={"sub": user.username, "ver": user.credential_version})
     return {
         "access_token": access_token,
         "token_type": "bearer",
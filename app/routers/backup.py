@@ -1,22 +1,27 @@
 import os
-import json
 import shutil
+import asyncio
+import tempfile
 from datetime import datetime
-from typing import List
+from typing import List, Literal
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text, delete
+from sqlalchemy import select, func
 from pydantic import BaseModel
-from app.database import get_db
-from app import models
-from app.dependencies import allow_admin_only, get_current_user
+from app.database import get_db, engine
+from app import models, backups, catalog, cashier_sessions, jobs
+from app.dependencies import allow_admin_only, get_current_user, invalidate_user, publish_user_change
+from app.cache import invalidate_reports
 
 router = APIRouter(prefix="/backup", tags=["Backup"])
 
-BACKUP_DIR = "backups"
+BACKUP_DIR = backups.BACKUP_DIR
 os.makedirs(BACKUP_DIR, exist_ok=True)
 
+def backup_files():
+    return backups.backup_files()
+
 # --- Schemas ---
 class BackupStats(BaseModel):
     products: int
@@ -24,11 +29,30 @@ class BackupStats(BaseModel):
     sales: int
     stock_movements: int
     last_backup: str | None
+    last_full_backup: str | None
+    incrementals_since_full: int
 
 class BackupFile(BaseModel):
     filename: str
     size_kb: float
     created_at: str
+    kind: str = "full" # full, incremental
+    parent: str | None = None # Backup anterior da cadeia (incrementais)
+
+def format_backup_date(filename: str) -> str:
+    # Tenta formatar a data do nome do arquivo backup_YYYYMMDD_HHMMSS[.delta].tar
+    # (ou .ndjson.gz/.json, formatos antigos)
+    try:
+        ts = filename.replace("backup_", "").split(".")[0]
+        dt = datetime.strptime(ts, "%Y%m%d_%H%M%S")
+        return dt.strftime("%d/%m/%Y às %H:%M")
+    except:
+        return filename
+
+def check_backup_name(filename: str):
+    # Só nomes de backup da pasta: nada de caminho ("../") vindo da URL
+    if not backups.is_backup_name(filename):
+        raise HTTPException(400, "Nome de arquivo de backup inválido")
 
 # --- Rotas ---
 
@@ -41,70 +65,132 @@ async def get_stats(db: AsyncSession = Depends(get_db),
     sales = await db.scalar(select(func.count(models.Sale.id)))
     movements = await db.scalar(select(func.count(models.StockMovement.id)))
 
-    # Busca o arquivo mais recente
-    files = sorted(os.listdir(BACKUP_DIR), reverse=True)
+    # Busca o arquivo mais recente e a base completa da cadeia dele
+    files = sorted(backup_files(), reverse=True)
     last_backup = None
+    last_full_backup = None
+    incrementals = 0
     if files:
-        # Tenta formatar a data do nome do arquivo backup_YYYYMMDD_HHMMSS.json
+        last_backup = format_backup_date(files[0])
         try:
-            ts = files[0].replace("backup_", "").replace(".json", "")
-            dt = datetime.strptime(ts, "%Y%m%d_%H%M%S")
-            last_backup = dt.strftime("%d/%m/%Y às %H:%M")
-        except:
-            last_backup = files[0]
+            chain = await asyncio.to_thread(backups.resolve_chain, files[0])
+            last_full_backup = format_backup_date(chain[0])
+            incrementals = len(chain) - 1
+        except backups.InvalidBackupError:
+            pass # Cadeia quebrada/arquivo corrompido: só a data do último
 
     return {
         "products": products,
         "users": users,
         "sales": sales,
         "stock_movements": movements,
-        "last_backup": last_backup
+        "last_backup": last_backup,
+        "last_full_backup": last_full_backup,
+        "incrementals_since_full": incrementals
     }
 
-@router.post("/create", dependencies=[Depends(allow_admin_only)])
-async def create_backup(db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)):
-    """Gera um arquivo JSON com todos os dados do banco"""
-    
-    # 1. Extrair dados
-    # Usamos scalars().all() para pegar os objetos
-    users = (await db.execute(select(models.User))).scalars().all()
-    products = (await db.execute(select(models.Product))).scalars().all()
-    sessions = (await db.execute(select(models.CashierSession))).scalars().all()
-    sales = (await db.execute(select(models.Sale))).scalars().all()
-    sale_items = (await db.execute(select(models.SaleItem))).scalars().all()
-    movements = (await db.execute(select(models.StockMovement))).scalars().all()
-
-    # 2. Serializar para Dicionário
-    # Função auxiliar para converter objeto SQLAlchemy em dict
-    def to_dict(obj):
-        return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
-
-    # Precisamos serializar datas para string (JSON não suporta datetime nativo)
-    def json_serial(obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return str(obj)
-
-    data = {
-        "version": "1.0",
-        "timestamp": datetime.now().isoformat(),
-        "users": [to_dict(u) for u in users],
-        "products": [to_dict(p) for p in products],
-        "sessions": [to_dict(s) for s in sessions],
-        "sales": [to_dict(s) for s in sales],
-        "sale_items": [to_dict(si) for si in sale_items],
-        "stock_movements": [to_dict(m) for m in movements]
+# --- Jobs (rodam em segundo plano, um de cada vez; ver app/jobs.py) ---
+
+async def backup_job(job: jobs.Job, mode: str) -> dict:
+    # Base escolhida só quando o job começa: um backup anterior na fila pode ter acabado de terminar
+    parent = await asyncio.to_thread(backups.latest_chain_head) if mode == "incremental" else None
+    try:
+        filename = backups.backup_filename("incremental" if parent else "full")
+        counts = await backups.export_backup(filename, parent, job)
+    except backups.BackupChainError as e:
+        print(f"Backup incremental indisponível ({e}); gerando backup completo")
+        parent = None
+        filename = backups.backup_filename("full")
+        counts = await backups.export_backup(filename, job=job)
+    return {
+        "filename": filename,
+        "kind": "incremental" if parent else "full",
+        "parent": parent["filename"] if parent else None,
+        "rows": counts
     }
 
-    # 3. Salvar Arquivo
-    filename = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    filepath = os.path.join(BACKUP_DIR, filename)
-    
-    with open(filepath, "w", encoding='utf-8') as f:
-        json.dump(data, f, default=json_serial, indent=2)
+async def restore_job(job: jobs.Job, chain: list[str], upload_path: str | None = None) -> dict:
+    # Base e incrementais anteriores vêm da pasta; o upload (se houver) é o último da cadeia
+    paths = [os.path.join(BACKUP_DIR, f) for f in chain]
+    if upload_path:
+        paths.append(upload_path)
+    opened = []
+    try:
+        opened = [open(path, "rb") for path in paths]
+        counts = await backups.restore_chain(opened, job)
+    finally:
+        for f in opened:
+            f.close()
+
+    # Caches em memória apontam para dados que não existem mais (usuários: em todos os workers)
+    invalidate_user()
+    async with engine.begin() as conn:
+        await publish_user_change(conn)
+    catalog.clear_barcode_cache()
+    cashier_sessions.open_session_cache.clear()
+    invalidate_reports()
+    return {"rows": counts}
+
+async def compact_job(job: jobs.Job, filename: str) -> dict:
+    output, counts = await asyncio.to_thread(backups.compact_chain, filename, job)
+    return {"filename": output, "rows": counts}
+
+def job_accepted(job: jobs.Job, message: str) -> dict:
+    return {"message": message, "job_id": job.id, "status": job.status}
+
+@router.post("/create", status_code=202, dependencies=[Depends(allow_admin_only)])
+async def create_backup(mode: Literal["full", "incremental"] = "full",
+    current_user: models.User = Depends(get_current_user)):
+    """
+    Agenda a geração do backup (.tar com um segmento comprimido por tabela e manifesto com checksums).
+    mode=incremental: só o que mudou desde o último backup (vira completo se não houver base).
+    Acompanhe em GET /backup/jobs/{job_id}.
+    """
+    job = jobs.submit("backup", f"Backup ({mode})", backup_job, mode)
+    return job_accepted(job, "Backup agendado")
+
+@router.post("/compact", status_code=202, dependencies=[Depends(allow_admin_only)])
+async def compact_backups(filename: str | None = None,
+    current_user: models.User = Depends(get_current_user)):
+    """Agenda a junção da cadeia (base + incrementais) que termina em `filename` em um novo backup completo"""
+    if filename is None:
+        head = await asyncio.to_thread(backups.latest_chain_head)
+        if head is None:
+            raise HTTPException(404, "Nenhum backup encontrado para compactar")
+        filename = head["filename"]
+    check_backup_name(filename)
+    try:
+        # Lê o cabeçalho de cada arquivo da cadeia: fora do event loop
+        chain = await asyncio.to_thread(backups.resolve_chain, filename)
+    except backups.InvalidBackupError as e:
+        raise HTTPException(400, str(e))
+    if len(chain) == 1:
+        raise HTTPException(400, "O backup já é completo; não há incrementais para compactar")
+    job = jobs.submit("compact", f"Compactação de {filename}", compact_job, filename)
+    return job_accepted(job, "Compactação agendada")
+
+@router.get("/jobs", dependencies=[Depends(allow_admin_only)])
+async def list_backup_jobs(current_user: models.User = Depends(get_current_user)):
+    """Jobs de backup/restauração deste worker (ativos e os últimos encerrados)"""
+    return [job.to_dict() for job in jobs.list_jobs()]
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(allow_admin_only)])
+async def get_backup_job(job_id: str, current_user: models.User = Depends(get_current_user)):
+    """Fase, linhas por tabela, vazão e erro do job"""
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job não encontrado")
+    return job.to_dict()
 
-    return {"message": "Backup criado com sucesso", "filename": filename}
+@router.post("/jobs/{job_id}/cancel", dependencies=[Depends(allow_admin_only)])
+async def cancel_backup_job(job_id: str, current_user: models.User = Depends(get_current_user)):
+    """Cancela um job na fila ou em andamento (restauração cancelada não altera nenhum dado)"""
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job não encontrado")
+    if not job.cancel():
+        raise HTTPException(400, "O job já foi encerrado")
+    return {"message": "Cancelamento solicitado", "job_id": job.id}
 
 @router.get("/list", response_model=List[BackupFile], dependencies=[Depends(allow_admin_only)])
 async def list_backups(
@@ -115,16 +201,21 @@ async def list_backups(
     if not os.path.exists(BACKUP_DIR):
         return []
 
-    for f in os.listdir(BACKUP_DIR):
-        if f.endswith(".json"):
-            path = os.path.join(BACKUP_DIR, f)
-            stat = os.stat(path)
-            dt = datetime.fromtimestamp(stat.st_mtime)
-            files.append({
-                "filename": f,
-                "size_kb": round(stat.st_size / 1024, 2),
-                "created_at": dt.strftime("%d/%m/%Y %H:%M:%S")
-            })
+    for f in backup_files():
+        path = os.path.join(BACKUP_DIR, f)
+        stat = os.stat(path)
+        dt = datetime.fromtimestamp(stat.st_mtime)
+        try:
+            header = backups.read_header_file(f)
+        except backups.InvalidBackupError:
+            header = {}
+        files.append({
+            "filename": f,
+            "size_kb": round(stat.st_size / 1024, 2),
+            "created_at": dt.strftime("%d/%m/%Y %H:%M:%S"),
+            "kind": header.get("kind", "full"),
+            "parent": header.get("parent")
+        })
     
     # Ordenar por mais recente
     return sorted(files, key=lambda x: x['filename'], reverse=True)
@@ -132,104 +223,68 @@ async def list_backups(
 @router.get("/download/{filename}", dependencies=[Depends(allow_admin_only)])
 async def download_backup(filename: str,
     current_user: models.User = Depends(get_current_user)):
+    check_backup_name(filename)
     path = os.path.join(BACKUP_DIR, filename)
     if not os.path.exists(path):
         raise HTTPException(404, "Arquivo não encontrado")
-    return FileResponse(path, filename=filename, media_type='application/json')
+    if filename.endswith(".tar"):
+        media_type = 'application/x-tar'
+    elif filename.endswith(".gz"):
+        media_type = 'application/gzip'
+    else:
+        media_type = 'application/json'
+    return FileResponse(path, filename=filename, media_type=media_type)
 
-@router.post("/restore", dependencies=[Depends(allow_admin_only)])
-async def restore_backup(file: UploadFile = File(...), db: AsyncSession = Depends(get_db),
+@router.post("/restore", status_code=202, dependencies=[Depends(allow_admin_only)])
+async def restore_backup(file: UploadFile = File(...),
     current_user: models.User = Depends(get_current_user)):
-    """Restaura um backup (PERIGO: Apaga dados atuais)"""
-    
+    """Agenda a restauração de um backup enviado (PERIGO: Apaga dados atuais)"""
+    # 1. Valida o cabeçalho e a cadeia antes de aceitar (incremental: base e anteriores vêm da pasta)
     try:
-        content = await file.read()
-        data = json.loads(content)
-    except:
-        raise HTTPException(400, "Arquivo de backup inválido ou corrompido")
-
-    # Ordem de Limpeza (Filhos -> Pais para evitar erro de FK)
-    await db.execute(delete(models.StockMovement))
-    await db.execute(delete(models.SaleItem))
-    await db.execute(delete(models.Sale))
-    await db.execute(delete(models.CashierSession))
-    await db.execute(delete(models.Product))
-    await db.execute(delete(models.User))
-    
-    # Ordem de Inserção (Pais -> Filhos)
-    
-    # 1. Users
-    for item in data.get("users", []):
-        db.add(models.User(**item))
-    
-    # 2. Products
-    for item in data.get("products", []):
-        db.add(models.Product(**item))
-        
-    # Flush para garantir que IDs existam antes de inserir filhos
-    await db.flush() 
-
-    # 3. Sessions (Depende de User)
-    # Precisamos converter strings de data de volta para datetime
-    for item in data.get("sessions", []):
-        if item.get('start_time'): item['start_time'] = datetime.fromisoformat(item['start_time'])
-        if item.get('end_time'): item['end_time'] = datetime.fromisoformat(item['end_time'])
-        db.add(models.CashierSession(**item))
-    
-    await db.flush()
-
-    # 4. Sales (Depende de User e Session)
-    for item in data.get("sales", []):
-        if item.get('timestamp'): item['timestamp'] = datetime.fromisoformat(item['timestamp'])
-        # Enum conversion handling if needed, but SQLAlchemy usually handles str to Enum if exact match
-        db.add(models.Sale(**item))
-        
-    await db.flush()
-
-    # 5. Sale Items (Depende de Sale e Product)
-    for item in data.get("sale_items", []):
-        db.add(models.SaleItem(**item))
-        
-    # 6. Stock Movements (Depende de Product)
-    for item in data.get("stock_movements", []):
-        if item.get('timestamp'): item['timestamp'] = datetime.fromisoformat(item['timestamp'])
-        db.add(models.StockMovement(**item))
-
-    await db.commit()
-
-    # 3. CORREÇÃO DE SEQUÊNCIAS (RESET ID) - FIX PARA POSTGRESQL
-    # Ajustamos o contador de cada tabela para MAX(id) + 1
-    tables = [
-        "users", 
-        "products", 
-        "cashier_sessions", 
-        "sales", 
-        "sale_items", 
-        "stock_movements"
-    ]
-
-    for table in tables:
-        try:
-            # Comando SQL para Postgres resetar a sequence
-            # setval define o valor atual. nextval será valor + 1
-            # COALESCE garante que se a tabela estiver vazia, define como 1
-            seq_name = f"{table}_id_seq"
-            sql = text(f"SELECT setval('{seq_name}', (SELECT COALESCE(MAX(id), 0) FROM {table}), true);")
-            await db.execute(sql)
-        except Exception as e:
-            print(f"Erro ao resetar sequence da tabela {table}: {e}")
-            # Em alguns ambientes o nome da sequence pode ser diferente, mas não abortamos o processo
-            continue
-            
-    await db.commit()
-    
-    return {"message": "Restauração concluída com sucesso! Faça login novamente."}
+        header = backups.read_header(file.file)
+        chain = await asyncio.to_thread(backups.resolve_chain, header["parent"]) if header["kind"] == "incremental" else []
+    except backups.InvalidBackupError as e:
+        raise HTTPException(400, str(e))
+
+    # 2. O upload é descartado ao fim da requisição: copia para a pasta antes de agendar
+    upload = tempfile.NamedTemporaryFile(dir=BACKUP_DIR, prefix="restore_", suffix=".upload", delete=False)
+    try:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, upload)
+    finally:
+        upload.close()
+
+    job = jobs.submit("restore", f"Restauração de {file.filename}", restore_job, chain, upload.name,
+                      cleanup=lambda: os.remove(upload.name))
+    return job_accepted(job, "Restauração agendada")
+
+@router.post("/restore/{filename}", status_code=202, dependencies=[Depends(allow_admin_only)])
+async def restore_backup_file(filename: str,
+    current_user: models.User = Depends(get_current_user)):
+    """Agenda a restauração de um backup da pasta (com a cadeia de incrementais até ele). PERIGO: Apaga dados atuais"""
+    check_backup_name(filename)
+    if not os.path.exists(os.path.join(BACKUP_DIR, filename)):
+        raise HTTPException(404, "Arquivo não encontrado")
+    try:
+        chain = await asyncio.to_thread(backups.resolve_chain, filename)
+    except backups.InvalidBackupError as e:
+        raise HTTPException(400, str(e))
+    job = jobs.submit("restore", f"Restauração de {filename}", restore_job, chain)
+    return job_accepted(job, "Restauração agendada")
 
 @router.delete("/{filename}", dependencies=[Depends(allow_admin_only)])
 async def delete_backup_file(filename: str,
     current_user: models.User = Depends(get_current_user)):
+    check_backup_name(filename)
     path = os.path.join(BACKUP_DIR, filename)
     if os.path.exists(path):
+        # Base de incrementais: excluir quebraria a cadeia
+        for f in backup_files():
+            try:
+                parent = backups.read_header_file(f).get("parent")
+            except backups.InvalidBackupError:
+                continue
+            if parent == filename:
+                raise HTTPException(409, f"O backup '{f}' depende deste arquivo. Compacte a cadeia antes de excluir.")
         os.remove(path)
         return {"message": "Arquivo excluído"}
     raise HTTPException(404, "Arquivo não encontrado")
\ No newline at end of file
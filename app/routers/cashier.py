@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from app.database import get_db
-from app import models, schemas
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.database import get_db, get_read_db
+from app import models, schemas, cashier_sessions, pagination
 from datetime import datetime, date
-from typing import List
+from typing import List, Optional
 from app.dependencies import allow_manager, allow_admin_only, get_current_user
 
 router = APIRouter(prefix="/cashier", tags=["Cashier"])
@@ -18,23 +19,13 @@ async def get_cashier_status(
     x_terminal_id: str = Header(..., alias="x-terminal-id") # Lê o Header obrigatório
 ):
     # Lógica Nova: Busca sessão aberta NESTE TERMINAL (independente de quem abriu)
-    query = select(models.CashierSession).where(
-        models.CashierSession.terminal_id == x_terminal_id,
-        models.CashierSession.status == "open"
-    )
-    result = await db.execute(query)
-    session = result.scalars().first()
+    session = await cashier_sessions.get_open_session(db, x_terminal_id)
     
     if not session:
         return {"status": "closed", "terminal_id": x_terminal_id}
 
-    # Calcula totais (igual anterior)
-    sales_query = select(func.sum(models.Sale.total_amount)).where(
-        models.Sale.session_id == session.id,
-        models.Sale.status == models.SaleStatus.COMPLETED
-    )
-    sales_result = await db.execute(sales_query)
-    total_sold = sales_result.scalar() or 0.0
+    # Totais já acumulados na sessão a cada venda (custo constante, sem somar as vendas)
+    total_sold = session.total_sold
 
     return {
         "status": "open",
@@ -43,6 +34,8 @@ async def get_cashier_status(
         "opened_by_user_id": session.user_id, # Quem abriu
         "initial_balance": session.initial_balance,
         "total_sold": total_sold,
+        "sale_count": session.sale_count,
+        "payment_totals": session.payment_totals,
         "expected_balance": session.initial_balance + total_sold
     }
 
@@ -50,8 +43,11 @@ async def get_cashier_status(
     dependencies=[Depends(allow_manager), Depends(allow_admin_only)])
 async def get_sessions_by_date(
     day: date,
+    response: Response,
+    limit: int = pagination.DEFAULT_LIMIT,
+    cursor: Optional[str] = None, # Valor do header X-Next-Cursor da página anterior
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db) # Réplica, se houver
 ):
     start_of_day = datetime.combine(day, datetime.min.time())
     end_of_day = datetime.combine(day, datetime.max.time())
@@ -59,10 +55,13 @@ async def get_sessions_by_date(
     query = select(models.CashierSession).where(
         models.CashierSession.start_time >= start_of_day,
         models.CashierSession.start_time <= end_of_day
-    ).order_by(models.CashierSession.start_time.desc())
+    )
+    query = pagination.paginate(query, [models.CashierSession.start_time, models.CashierSession.id], cursor, limit)
 
     result = await db.execute(query)
-    return result.scalars().all()
+    return pagination.finish_page(
+        result.scalars().all(), limit, response, lambda session: (session.start_time, session.id)
+    )
 
 @router.post("/open")
 async def open_cashier(
@@ -87,7 +86,14 @@ async def open_cashier(
         status="open"
     )
     db.add(new_session)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Duas aberturas simultâneas no mesmo terminal: o índice único parcial
+        # (uq_cashier_sessions_open_terminal) deixa passar só a primeira
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"O terminal {x_terminal_id} já possui um caixa aberto.")
+    cashier_sessions.remember_session(x_terminal_id, new_session.id)
     return {"message": "Caixa aberto com sucesso", "terminal": x_terminal_id}
 
 @router.post("/close")
@@ -113,4 +119,5 @@ async def close_cashier(
     session.status = "closed"
     
     await db.commit()
+    cashier_sessions.forget_terminal(x_terminal_id)
     return {"message": "Caixa fechado com sucesso"}
\ No newline at end of file
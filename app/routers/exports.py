@@ -0,0 +1,93 @@
+from datetime import date, datetime, time, timedelta
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app import models, exports
+from app.rollups import STORE_TZ
+from app.dependencies import allow_manager, get_current_user
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# Extrações para a contabilidade: período obrigatório (dias no fuso da loja, fim inclusivo)
+def period_bounds(start_date: date, end_date: date) -> tuple[datetime, datetime]:
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="A data final deve ser igual ou posterior à inicial.")
+    start = datetime.combine(start_date, time.min, tzinfo=STORE_TZ)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=STORE_TZ)
+    return start, end
+
+def export_response(name: str, start_date: date, end_date: date, header: list[str], query,
+                    format: str, sep: str) -> StreamingResponse:
+    batches = exports.stream_rows(query)
+    if format == "xlsx":
+        body, media_type = exports.xlsx_chunks(header, batches), exports.XLSX_MEDIA_TYPE
+    else:
+        body, media_type = exports.csv_chunks(header, batches, sep), exports.CSV_MEDIA_TYPE
+    filename = f"{name}_{start_date.isoformat()}_{end_date.isoformat()}.{format}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/sales", dependencies=[Depends(allow_manager)])
+async def export_sales(
+    start_date: date,
+    end_date: date,
+    format: Literal["csv", "xlsx"] = "csv",
+    sep: Literal[";", ","] = ";", # CSV: ";" usa vírgula decimal (Excel em português)
+    current_user: models.User = Depends(get_current_user)
+):
+    start, end = period_bounds(start_date, end_date)
+    query = select(
+        models.Sale.id, models.Sale.timestamp, models.CashierSession.terminal_id, models.User.name,
+        models.Sale.payment_method, models.Sale.status, models.Sale.total_amount, models.Sale.sale_uuid
+    ).join(models.CashierSession, models.Sale.session_id == models.CashierSession.id)\
+     .join(models.User, models.Sale.user_id == models.User.id)\
+     .where(models.Sale.timestamp >= start, models.Sale.timestamp < end)\
+     .order_by(models.Sale.timestamp, models.Sale.id)
+
+    header = ["ID", "Data/Hora", "Terminal", "Vendedor", "Forma de Pagamento", "Status", "Total", "UUID"]
+    return export_response("vendas", start_date, end_date, header, query, format, sep)
+
+@router.get("/sale-items", dependencies=[Depends(allow_manager)])
+async def export_sale_items(
+    start_date: date,
+    end_date: date,
+    format: Literal["csv", "xlsx"] = "csv",
+    sep: Literal[";", ","] = ";",
+    current_user: models.User = Depends(get_current_user)
+):
+    start, end = period_bounds(start_date, end_date)
+    query = select(
+        models.SaleItem.sale_id, models.Sale.timestamp, models.Sale.status, models.SaleItem.product_id,
+        models.Product.name, models.Product.barcode, models.SaleItem.quantity, models.SaleItem.unit_price,
+        models.SaleItem.subtotal
+    ).join(models.Sale, models.SaleItem.sale_id == models.Sale.id)\
+     .join(models.Product, models.SaleItem.product_id == models.Product.id)\
+     .where(models.Sale.timestamp >= start, models.Sale.timestamp < end)\
+     .order_by(models.Sale.timestamp, models.Sale.id, models.SaleItem.id)
+
+    header = ["Venda", "Data/Hora", "Status da Venda", "Produto ID", "Produto", "Código de Barras",
+              "Quantidade", "Preço Unitário", "Subtotal"]
+    return export_response("itens_vendidos", start_date, end_date, header, query, format, sep)
+
+@router.get("/stock-movements", dependencies=[Depends(allow_manager)])
+async def export_stock_movements(
+    start_date: date,
+    end_date: date,
+    format: Literal["csv", "xlsx"] = "csv",
+    sep: Literal[";", ","] = ";",
+    current_user: models.User = Depends(get_current_user)
+):
+    start, end = period_bounds(start_date, end_date)
+    query = select(
+        models.StockMovement.id, models.StockMovement.timestamp, models.StockMovement.product_id,
+        models.Product.name, models.StockMovement.movement_type, models.StockMovement.quantity_change,
+        models.StockMovement.description
+    ).join(models.Product, models.StockMovement.product_id == models.Product.id)\
+     .where(models.StockMovement.timestamp >= start, models.StockMovement.timestamp < end)\
+     .order_by(models.StockMovement.timestamp, models.StockMovement.id)
+
+    header = ["ID", "Data/Hora", "Produto ID", "Produto", "Tipo", "Quantidade", "Descrição"]
+    return export_response("movimentacoes_estoque", start_date, end_date, header, query, format, sep)
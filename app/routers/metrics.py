@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Header, HTTPException, Response
+
+from app import metrics
+from app.config import settings
+
+router = APIRouter(tags=["Metrics"])
+
+# Lido pelo Prometheus (fora do Swagger); protegido por token quando METRICS_TOKEN está definido
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics(authorization: str | None = Header(None)):
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
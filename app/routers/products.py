@@ -1,19 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Header, Response, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from typing import List
-from app.database import get_db
-from app import models, schemas
+from sqlalchemy import select, delete, text, tuple_
+from sqlalchemy.exc import DBAPIError
+from typing import List, Optional
+from app.database import get_db, get_read_db
+from app.cache import invalidate_reports
+from app import models, schemas, inventory, catalog, pagination, search, product_import
 from app.dependencies import get_current_user, allow_admin_only, allow_manager
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+# --- ETag ---
+# O ETag é derivado de (id, row_version) das linhas devolvidas: qualquer alteração
+# (preço, cadastro, estoque, venda) muda a versão e, portanto, o ETag.
+def make_etag(products) -> str:
+    fingerprint = ",".join(f"{p.id}:{p.row_version}" for p in products)
+    return f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
 # Listar Produtos (Para o Frontend carregar a lista de seleção)
 @router.get("/", response_model=List[schemas.ProductResponse])
 async def read_products(
+    response: Response,
     skip: int = 0, 
-    limit: int = 100, 
+    limit: int = pagination.DEFAULT_LIMIT, 
+    cursor: Optional[str] = None, # Valor do header X-Next-Cursor da página anterior
     active_only: bool = False, # <--- Novo Parâmetro
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -22,19 +42,133 @@ async def read_products(
     # Se o front pedir active_only=true, filtramos
     if active_only:
         query = query.where(models.Product.is_active == True)
-        
-    query = query.offset(skip).limit(limit)
+
+    # Paginação por cursor (id); 'skip' continua aceito por compatibilidade
+    if skip and not cursor:
+        query = query.offset(skip)
+    query = pagination.paginate(query, [models.Product.id], cursor, limit, descending=False)
     
+    result = await db.execute(query)
+    products = pagination.finish_page(result.scalars().all(), limit, response, lambda p: (p.id,))
+
+    # Terminal já tem essa página em cache: responde 304 sem corpo
+    etag = make_etag(products)
+    if etag_matches(if_none_match, etag):
+        headers = {"ETag": etag}
+        if pagination.NEXT_CURSOR_HEADER in response.headers:
+            headers[pagination.NEXT_CURSOR_HEADER] = response.headers[pagination.NEXT_CURSOR_HEADER]
+        return Response(status_code=304, headers=headers)
+    response.headers["ETag"] = etag
+    return products
+
+# Sync incremental do catálogo
+@router.get("/changes", response_model=schemas.ProductChangesResponse)
+async def read_product_changes(
+    since: Optional[str] = None, # Cursor devolvido pela chamada anterior (vazio = catálogo completo)
+    limit: int = 500,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Devolve só os produtos criados/alterados e os ids excluídos desde o cursor.
+
+    A versão de cada linha é o id da transação que a gravou. Uma transação com id
+    menor pode confirmar DEPOIS de uma com id maior, então só entregamos versões
+    abaixo do xmin do snapshot atual (todas as transações abaixo dele já terminaram).
+    Assim nenhuma alteração é pulada; transações longas só atrasam o sync.
+    """
+    limit = max(1, min(limit, 5000))
+
+    # Cursor: "versão" (versão inteira já entregue) ou "versão:id" (página parou no meio da versão)
+    try:
+        if since:
+            version_part, _, id_part = since.partition(":")
+            since_version = int(version_part)
+            since_id = int(id_part) if id_part else None
+        else:
+            since_version, since_id = -1, None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    horizon = await db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+    query = select(models.Product).where(models.Product.row_version < horizon)
+    if since_id is None:
+        query = query.where(models.Product.row_version > since_version)
+    else:
+        query = query.where(tuple_(models.Product.row_version, models.Product.id) > tuple_(since_version, since_id))
+    query = query.order_by(models.Product.row_version, models.Product.id).limit(limit + 1)
+
+    result = await db.execute(query)
+    products = result.scalars().all()
+
+    has_more = len(products) > limit
+    if has_more:
+        products = products[:limit]
+        last = products[-1]
+        upper_version = last.row_version
+        cursor = f"{last.row_version}:{last.id}"
+    else:
+        upper_version = horizon - 1
+        cursor = str(upper_version)
+
+    # Exclusões: a página anterior sempre entrega a versão-limite inteira, então aqui é '>'
+    tombstones = await db.execute(
+        select(models.ProductTombstone.product_id).where(
+            models.ProductTombstone.row_version > since_version,
+            models.ProductTombstone.row_version <= upper_version
+        )
+    )
+
+    return {
+        "products": products,
+        "deleted_ids": tombstones.scalars().all(),
+        "cursor": cursor,
+        "has_more": has_more
+    }
+
+# Leitura do scanner (caminho mais quente do caixa): atendida pelo índice em memória
+@router.get("/barcode/{code}", response_model=schemas.ProductScanResponse)
+async def read_product_by_barcode(code: str,
+    current_user: models.User = Depends(get_current_user)):
+    product = await catalog.lookup_barcode(code.strip())
+    if product is None:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    return product
+
+@router.get("/barcode-cache/stats", dependencies=[Depends(allow_manager)])
+async def read_barcode_cache_stats(current_user: models.User = Depends(get_current_user)):
+    return catalog.barcode_cache.stats()
+
+# Busca por digitação (produto sem etiqueta): nome, código de barras ou categoria
+@router.get("/search", response_model=List[schemas.ProductResponse])
+async def search_products(
+    q: str,
+    limit: int = 20,
+    active_only: bool = True,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    query = search.search_query(q, limit, active_only)
+    if query is None:
+        return []
     result = await db.execute(query)
     return result.scalars().all()
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_db),
+async def read_product(product_id: int, response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)):
     result = await db.execute(select(models.Product).where(models.Product.id == product_id))
     product = result.scalars().first()
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
+
+    etag = f'W/"{product.id}-{product.row_version}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return product
 
 # Criar Produto
@@ -53,31 +187,60 @@ async def create_product(
 
     new_product = models.Product(**product.model_dump())
     db.add(new_product)
-    
-    # Se já nasceu com estoque, cria o log de entrada inicial
+
+    # Estoque inicial: o flush gera o id do produto e a auditoria vai no mesmo commit
     if product.stock_quantity > 0:
-        # Nota: O produto precisa ser commitado primeiro para ter ID, ou adicionamos junto na sessão
-        # Faremos o commit final no bloco try/except global se fosse complexo, aqui simplificado:
-        pass 
-        # (Para simplificar, assumimos que o estoque inicial não gera log de 'compra', 
-        # ou faríamos um StockMovement aqui também. Vamos focar na rota de Adicionar Estoque abaixo)
+        await db.flush()
+        await inventory.record_movements(db, [{
+            "product_id": new_product.id,
+            "quantity_change": product.stock_quantity,
+            "movement_type": models.StockMovementType.ENTRY,
+            "description": "Estoque Inicial"
+        }])
 
     await db.commit()
     await db.refresh(new_product)
-    
-    # Se houve estoque inicial, registramos a auditoria agora que temos o ID
-    if product.stock_quantity > 0:
-        movement = models.StockMovement(
-            product_id=new_product.id,
-            quantity_change=product.stock_quantity,
-            movement_type=models.StockMovementType.ENTRY,
-            description="Estoque Inicial"
-        )
-        db.add(movement)
-        await db.commit()
-
+    catalog.invalidate_barcode(new_product.barcode)
+    invalidate_reports()
     return new_product
 
+# Importação em massa (CSV/JSON): upsert pelo código de barras, com relatório de erros por linha
+@router.post("/import", response_model=schemas.ProductImportResponse,
+    dependencies=[Depends(allow_admin_only)])
+async def import_products(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    content = await file.read()
+    try:
+        rows = await asyncio.to_thread(product_import.parse, content, file.filename)
+    except product_import.InvalidImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    valid, errors = await asyncio.to_thread(product_import.validate, rows)
+
+    summary = {"created": 0, "updated": 0, "stock_entries": 0, "barcodes": []}
+    if valid:
+        try:
+            summary = await product_import.import_rows(db, valid)
+            await db.commit()
+        except (DBAPIError, product_import.InvalidImportError) as e:
+            # Ex: valor recusado pelo banco no COPY, ou produto excluído durante a importação (NOT NULL)
+            await db.rollback()
+            raise HTTPException(
+                status_code=400, detail=f"Importação não gravada: {product_import.describe_db_error(e)}"
+            )
+        errors = sorted(errors + summary["errors"], key=lambda error: error.row)
+        catalog.invalidate_barcode(*summary["barcodes"])
+        invalidate_reports()
+
+    return {
+        "created": summary["created"],
+        "updated": summary["updated"],
+        "stock_entries": summary["stock_entries"],
+        "errors": errors
+    }
+
 # Adicionar Estoque (Reposição)
 @router.post("/{product_id}/stock", status_code=200)
 async def add_stock(
@@ -89,26 +252,23 @@ async def add_stock(
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantidade deve ser positiva")
 
-    result = await db.execute(select(models.Product).where(models.Product.id == product_id))
-    product = result.scalars().first()
-    
-    if not product:
+    # 1. Atualiza quantidade atual (UPDATE atômico, sem ler-modificar-escrever)
+    try:
+        new_quantity = await inventory.add_stock(db, product_id, quantity)
+    except inventory.ProductNotFoundError:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
-
-    # 1. Atualiza quantidade atual
-    product.stock_quantity += quantity
     
     # 2. Registra auditoria
-    movement = models.StockMovement(
-        product_id=product.id,
-        quantity_change=quantity,
-        movement_type=models.StockMovementType.ENTRY,
-        description="Reposição de Estoque"
-    )
-    db.add(movement)
+    await inventory.record_movements(db, [{
+        "product_id": product_id,
+        "quantity_change": quantity,
+        "movement_type": models.StockMovementType.ENTRY,
+        "description": "Reposição de Estoque"
+    }])
     
     await db.commit()
-    return {"message": "Estoque atualizado", "new_quantity": product.stock_quantity}
+    invalidate_reports()
+    return {"message": "Estoque atualizado", "new_quantity": new_quantity}
 
 @router.put("/{product_id}", response_model=schemas.ProductResponse,
     dependencies=[Depends(allow_manager), Depends(allow_admin_only)])
@@ -131,6 +291,8 @@ async def update_product(
         if existing.scalars().first():
             raise HTTPException(status_code=400, detail="Novo código de barras já está em uso por outro produto")
 
+    old_barcode = db_product.barcode
+
     # Atualiza os campos
     db_product.name = product_update.name
     db_product.price = product_update.price
@@ -144,6 +306,8 @@ async def update_product(
 
     await db.commit()
     await db.refresh(db_product)
+    catalog.invalidate_barcode(old_barcode, db_product.barcode)
+    invalidate_reports()
     return db_product
 
 @router.delete("/{product_id}", dependencies=[Depends(allow_manager)])
@@ -173,9 +337,12 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db),
         # Isso resolve o erro de Foreign Key do cadastro inicial
         await db.execute(delete(models.StockMovement).where(models.StockMovement.product_id == product_id))
 
-        # 4. Agora sim, deleta o produto
+        # 4. Agora sim, deleta o produto (deixando o registro de exclusão para o sync dos terminais)
         await db.delete(product)
+        db.add(models.ProductTombstone(product_id=product_id))
         await db.commit()
+        catalog.invalidate_barcode(product.barcode)
+        invalidate_reports()
         return {"message": "Produto excluído com sucesso"}
         
     except Exception as e:
@@ -1,37 +1,53 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
-from datetime import datetime, time
-from app.database import get_db
-from app import models
+from app.database import ReadSessionLocal
+from app import models, schemas, rollups
+from app.cache import ResponseCache, report_caches
+from app.config import settings
 from app.dependencies import allow_manager, get_current_user
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
+dashboard_cache = ResponseCache(
+    "dashboard",
+    ttl=settings.REPORT_CACHE_TTL.get("dashboard", 15),
+    stale_ttl=settings.REPORT_CACHE_STALE_TTL
+)
+
 @router.get("/dashboard", dependencies=[Depends(allow_manager)])
-async def get_dashboard_data(db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)):
-    today = datetime.now().date()
-    start_of_day = datetime.combine(today, time.min)
-    end_of_day = datetime.combine(today, time.max)
-
-    # 1. Total Vendido Hoje (Soma das vendas concluídas)
-    sales_query = select(func.sum(models.Sale.total_amount)).where(
-        models.Sale.timestamp >= start_of_day,
-        models.Sale.timestamp <= end_of_day,
-        models.Sale.status == models.SaleStatus.COMPLETED
+async def get_dashboard_data(current_user: models.User = Depends(get_current_user)):
+    # Vários gerentes com o dashboard aberto compartilham o mesmo cálculo
+    return await dashboard_cache.get("dashboard", compute_dashboard)
+
+@router.get("/cache-stats", dependencies=[Depends(allow_manager)])
+async def get_cache_stats(current_user: models.User = Depends(get_current_user)):
+    """Acertos e tempo de cálculo de cada relatório em cache (para ajustar os TTLs)"""
+    return {name: cache.stats() for name, cache in report_caches.items()}
+
+async def compute_dashboard():
+    # Leitura pesada: vai para a réplica, se houver
+    async with ReadSessionLocal() as db:
+        return await build_dashboard(db)
+
+async def build_dashboard(db: AsyncSession):
+    today = rollups.today()
+
+    # 1. Total Vendido Hoje (consolidado por dia/terminal: poucas linhas)
+    sales_query = select(func.sum(models.DailySales.total_amount)).where(
+        models.DailySales.day == today
     )
     sales_result = await db.execute(sales_query)
     total_sales_today = sales_result.scalar() or 0.0
 
     # 2. Produtos Mais Vendidos (Top 10 Geral)
-    # Agrupa itens vendidos, soma quantidades e ordena
+    # Lê o acumulado por produto (índice em quantity), sem agrupar sale_items
     best_seller_query = select(
         models.Product.name,
-        func.sum(models.SaleItem.quantity).label("total_qty")
-    ).join(models.SaleItem.product).join(models.SaleItem.sale).where(
-        models.Sale.status == models.SaleStatus.COMPLETED
-    ).group_by(models.Product.id, models.Product.name).order_by(desc("total_qty")).limit(10)
+        models.ProductSalesTotal.quantity.label("total_qty")
+    ).join(models.Product, models.Product.id == models.ProductSalesTotal.product_id).where(
+        models.ProductSalesTotal.quantity > 0
+    ).order_by(desc(models.ProductSalesTotal.quantity)).limit(10)
     
     bs_result = await db.execute(best_seller_query)
     top_products = [{"name": row.name, "quantity": row.total_qty} for row in bs_result]
@@ -45,7 +61,10 @@ async def get_dashboard_data(db: AsyncSession = Depends(get_db),
         models.Product.is_active == True
     )
     ls_result = await db.execute(low_stock_query)
-    low_stock_items = ls_result.scalars().all()
+    low_stock_items = [
+        schemas.ProductResponse.model_validate(product).model_dump()
+        for product in ls_result.scalars().all()
+    ]
 
     return {
         "sales_today": total_sales_today,
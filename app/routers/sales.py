@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 from app.database import get_db
-from app import models, schemas
+from app.cache import invalidate_reports
+from app import models, schemas, inventory, cashier_sessions, rollups, pagination, metrics
 from app.dependencies import get_current_user
 from app.dependencies import allow_manager, allow_admin_only
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/sales", tags=["Sales"])
 
+# Limite de vendas por requisição em /sales/batch
+MAX_BATCH_SIZE = 1000
+
 @router.get("/", response_model=List[schemas.SaleResponse], dependencies=[Depends(allow_manager), Depends(allow_admin_only)])
 async def read_sales(
     session_id: int, 
+    response: Response,
+    limit: int = pagination.DEFAULT_LIMIT,
+    cursor: Optional[str] = None, # Valor do header X-Next-Cursor da página anterior
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)   
 ):
@@ -24,11 +33,55 @@ async def read_sales(
         )\
         .options(
             selectinload(models.Sale.seller)
-        )\
-        .order_by(models.Sale.timestamp.desc())
+        )
+    # Mais recentes primeiro, paginado por (timestamp, id)
+    query = pagination.paginate(query, [models.Sale.timestamp, models.Sale.id], cursor, limit)
+
+    result = await db.execute(query)
+    return pagination.finish_page(result.scalars().all(), limit, response, lambda sale: (sale.timestamp, sale.id))
 
+async def get_sale_by_uuid(db: AsyncSession, sale_uuid):
+    # seller também carregado: o usuário do cache vem desanexado e não está no identity map
+    query = select(models.Sale).where(models.Sale.sale_uuid == sale_uuid).options(
+        selectinload(models.Sale.items).selectinload(models.SaleItem.product),
+        selectinload(models.Sale.seller)
+    )
     result = await db.execute(query)
-    return result.scalars().all()
+    return result.scalars().first()
+
+def sum_quantities(items: List[schemas.SaleItemCreate]):
+    # Soma a quantidade pedida por produto (o mesmo produto pode aparecer em várias linhas)
+    requested = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0.0) + item.quantity
+    return requested
+
+def build_item_rows(items: List[schemas.SaleItemCreate], products):
+    # Importante: Pegamos o preço ATUAL do produto para salvar no histórico da venda
+    total_amount = 0.0
+    item_rows = []
+    for item in items:
+        product = products[item.product_id]
+        subtotal = product.price * item.quantity
+        total_amount += subtotal
+        item_rows.append({
+            "product_id": product.id,
+            "quantity": item.quantity,
+            "unit_price": product.price,
+            "subtotal": subtotal
+        })
+    return total_amount, item_rows
+
+def movement_rows(item_rows):
+    return [
+        {
+            "product_id": row["product_id"],
+            "quantity_change": -row["quantity"], # Negativo pois é saída
+            "movement_type": models.StockMovementType.SALE,
+            "description": "Venda PDV"
+        }
+        for row in item_rows
+    ]
 
 @router.post("/", response_model=schemas.SaleResponse)
 async def create_sale(
@@ -38,90 +91,274 @@ async def create_sale(
     x_terminal_id: str = Header(..., alias="x-terminal-id") # Lê o Header obrigatório
 
 ):
-    # 1. Verificar se o usuário tem uma sessão de caixa ABERTA
-    # Buscamos a última sessão do usuário que ainda não tem 'end_time'
-    query_session = select(models.CashierSession).where(
-        models.CashierSession.terminal_id == x_terminal_id,
-        models.CashierSession.status == "open"
-    )
-    result_session = await db.execute(query_session)
-    cashier_session = result_session.scalars().first()
-
-    if not cashier_session:
+    # 1. Verificar se o terminal tem uma sessão de caixa ABERTA (cache em memória)
+    if await cashier_sessions.find_open_session_id(db, x_terminal_id) is None:
         raise HTTPException(
             status_code=400, 
             detail="Você precisa abrir o caixa antes de realizar vendas."
         )
 
-    # Inicia variáveis da venda
-    total_amount = 0.0
-    db_sale_items = []
-    
-    # 2. Processar cada item da venda
-    for item in sale_in.items:
-        # Busca o produto
-        result_prod = await db.execute(select(models.Product).where(models.Product.id == item.product_id))
-        product = result_prod.scalars().first()
-
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Produto ID {item.product_id} não encontrado")
-
-        # Verifica estoque
-        if product.stock_quantity < item.quantity:
+    # Reenvio (ex: terminal perdeu a conexão e tentou de novo): devolve a venda já gravada
+    if sale_in.sale_uuid:
+        existing_sale = await get_sale_by_uuid(db, sale_in.sale_uuid)
+        if existing_sale:
+            return existing_sale
+
+    requested = sum_quantities(sale_in.items)
+
+    try:
+        # 2. Baixa de Estoque: um único UPDATE condicional para o carrinho inteiro.
+        # O próprio UPDATE devolve nome e preço ATUAL dos produtos.
+        products = await inventory.remove_stock(db, requested)
+
+        # 3. Monta os itens em memória
+        total_amount, item_rows = build_item_rows(sale_in.items, products)
+
+        # Soma nos totais da sessão (e confirma que o caixa continua aberto)
+        session_id = await cashier_sessions.register_sales(
+            db, x_terminal_id, {sale_in.payment_method: total_amount}, 1
+        )
+        if session_id is None:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Estoque insuficiente para '{product.name}'. Disponível: {product.stock_quantity}"
+                detail="Você precisa abrir o caixa antes de realizar vendas."
             )
 
-        # 3. Baixa de Estoque
-        product.stock_quantity -= item.quantity
-        
-        # 4. Registrar Movimentação de Estoque (Auditoria)
-        stock_move = models.StockMovement(
-            product_id=product.id,
-            quantity_change=-item.quantity, # Negativo pois é saída
-            movement_type=models.StockMovementType.SALE,
-            description=f"Venda PDV"
+        # 4. Criar a Venda (RETURNING traz id e data sem precisar de outro SELECT).
+        # ON CONFLICT cobre o reenvio simultâneo: se outra requisição gravou o mesmo UUID,
+        # nada é retornado e desfazemos a baixa de estoque desta.
+        result_sale = await db.execute(
+            pg_insert(models.Sale).values(
+                user_id=current_user.id,
+                session_id=session_id,
+                total_amount=total_amount,
+                payment_method=sale_in.payment_method,
+                status=models.SaleStatus.COMPLETED,
+                sale_uuid=sale_in.sale_uuid
+            ).on_conflict_do_nothing(
+                index_elements=[models.Sale.sale_uuid]
+            ).returning(models.Sale.id, models.Sale.timestamp)
         )
-        db.add(stock_move)
+        inserted = result_sale.first()
 
-        # Prepara o Item da Venda
-        # Importante: Pegamos o preço ATUAL do produto para salvar no histórico da venda
-        subtotal = product.price * item.quantity
-        total_amount += subtotal
+        if inserted is None:
+            await db.rollback()
+            return await get_sale_by_uuid(db, sale_in.sale_uuid)
+
+        sale_id, sale_timestamp = inserted
+
+        # 5. Inserções em lote: itens e auditoria de estoque
+        if item_rows:
+            for row in item_rows:
+                row["sale_id"] = sale_id
+            await db.execute(insert(models.SaleItem), item_rows)
+
+        await inventory.record_movements(db, movement_rows(item_rows))
+
+        # Consolidados do dashboard
+        await rollups.apply_sales(db, x_terminal_id, [
+            {"timestamp": sale_timestamp, "total_amount": total_amount, "items": item_rows}
+        ])
+
+        # Commit atômico: Se algo falhar acima, nada é salvo
+        await db.commit()
+        invalidate_reports()
+        metrics.sales_created_total.inc("single")
+        metrics.sale_items_total.inc(amount=len(item_rows))
+        metrics.sales_amount_total.inc(amount=total_amount)
+    except HTTPException:
+        await db.rollback()
+        raise
+    except inventory.ProductNotFoundError as e:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    except inventory.InsufficientStockError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # 6. Resposta montada com o que já está em memória (sem re-consultar o banco)
+    return {
+        "id": sale_id,
+        "total_amount": total_amount,
+        "payment_method": sale_in.payment_method,
+        "timestamp": sale_timestamp,
+        "status": models.SaleStatus.COMPLETED,
+        "sale_uuid": sale_in.sale_uuid,
+        "items": [
+            {
+                **row,
+                "product": {
+                    "name": products[row["product_id"]].name,
+                    "is_weighted": bool(products[row["product_id"]].is_weighted)
+                }
+            }
+            for row in item_rows
+        ]
+    }
+
+@router.post("/batch", response_model=schemas.SaleBatchResponse)
+async def create_sales_batch(
+    batch: schemas.SaleBatchCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    x_terminal_id: str = Header(..., alias="x-terminal-id")
+):
+    """
+    Recebe a fila de vendas feitas offline pelo terminal de uma só vez.
 
-        sale_item = models.SaleItem(
-            product_id=product.id,
-            quantity=item.quantity,
-            unit_price=product.price,
-            subtotal=subtotal
+    Cada venda recebe seu próprio status: 'created', 'duplicate' (UUID já gravado,
+    reenvio seguro) ou 'rejected' (produto inexistente / estoque insuficiente).
+    Vendas rejeitadas não impedem a gravação das demais.
+    """
+    if len(batch.sales) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Envie no máximo {MAX_BATCH_SIZE} vendas por lote.")
+
+    if await cashier_sessions.find_open_session_id(db, x_terminal_id) is None:
+        raise HTTPException(
+            status_code=400, 
+            detail="Você precisa abrir o caixa antes de realizar vendas."
         )
-        db_sale_items.append(sale_item)
-
-    # 5. Criar a Venda
-    new_sale = models.Sale(
-        user_id=current_user.id,
-        session_id=cashier_session.id,
-        total_amount=total_amount,
-        payment_method=sale_in.payment_method,
-        status=models.SaleStatus.COMPLETED,
-        items=db_sale_items # O SQLAlchemy resolve as FKs aqui
-    )
 
-    db.add(new_sale)
-    
-    # Commit atômico: Se algo falhar acima, nada é salvo
+    results = [None] * len(batch.sales)
+
     try:
-        await db.commit()
-        query = select(models.Sale).where(models.Sale.id == new_sale.id).options(
-            selectinload(models.Sale.items).selectinload(models.SaleItem.product)
+        # 1. UUIDs que já estão no banco (uma única consulta)
+        uuids = [sale_in.sale_uuid for sale_in in batch.sales]
+        result_existing = await db.execute(
+            select(models.Sale.sale_uuid, models.Sale.id).where(models.Sale.sale_uuid.in_(uuids))
         )
-        result = await db.execute(query)
-        final_sale = result.scalars().first()
-        
-        return final_sale
+        existing = {row.sale_uuid: row.id for row in result_existing}
+
+        # 2. Trava todos os produtos do lote de uma vez e decide em memória, na ordem
+        # em que as vendas aconteceram, quais cabem no estoque
+        products = await inventory.lock_products(
+            db, {item.product_id for sale_in in batch.sales for item in sale_in.items}
+        )
+        available = {product_id: product.stock_quantity for product_id, product in products.items()}
+
+        accepted = []
+        seen = set()
+        for position, sale_in in enumerate(batch.sales):
+            if sale_in.sale_uuid in existing or sale_in.sale_uuid in seen:
+                results[position] = schemas.SaleBatchItemResult(
+                    sale_uuid=sale_in.sale_uuid, status="duplicate", sale_id=existing.get(sale_in.sale_uuid)
+                )
+                continue
+            seen.add(sale_in.sale_uuid)
+
+            requested = sum_quantities(sale_in.items)
+            missing = [product_id for product_id in requested if product_id not in products]
+            shortages = [
+                f"Estoque insuficiente para '{products[product_id].name}'. Disponível: {available[product_id]}"
+                for product_id, quantity in requested.items()
+                if product_id in products and available[product_id] < quantity
+            ]
+            if missing or shortages:
+                detail = f"Produto ID {missing[0]} não encontrado" if missing else "; ".join(shortages)
+                results[position] = schemas.SaleBatchItemResult(
+                    sale_uuid=sale_in.sale_uuid, status="rejected", detail=detail
+                )
+                continue
+
+            for product_id, quantity in requested.items():
+                available[product_id] -= quantity
+
+            total_amount, item_rows = build_item_rows(sale_in.items, products)
+            accepted.append((position, sale_in, total_amount, item_rows))
+
+        if accepted:
+            # Soma nos totais da sessão (e confirma que o caixa continua aberto)
+            payment_totals = {}
+            for _, sale_in, total_amount, _ in accepted:
+                payment_totals[sale_in.payment_method] = payment_totals.get(sale_in.payment_method, 0.0) + total_amount
+            session_id = await cashier_sessions.register_sales(db, x_terminal_id, payment_totals, len(accepted))
+            if session_id is None:
+                raise HTTPException(
+                    status_code=400, 
+                    detail="Você precisa abrir o caixa antes de realizar vendas."
+                )
+
+            # 3. INSERT em lote das vendas. ON CONFLICT ignora UUIDs gravados por
+            # outra requisição concorrente (viram 'duplicate')
+            # Todas as linhas do executemany precisam das mesmas chaves: venda sem hora
+            # do terminal recebe a hora de chegada (mesmo valor para o lote todo)
+            received_at = datetime.now(timezone.utc)
+            sale_rows = [
+                {
+                    "user_id": current_user.id,
+                    "session_id": session_id,
+                    "total_amount": total_amount,
+                    "payment_method": sale_in.payment_method,
+                    "status": models.SaleStatus.COMPLETED,
+                    "sale_uuid": sale_in.sale_uuid,
+                    "timestamp": sale_in.timestamp or received_at
+                }
+                for _, sale_in, total_amount, _ in accepted
+            ]
+
+            result_sales = await db.execute(
+                pg_insert(models.Sale).on_conflict_do_nothing(
+                    index_elements=[models.Sale.sale_uuid]
+                ).returning(models.Sale.id, models.Sale.sale_uuid, models.Sale.timestamp),
+                sale_rows
+            )
+            inserted = {row.sale_uuid: row for row in result_sales}
+
+            # 4. Itens, baixa de estoque e auditoria só das vendas efetivamente gravadas
+            all_items = []
+            requested = {}
+            not_inserted = {}
+            rollup_sales = []
+            for position, sale_in, total_amount, item_rows in accepted:
+                inserted_row = inserted.get(sale_in.sale_uuid)
+                sale_id = inserted_row.id if inserted_row else None
+                results[position] = schemas.SaleBatchItemResult(
+                    sale_uuid=sale_in.sale_uuid,
+                    status="created" if sale_id else "duplicate",
+                    sale_id=sale_id
+                )
+                if not sale_id:
+                    not_inserted[sale_in.payment_method] = not_inserted.get(sale_in.payment_method, 0.0) - total_amount
+                    continue
+                for row in item_rows:
+                    row["sale_id"] = sale_id
+                    requested[row["product_id"]] = requested.get(row["product_id"], 0.0) + row["quantity"]
+                all_items.extend(item_rows)
+                rollup_sales.append(
+                    {"timestamp": inserted_row.timestamp, "total_amount": total_amount, "items": item_rows}
+                )
+
+            # Estorna dos totais as vendas gravadas por uma requisição concorrente
+            if not_inserted:
+                await cashier_sessions.add_to_totals(db, session_id, not_inserted, len(inserted) - len(accepted))
+
+            # As linhas estão travadas desde o passo 2, então a baixa não falha aqui
+            await inventory.remove_stock(db, requested, lock=False)
+            if all_items:
+                await db.execute(insert(models.SaleItem), all_items)
+            await inventory.record_movements(db, movement_rows(all_items))
+            await rollups.apply_sales(db, x_terminal_id, rollup_sales)
+
+        await db.commit()
+        if accepted:
+            invalidate_reports()
+            metrics.sales_created_total.inc("batch", amount=len(rollup_sales))
+            metrics.sale_items_total.inc(amount=len(all_items))
+            metrics.sales_amount_total.inc(amount=sum(sale["total_amount"] for sale in rollup_sales))
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-    return new_sale
\ No newline at end of file
+    statuses = [result.status for result in results]
+    return {
+        "created": statuses.count("created"),
+        "duplicates": statuses.count("duplicate"),
+        "rejected": statuses.count("rejected"),
+        "results": results
+    }
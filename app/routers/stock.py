@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
 from datetime import date, datetime
 from pydantic import BaseModel
-from app.database import get_db
-from app import models
+from app.database import get_read_db
+from app import models, pagination
 from app.dependencies import allow_manager, get_current_user
 
 router = APIRouter(prefix="/stock", tags=["Stock"])
@@ -25,11 +25,14 @@ class StockMovementResponse(BaseModel):
 # Rota de Histórico
 @router.get("/history", response_model=List[StockMovementResponse], dependencies=[Depends(allow_manager)])
 async def get_stock_history(
+    response: Response,
     movement_type: Optional[str] = None, # entry, sale, loss
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     product_id: Optional[int] = None,
-    db: AsyncSession = Depends(get_db),
+    limit: int = pagination.DEFAULT_LIMIT,
+    cursor: Optional[str] = None, # Valor do header X-Next-Cursor da página anterior
+    db: AsyncSession = Depends(get_read_db), # Réplica, se houver
     current_user: models.User = Depends(get_current_user)
 ):
     # Join para pegar o nome do produto
@@ -49,14 +52,17 @@ async def get_stock_history(
     if product_id:
         query = query.where(models.StockMovement.product_id == product_id)
 
-    # Ordenação: Mais recente primeiro
-    query = query.order_by(models.StockMovement.timestamp.desc())
+    # Ordenação: Mais recente primeiro, paginado por (timestamp, id)
+    query = pagination.paginate(query, [models.StockMovement.timestamp, models.StockMovement.id], cursor, limit)
 
     result = await db.execute(query)
+    rows = pagination.finish_page(
+        result.all(), limit, response, lambda row: (row[0].timestamp, row[0].id)
+    )
     
     # Montar resposta (Já que o join retorna uma tupla)
     history = []
-    for movement, product_name in result:
+    for movement, product_name in rows:
         history.append({
             "id": movement.id,
             "product_name": product_name,
@@ -7,7 +7,7 @@ from typing import List, Optional
 from pydantic import BaseModel
 from app.database import get_db
 from app import models, auth
-from app.dependencies import allow_manager, allow_admin_only, get_current_user
+from app.dependencies import allow_manager, allow_admin_only, get_current_user, invalidate_user, publish_user_change
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -63,14 +63,24 @@ async def update_user(user_id: int, user_in: UserUpdate, db: AsyncSession = Depe
         
     # Atualiza campos se enviados
     if user_in.name: user.name = user_in.name
-    if user_in.role: user.role = user_in.role
-    if user_in.is_active is not None: user.is_active = user_in.is_active
+    if user_in.role and user_in.role != user.role:
+        # Troca de perfil também derruba os tokens
+        user.role = user_in.role
+        user.credential_version += 1
+    if user_in.is_active is not None:
+        # Inativação derruba os tokens já emitidos
+        if user.is_active and not user_in.is_active:
+            user.credential_version += 1
+        user.is_active = user_in.is_active
     
-    # Se enviou senha nova, faz o hash
+    # Se enviou senha nova, faz o hash (e invalida os tokens antigos)
     if user_in.password:
-        user.hashed_password = auth.get_password_hash(user_in.password)
+        user.hashed_password = await auth.hash_password(user_in.password)
+        user.credential_version += 1
 
+    await publish_user_change(db, user.username) # Os demais workers descartam o cache no commit
     await db.commit()
+    invalidate_user(user.username)
     return {"message": "Usuário atualizado com sucesso"}
 
 # 4. Deletar Usuário (Físico - Só se não tiver histórico)
@@ -87,7 +97,9 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db),
     # (Poderíamos checar tabela por tabela, mas o IntegrityError do banco já faz isso)
     try:
         await db.delete(user)
+        await publish_user_change(db, user.username)
         await db.commit()
+        invalidate_user(user.username)
         return {"message": "Usuário excluído permanentemente"}
     except IntegrityError:
         await db.rollback()
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from uuid import UUID
 
 
 from app.models import SaleStatus
@@ -33,6 +34,25 @@ class ProductResponse(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductScanResponse(BaseModel):
+    # Dados para a leitura do scanner (sem estoque, que muda a cada venda)
+    id: int
+    name: str
+    barcode: Optional[str] = None
+    price: float
+    category: Optional[str] = None
+    is_active: bool
+    is_weighted: Optional[bool] = False
+
+    class Config:
+        from_attributes = True
+
+class ProductChangesResponse(BaseModel):
+    products: List[ProductResponse] # Criados ou alterados desde o cursor
+    deleted_ids: List[int] # Excluídos desde o cursor
+    cursor: str # Enviar no próximo ?since=
+    has_more: bool # Se True, chame de novo imediatamente com o novo cursor
+
 class ProductUpdate(BaseModel):
     name: str
     barcode: Optional[str] = None
@@ -43,6 +63,37 @@ class ProductUpdate(BaseModel):
     is_active: Optional[bool] = None
     is_weighted: Optional[bool] = None # <--- NOVO CAMPO
 
+# Importação em massa (POST /products/import): uma linha do arquivo, upsert pelo código de barras.
+# Campo ausente ou vazio (None) mantém o valor do produto já cadastrado. Produto novo
+# precisa de name, price e cost_price; os demais recebem o padrão de ProductBase.
+class ProductImportRow(BaseModel):
+    name: Optional[str] = Field(None, min_length=1)
+    barcode: str = Field(min_length=1)
+    price: Optional[float] = Field(None, ge=0)
+    cost_price: Optional[float] = Field(None, ge=0)
+    category: Optional[str] = None
+    min_stock: Optional[float] = None
+    is_active: Optional[bool] = None
+    is_weighted: Optional[bool] = None
+    stock_quantity: float = Field(0.0, ge=0) # Entrada de estoque: somada ao saldo atual
+
+class ProductImportError(BaseModel):
+    row: int # Linha do CSV (o cabeçalho é a 1) ou posição na lista do JSON (a partir de 1)
+    barcode: Optional[str] = None
+    detail: str
+
+class ProductImportResponse(BaseModel):
+    created: int
+    updated: int
+    stock_entries: int # Movimentações de entrada gravadas
+    errors: List[ProductImportError] # Linhas ignoradas (as demais foram importadas)
+
+class StockShortage(BaseModel):
+    product_id: int
+    name: str
+    requested: float
+    available: float
+
 class UserResponse(BaseModel):
     id: int
     name: str
@@ -61,6 +112,26 @@ class SaleItemCreate(BaseModel):
 class SaleCreate(BaseModel):
     payment_method: str
     items: List[SaleItemCreate]
+    sale_uuid: Optional[UUID] = None # Gerado pelo terminal; reenvios com o mesmo UUID não duplicam a venda
+
+class SaleBatchItem(SaleCreate):
+    sale_uuid: UUID # Obrigatório no envio em lote (fila offline)
+    timestamp: Optional[datetime] = None # Hora real da venda no terminal
+
+class SaleBatchCreate(BaseModel):
+    sales: List[SaleBatchItem]
+
+class SaleBatchItemResult(BaseModel):
+    sale_uuid: UUID
+    status: str # created, duplicate, rejected
+    sale_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class SaleBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[SaleBatchItemResult]
 
 class SaleItemResponse(BaseModel):
     product_id: int
@@ -78,6 +149,7 @@ class SaleResponse(BaseModel):
     payment_method: str
     timestamp: datetime
     status: SaleStatus
+    sale_uuid: Optional[UUID] = None
     items: List[SaleItemResponse]
     seller: Optional[UserResponse] = None
     class Config:
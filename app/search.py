@@ -0,0 +1,114 @@
+"""
+Busca de produtos por digitação (nome, código de barras, categoria) para o caixa.
+
+Sem diferença de maiúsculas e acentos ("acucar" acha "Açúcar") e tolerante a
+erros de digitação. Tudo atendido por índices (app/models.py):
+
+- prefixo do nome: btree em f_unaccent(lower(name)) com text_pattern_ops,
+  usado nas buscas de 1-2 letras (trigramas precisam de 3);
+- trecho e palavra parecida no nome e na categoria: GIN pg_trgm;
+- prefixo do código de barras: btree com varchar_pattern_ops.
+
+A ordem combina relevância (código exato, começo do nome, semelhança das
+palavras) e popularidade (quantidade vendida desde sempre, em
+product_sales_totals): entre "Coca-Cola 2L" e "Coca-Cola 350ml Zero", o mais
+vendido vem primeiro.
+
+f_unaccent é um invólucro IMMUTABLE de unaccent() (que não é, e por isso não
+pode ser usado em índice). Criado pela migração ou, em banco novo, na
+inicialização (ensure_search_functions).
+"""
+import unicodedata
+
+from sqlalchemy import select, func, or_, case, literal, text, Float
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app import models
+
+# Abaixo disso, trigramas não ajudam: só busca por prefixo
+MIN_FUZZY_LENGTH = 3
+# Peso da popularidade na ordem (ln(1 + quantidade vendida) * peso); a relevância vai de 0 a ~5
+POPULARITY_WEIGHT = 0.05
+MAX_LIMIT = 50
+
+SEARCH_LOCK_KEY = 4_207_003
+
+SETUP_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # Dicionário qualificado pelo schema: o resultado não depende do search_path
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+]
+
+
+async def ensure_search_functions(conn: AsyncConnection):
+    """Extensões e f_unaccent, antes do create_all (os índices de busca dependem delas)."""
+    if await conn.scalar(text("SELECT to_regprocedure('f_unaccent(text)') IS NOT NULL")):
+        return
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEARCH_LOCK_KEY})
+    for statement in SETUP_STATEMENTS:
+        await conn.execute(text(statement))
+
+
+def searchable(column):
+    """Mesma expressão dos índices: minúsculas e sem acentos."""
+    return func.f_unaccent(func.lower(column))
+
+
+def normalize(term: str) -> str:
+    """Termo digitado em minúsculas e sem acentos (equivale a f_unaccent(lower()) no banco)."""
+    decomposed = unicodedata.normalize("NFKD", term.strip().lower())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_query(term: str, limit: int = 20, active_only: bool = True):
+    """Consulta dos produtos que casam com `term`, já ordenada. None se o termo for vazio."""
+    normalized = normalize(term)
+    if not normalized:
+        return None
+    raw = term.strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    Product = models.Product
+    name = searchable(Product.name)
+    prefix = f"{_like_escape(normalized)}%"
+    barcode_prefix = f"{_like_escape(raw)}%"
+
+    if len(normalized) < MIN_FUZZY_LENGTH:
+        matches = [name.like(prefix), Product.barcode.like(barcode_prefix)]
+        similarity = literal(0.0, Float)
+    else:
+        contains = f"%{_like_escape(normalized)}%"
+        matches = [
+            name.like(contains),
+            # Palavra parecida (erro de digitação): "refrigerant" acha "Refrigerante"
+            literal(normalized).op("<%")(name),
+            searchable(Product.category).like(contains),
+            Product.barcode.like(barcode_prefix),
+        ]
+        similarity = func.word_similarity(normalized, name, type_=Float)
+
+    popularity = func.ln(1 + func.greatest(func.coalesce(models.ProductSalesTotal.quantity, 0), 0), type_=Float)
+    rank = (
+        case((Product.barcode == raw, 3), else_=0)
+        + case((name.like(prefix), 1), else_=0)
+        + similarity
+        + POPULARITY_WEIGHT * popularity
+    )
+
+    query = (
+        select(Product)
+        .outerjoin(models.ProductSalesTotal, models.ProductSalesTotal.product_id == Product.id)
+        .where(or_(*matches))
+        .order_by(rank.desc(), Product.id)
+        .limit(limit)
+    )
+    if active_only:
+        query = query.where(Product.is_active == True)
+    return query
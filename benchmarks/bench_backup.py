@@ -0,0 +1,122 @@
+"""
+Benchmark do backup: tempo, tamanho e pico de memória do exportador em streaming
+(.tar com um segmento gzip por tabela, tabelas em paralelo) contra um banco com
+milhões de linhas.
+
+ATENÇÃO: use um banco de TESTE vazio. Com --seed, o script insere dados
+sintéticos (via generate_series, direto no PostgreSQL).
+
+Uso:
+    python -m benchmarks.bench_backup --seed --sales 1000000
+    python -m benchmarks.bench_backup            # só mede, sem popular
+    python -m benchmarks.bench_backup --parallel 1 --parallel 4   # compara paralelismos
+    python -m benchmarks.bench_backup --legacy   # mede também o caminho antigo (json.dump)
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+from app.database import engine, Base
+from app import models, backups
+from app.config import settings
+
+
+def peak_rss_mb():
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(n_sales, n_products):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(
+            "INSERT INTO users (name, username, hashed_password, role, is_active) "
+            "VALUES ('Bench', 'bench_backup', '-', 'SELLER', true) ON CONFLICT (username) DO NOTHING"
+        ))
+        user_id = (await conn.execute(text("SELECT id FROM users WHERE username = 'bench_backup'"))).scalar()
+        await conn.execute(text(
+            "INSERT INTO products (name, price, cost_price, stock_quantity, min_stock, is_active, is_weighted) "
+            "SELECT 'Produto ' || g, 1 + g % 50, 0.5, 1000, 5, true, false FROM generate_series(1, :n) g"
+        ), {"n": n_products})
+        session_id = (await conn.execute(text(
+            "INSERT INTO cashier_sessions (user_id, terminal_id, initial_balance, status) "
+            "VALUES (:u, 'BENCH', 0, 'closed') RETURNING id"
+        ), {"u": user_id})).scalar()
+        first_product = (await conn.execute(text("SELECT min(id) FROM products"))).scalar()
+        await conn.execute(text(
+            "INSERT INTO sales (user_id, session_id, total_amount, payment_method, status, timestamp) "
+            "SELECT :u, :s, 10, 'dinheiro', 'COMPLETED', now() - (g || ' seconds')::interval "
+            "FROM generate_series(1, :n) g"
+        ), {"u": user_id, "s": session_id, "n": n_sales})
+        # 3 itens e 3 movimentações por venda
+        await conn.execute(text(
+            "INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, subtotal) "
+            "SELECT s.id, :p + ((s.id * 7 + k) % :np), 1, 3.33, 3.33 "
+            "FROM sales s CROSS JOIN generate_series(1, 3) k WHERE s.session_id = :s"
+        ), {"p": first_product, "np": n_products, "s": session_id})
+        await conn.execute(text(
+            "INSERT INTO stock_movements (product_id, quantity_change, movement_type, description, timestamp) "
+            "SELECT product_id, -quantity, 'SALE', 'Venda PDV', now() FROM sale_items"
+        ))
+
+
+async def legacy_backup(path):
+    """Caminho antigo: carrega tudo em objetos ORM e faz um único json.dump com indent."""
+    from app.database import SessionLocal
+
+    def to_dict(obj):
+        return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+
+    async with SessionLocal() as db:
+        data = {"version": "1.0", "timestamp": datetime.now().isoformat()}
+        for name, model in backups.BACKUP_TABLES:
+            rows = (await db.execute(select(model))).scalars().all()
+            data[name] = [to_dict(r) for r in rows]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=backups.json_serial, indent=2)
+
+
+async def main(args):
+    if args.seed:
+        print(f"Populando: {args.sales} vendas, {args.sales * 3} itens, {args.sales * 3} movimentações...")
+        await seed(args.sales, args.products)
+
+    for parallel in args.parallel or [None]:
+        filename = f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar"
+        start = time.perf_counter()
+        counts = await backups.export_backup(filename, parallel=parallel)
+        elapsed = time.perf_counter() - start
+        path = os.path.join(backups.BACKUP_DIR, filename)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        label = f"paralelo={parallel or settings.BACKUP_PARALLEL_DUMPS}"
+        print(f"streaming ({label}): {sum(counts.values())} linhas em {elapsed:.1f}s | "
+              f"arquivo {size_mb:.1f} MB | pico de memória {peak_rss_mb():.0f} MB")
+        os.remove(path)
+
+    if args.legacy:
+        legacy_path = os.path.join(backups.BACKUP_DIR, "bench_legacy.json")
+        start = time.perf_counter()
+        await legacy_backup(legacy_path)
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(legacy_path) / 1024 / 1024
+        print(f"antigo:    {elapsed:.1f}s | arquivo {size_mb:.1f} MB | pico de memória {peak_rss_mb():.0f} MB")
+        os.remove(legacy_path)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--parallel", type=int, action="append", help="Tabelas em paralelo (repita para comparar)")
+    parser.add_argument("--legacy", action="store_true", help="Mede o caminho antigo depois (o pico de memória é do processo inteiro)")
+    args = parser.parse_args()
+    asyncio.run(main(args))
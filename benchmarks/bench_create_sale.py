@@ -0,0 +1,141 @@
+"""
+Benchmark do POST /sales/: compara o caminho antigo (uma consulta por item do
+carrinho + re-consulta após o commit) com o pipeline em lote atual.
+
+Uso:
+    python -m benchmarks.bench_create_sale [--runs 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import selectinload
+
+from app.database import engine, Base, SessionLocal
+from app import models, schemas
+from app.routers.sales import create_sale
+
+CART_SIZES = [1, 10, 50, 200]
+
+
+async def legacy_create_sale(sale_in, current_user, db, x_terminal_id):
+    """Cópia do caminho original (um round-trip por linha), usada só para comparação."""
+    result_session = await db.execute(select(models.CashierSession).where(
+        models.CashierSession.terminal_id == x_terminal_id,
+        models.CashierSession.status == "open"
+    ))
+    cashier_session = result_session.scalars().first()
+
+    total_amount = 0.0
+    db_sale_items = []
+    for item in sale_in.items:
+        result_prod = await db.execute(select(models.Product).where(models.Product.id == item.product_id))
+        product = result_prod.scalars().first()
+        product.stock_quantity -= item.quantity
+        db.add(models.StockMovement(
+            product_id=product.id,
+            quantity_change=-item.quantity,
+            movement_type=models.StockMovementType.SALE,
+            description="Venda PDV"
+        ))
+        subtotal = product.price * item.quantity
+        total_amount += subtotal
+        db_sale_items.append(models.SaleItem(
+            product_id=product.id, quantity=item.quantity,
+            unit_price=product.price, subtotal=subtotal
+        ))
+
+    new_sale = models.Sale(
+        user_id=current_user.id,
+        session_id=cashier_session.id,
+        total_amount=total_amount,
+        payment_method=sale_in.payment_method,
+        status=models.SaleStatus.COMPLETED,
+        items=db_sale_items
+    )
+    db.add(new_sale)
+    await db.commit()
+    result = await db.execute(select(models.Sale).where(models.Sale.id == new_sale.id).options(
+        selectinload(models.Sale.items).selectinload(models.SaleItem.product)
+    ))
+    return result.scalars().first()
+
+
+async def seed(terminal_id):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        user = models.User(
+            name="Benchmark", username=f"bench_{uuid.uuid4().hex[:8]}",
+            hashed_password="-", role=models.UserRole.SELLER, is_active=True
+        )
+        db.add(user)
+        products = [
+            models.Product(
+                name=f"Produto Bench {i}", price=1.0 + i, cost_price=0.5,
+                stock_quantity=1_000_000, is_active=True, is_weighted=False
+            )
+            for i in range(max(CART_SIZES))
+        ]
+        db.add_all(products)
+        await db.flush()
+        db.add(models.CashierSession(
+            user_id=user.id, terminal_id=terminal_id, initial_balance=0.0, status="open"
+        ))
+        await db.commit()
+        return user, [p.id for p in products]
+
+
+async def measure(fn, user, product_ids, terminal_id, cart_size, runs):
+    sale_in = schemas.SaleCreate(
+        payment_method="dinheiro",
+        items=[schemas.SaleItemCreate(product_id=pid, quantity=1) for pid in product_ids[:cart_size]]
+    )
+    timings = []
+    for _ in range(runs):
+        async with SessionLocal() as db:
+            start = time.perf_counter()
+            await fn(sale_in=sale_in, current_user=user, db=db, x_terminal_id=terminal_id)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+async def cleanup(user, product_ids, terminal_id):
+    async with SessionLocal() as db:
+        sale_ids = select(models.Sale.id).where(models.Sale.user_id == user.id)
+        await db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id.in_(sale_ids)))
+        await db.execute(delete(models.Sale).where(models.Sale.user_id == user.id))
+        await db.execute(delete(models.StockMovement).where(models.StockMovement.product_id.in_(product_ids)))
+        await db.execute(delete(models.CashierSession).where(models.CashierSession.user_id == user.id))
+        # Consolidados gerados pelas vendas do teste (referenciam os produtos)
+        await db.execute(delete(models.DailyProductSales).where(models.DailyProductSales.product_id.in_(product_ids)))
+        await db.execute(delete(models.ProductSalesTotal).where(models.ProductSalesTotal.product_id.in_(product_ids)))
+        await db.execute(delete(models.DailySales).where(models.DailySales.terminal_id == terminal_id))
+        await db.execute(delete(models.Product).where(models.Product.id.in_(product_ids)))
+        await db.execute(delete(models.User).where(models.User.id == user.id))
+        await db.commit()
+
+
+async def main(runs):
+    terminal_id = f"BENCH-{uuid.uuid4().hex[:6]}"
+    user, product_ids = await seed(terminal_id)
+    try:
+        print(f"{'itens':>6} | {'antigo p50 (ms)':>16} | {'lote p50 (ms)':>14} | {'ganho':>6}")
+        for size in CART_SIZES:
+            legacy_p50, _ = await measure(legacy_create_sale, user, product_ids, terminal_id, size, runs)
+            batch_p50, _ = await measure(create_sale, user, product_ids, terminal_id, size, runs)
+            print(f"{size:>6} | {legacy_p50:>16.2f} | {batch_p50:>14.2f} | {legacy_p50 / batch_p50:>5.1f}x")
+    finally:
+        await cleanup(user, product_ids, terminal_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
@@ -0,0 +1,147 @@
+"""
+Benchmark de "troca de turno": muitos operadores fazendo login ao mesmo tempo
+enquanto os caixas continuam vendendo.
+
+Mede a vazão de logins (logins/s) e a latência do POST /sales/ em três fases:
+sem logins (referência), durante a rajada com o hash no pool de threads (atual)
+e, com --inline, durante a rajada com o Argon2 rodando no event loop (antigo).
+
+Uso:
+    python -m benchmarks.bench_login_storm [--logins 60] [--sellers 4]
+    python -m benchmarks.bench_login_storm --inline   # compara com o caminho antigo
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select, delete
+
+from app.database import engine, Base, SessionLocal
+from app import models, schemas, auth
+from app.config import settings
+from app.routers.auth import login_for_access_token
+from app.routers.sales import create_sale
+
+PASSWORD = "senha-benchmark"
+
+
+async def seed(terminal_id, n_users):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    hashed = await auth.hash_password(PASSWORD)
+    prefix = f"storm_{uuid.uuid4().hex[:6]}"
+    async with SessionLocal() as db:
+        users = [
+            models.User(name=f"Operador {i}", username=f"{prefix}_{i}", hashed_password=hashed,
+                        role=models.UserRole.SELLER, is_active=True)
+            for i in range(n_users)
+        ]
+        product = models.Product(
+            name="Produto Storm", price=1.0, cost_price=0.5,
+            stock_quantity=1_000_000, is_active=True, is_weighted=False
+        )
+        db.add_all(users + [product])
+        await db.flush()
+        db.add(models.CashierSession(
+            user_id=users[0].id, terminal_id=terminal_id, initial_balance=0.0, status="open"
+        ))
+        await db.commit()
+        return prefix, users[0], product.id
+
+
+async def login(username):
+    form = OAuth2PasswordRequestForm(username=username, password=PASSWORD)
+    async with SessionLocal() as db:
+        await login_for_access_token(form_data=form, db=db)
+
+
+async def login_inline(username):
+    """Caminho antigo: verificação do Argon2 direto no event loop."""
+    async with SessionLocal() as db:
+        user = (await db.execute(select(models.User).where(models.User.username == username))).scalars().first()
+        if not auth.verify_password(PASSWORD, user.hashed_password):
+            raise HTTPException(401)
+
+
+async def seller_loop(user, product_id, terminal_id, stop, latencies):
+    sale_in = schemas.SaleCreate(
+        payment_method="dinheiro",
+        items=[schemas.SaleItemCreate(product_id=product_id, quantity=1)]
+    )
+    while not stop.is_set():
+        async with SessionLocal() as db:
+            start = time.perf_counter()
+            await create_sale(sale_in=sale_in, current_user=user, db=db, x_terminal_id=terminal_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_phase(label, user, product_id, terminal_id, sellers, usernames, login_fn, idle_seconds):
+    stop = asyncio.Event()
+    latencies = []
+    loops = [asyncio.create_task(seller_loop(user, product_id, terminal_id, stop, latencies)) for _ in range(sellers)]
+
+    start = time.perf_counter()
+    if usernames:
+        await asyncio.gather(*(login_fn(name) for name in usernames))
+    else:
+        await asyncio.sleep(idle_seconds)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*loops)
+
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if ordered else 0.0
+    throughput = f"{len(usernames) / elapsed:6.1f} logins/s" if usernames else " " * 15
+    print(f"{label:<22} | {throughput} | vendas: {len(latencies):5d} | "
+          f"p50 {statistics.median(latencies) if latencies else 0:7.1f} ms | p95 {p95:7.1f} ms | "
+          f"máx {max(latencies, default=0):7.1f} ms")
+    return elapsed
+
+
+async def cleanup(prefix, product_id, terminal_id):
+    async with SessionLocal() as db:
+        user_ids = select(models.User.id).where(models.User.username.like(f"{prefix}_%"))
+        sale_ids = select(models.Sale.id).where(models.Sale.user_id.in_(user_ids))
+        await db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id.in_(sale_ids)))
+        await db.execute(delete(models.Sale).where(models.Sale.user_id.in_(user_ids)))
+        await db.execute(delete(models.StockMovement).where(models.StockMovement.product_id == product_id))
+        await db.execute(delete(models.CashierSession).where(models.CashierSession.user_id.in_(user_ids)))
+        await db.execute(delete(models.DailyProductSales).where(models.DailyProductSales.product_id == product_id))
+        await db.execute(delete(models.ProductSalesTotal).where(models.ProductSalesTotal.product_id == product_id))
+        await db.execute(delete(models.DailySales).where(models.DailySales.terminal_id == terminal_id))
+        await db.execute(delete(models.Product).where(models.Product.id == product_id))
+        await db.execute(delete(models.User).where(models.User.username.like(f"{prefix}_%")))
+        await db.commit()
+
+
+async def main(args):
+    terminal_id = f"STORM-{uuid.uuid4().hex[:6]}"
+    prefix, user, product_id = await seed(terminal_id, args.logins)
+    usernames = [f"{prefix}_{i}" for i in range(args.logins)]
+    print(f"Argon2: t={settings.ARGON2_TIME_COST} m={settings.ARGON2_MEMORY_COST} KiB "
+          f"p={settings.ARGON2_PARALLELISM} | threads de hash: {settings.PASSWORD_HASH_WORKERS} | "
+          f"{args.logins} logins, {args.sellers} caixas vendendo")
+    try:
+        storm = await run_phase("rajada (pool)", user, product_id, terminal_id, args.sellers,
+                                usernames, login, 0)
+        await run_phase("sem logins", user, product_id, terminal_id, args.sellers, [], None, storm)
+        if args.inline:
+            await run_phase("rajada (event loop)", user, product_id, terminal_id, args.sellers,
+                            usernames, login_inline, 0)
+    finally:
+        await cleanup(prefix, product_id, terminal_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=60)
+    parser.add_argument("--sellers", type=int, default=4)
+    parser.add_argument("--inline", action="store_true", help="Mede também o Argon2 no event loop (caminho antigo)")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,193 @@
+"""
+Verificação dos planos das consultas quentes: roda EXPLAIN em cada consulta
+usada pelas rotas de caixa, vendas, estoque e dashboard e falha (código de
+saída 1) se alguma delas cair em Seq Scan numa tabela grande. O mesmo
+cenário roda nos testes (tests/test_query_plans.py), dentro de uma transação
+desfeita no final; este script serve para volumes maiores e para ver os planos.
+
+As consultas são montadas com os mesmos modelos/filtros das rotas, então
+qualquer mudança nelas (ou nos índices) aparece aqui. Com tabelas pequenas o
+PostgreSQL prefere Seq Scan mesmo com índice; por isso use --seed em um banco
+de TESTE vazio antes da primeira execução.
+
+Uso:
+    python -m benchmarks.explain_hot_queries --seed    # popula e verifica
+    python -m benchmarks.explain_hot_queries           # só verifica
+    python -m benchmarks.explain_hot_queries --verbose # imprime os planos
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine, Base
+from app import models, pagination, search
+
+
+async def seed(conn, n_products, n_terminals, n_sales):
+    """Popula na transação de `conn` (o chamador decide entre commit e rollback)."""
+    await conn.execute(text(
+        "INSERT INTO users (name, username, hashed_password, role, is_active) "
+        "VALUES ('Bench', 'bench_explain', '-', 'SELLER', true) ON CONFLICT (username) DO NOTHING"
+    ))
+    user_id = (await conn.execute(text("SELECT id FROM users WHERE username = 'bench_explain'"))).scalar()
+    # 1 a cada 500 produtos abaixo do mínimo (o alerta do dashboard é seletivo)
+    await conn.execute(text(
+        "INSERT INTO products (name, price, cost_price, stock_quantity, min_stock, is_active, is_weighted) "
+        "SELECT 'Produto ' || g, 1 + g % 50, 0.5, CASE WHEN g % 500 = 0 THEN 1 ELSE 1000 END, 5, true, false "
+        "FROM generate_series(1, :n) g"
+    ), {"n": n_products})
+    # Um turno por dia nos últimos 200 dias, por terminal; só o de hoje fica aberto
+    await conn.execute(text(
+        "INSERT INTO cashier_sessions (user_id, terminal_id, initial_balance, status, start_time, end_time) "
+        "SELECT :u, 'EXPLAIN-' || t, 0, CASE WHEN d = 0 THEN 'open' ELSE 'closed' END, "
+        "now() - (d || ' days')::interval, CASE WHEN d = 0 THEN NULL ELSE now() - (d || ' days')::interval END "
+        "FROM generate_series(1, :t) t CROSS JOIN generate_series(0, 199) d"
+    ), {"u": user_id, "t": n_terminals})
+    first_session, n_sessions = (await conn.execute(text(
+        "SELECT min(id), count(*) FROM cashier_sessions WHERE terminal_id LIKE 'EXPLAIN-%'"
+    ))).one()
+    await conn.execute(text(
+        "INSERT INTO sales (user_id, session_id, total_amount, payment_method, status, timestamp) "
+        "SELECT :u, :s + g % :ns, 10, 'dinheiro', 'COMPLETED', now() - (g || ' minutes')::interval "
+        "FROM generate_series(1, :n) g"
+    ), {"u": user_id, "s": first_session, "ns": n_sessions, "n": n_sales})
+    first_product = (await conn.execute(text("SELECT min(id) FROM products"))).scalar()
+    await conn.execute(text(
+        "INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, subtotal) "
+        "SELECT s.id, :p + ((s.id * 7 + k) % :np), 1, 3.33, 3.33 "
+        "FROM sales s CROSS JOIN generate_series(1, 2) k WHERE s.user_id = :u"
+    ), {"p": first_product, "np": n_products, "u": user_id})
+    await conn.execute(text(
+        "INSERT INTO stock_movements (product_id, quantity_change, movement_type, description, timestamp) "
+        "SELECT i.product_id, -i.quantity, 'SALE', 'Venda PDV', s.timestamp "
+        "FROM sale_items i JOIN sales s ON s.id = i.sale_id WHERE s.user_id = :u"
+    ), {"u": user_id})
+
+
+async def analyze(conn):
+    """Atualiza as estatísticas, para o planejador enxergar o volume novo."""
+    for table in ("products", "cashier_sessions", "sales", "sale_items", "stock_movements"):
+        await conn.execute(text(f"ANALYZE {table}"))
+
+
+async def sample_values(conn):
+    """Valores reais do banco para os filtros (terminal, sessão, produto, dia)."""
+    terminal_id = (await conn.execute(
+        select(models.CashierSession.terminal_id).order_by(models.CashierSession.id.desc()).limit(1)
+    )).scalar()
+    session_id = (await conn.execute(select(models.Sale.session_id).limit(1))).scalar()
+    product_id = (await conn.execute(select(models.SaleItem.product_id).limit(1))).scalar()
+    sale_ids = (await conn.execute(
+        select(models.Sale.id).order_by(models.Sale.id.desc()).limit(pagination.DEFAULT_LIMIT)
+    )).scalars().all()
+    if terminal_id is None or session_id is None or product_id is None:
+        raise SystemExit("Banco vazio: rode com --seed primeiro.")
+    return terminal_id, session_id, product_id, sale_ids
+
+
+def hot_queries(terminal_id, session_id, product_id, sale_ids):
+    """(descrição, consulta) — espelham as rotas; ao mudar uma rota, atualize aqui."""
+    start_of_day = datetime.combine(datetime.now().date(), datetime.min.time())
+    end_of_day = datetime.combine(datetime.now().date(), datetime.max.time())
+    limit = pagination.DEFAULT_LIMIT
+    Session, Sale, SaleItem, Movement, Product = (
+        models.CashierSession, models.Sale, models.SaleItem, models.StockMovement, models.Product
+    )
+
+    return [
+        ("caixa aberto do terminal (/cashier/open, /sales)",
+         select(Session).where(Session.terminal_id == terminal_id, Session.status == "open")),
+        ("histórico de caixas do dia (/cashier/history)",
+         pagination.paginate(
+             select(Session).where(Session.start_time >= start_of_day, Session.start_time <= end_of_day),
+             [Session.start_time, Session.id], None, limit)),
+        ("vendas concluídas da sessão (fechamento)",
+         select(Sale).where(Sale.session_id == session_id, Sale.status == models.SaleStatus.COMPLETED)),
+        ("vendas da sessão, paginadas (/sales/session)",
+         pagination.paginate(select(Sale).where(Sale.session_id == session_id),
+                             [Sale.timestamp, Sale.id], None, limit)),
+        ("vendas do dia (relatórios)",
+         select(Sale).where(Sale.timestamp >= start_of_day, Sale.timestamp <= end_of_day)),
+        ("itens das vendas da página (selectinload)",
+         select(SaleItem).where(SaleItem.sale_id.in_(sale_ids))),
+        ("produto já vendido? (exclusão de produto)",
+         select(SaleItem).where(SaleItem.product_id == product_id).limit(1)),
+        ("movimentações do produto (/stock/history?product_id)",
+         pagination.paginate(select(Movement).where(Movement.product_id == product_id),
+                             [Movement.timestamp, Movement.id], None, limit)),
+        ("movimentações por período (/stock/history)",
+         pagination.paginate(
+             select(Movement).where(Movement.timestamp >= start_of_day - timedelta(days=7),
+                                    Movement.timestamp <= end_of_day),
+             [Movement.timestamp, Movement.id], None, limit)),
+        ("busca por digitação (/products/search)",
+         search.search_query(f"produto {product_id}")),
+        ("estoque baixo (dashboard)",
+         select(Product).where(Product.stock_quantity < Product.min_stock, Product.is_active == True)),
+    ]
+
+
+async def explain(conn, query) -> dict:
+    """Plano (EXPLAIN FORMAT JSON) da consulta, com os valores já no SQL, como o PostgreSQL planeja."""
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    raw = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+def seq_scans(plan) -> list[str]:
+    """Tabelas lidas com Seq Scan em qualquer nó do plano."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def main(args):
+    if args.seed:
+        print(f"Populando: {args.products} produtos, {args.terminals * 200} caixas, "
+              f"{args.sales} vendas, {args.sales * 2} itens/movimentações...")
+        async with engine.begin() as conn:
+            await search.ensure_search_functions(conn)
+            await conn.run_sync(Base.metadata.create_all)
+            await seed(conn, args.products, args.terminals, args.sales)
+        # ANALYZE depois do commit: as estatísticas valem também para as próximas execuções
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await analyze(conn)
+
+    failures = 0
+    try:
+        async with engine.connect() as conn:
+            queries = hot_queries(*await sample_values(conn))
+            for label, query in queries:
+                plan = await explain(conn, query)
+                tables = seq_scans(plan)
+                status = "FALHOU" if tables else "ok"
+                detail = f" (Seq Scan em {', '.join(tables)})" if tables else ""
+                print(f"[{status:^6}] {label}{detail}")
+                if args.verbose or tables:
+                    print(json.dumps(plan, indent=2, ensure_ascii=False))
+                failures += bool(tables)
+    finally:
+        await engine.dispose()
+
+    print(f"\n{len(queries) - failures}/{len(queries)} consultas usando índice")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", action="store_true", help="Popula o banco com dados sintéticos antes")
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--terminals", type=int, default=20)
+    parser.add_argument("--sales", type=int, default=200_000)
+    parser.add_argument("--verbose", action="store_true", help="Imprime o plano de todas as consultas")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,423 @@
+"""
+Gerador de carga de loja: N terminais vendendo ao mesmo tempo, cada um com o
+próprio `x-terminal-id` e token, mais gerentes consultando o dashboard.
+
+Cada terminal faz login (/token), abre o caixa e fica em loop:
+- lê os itens do carrinho no scanner (GET /products/barcode/{code});
+- registra a venda (POST /sales/);
+- consulta /cashier/status periodicamente, como o front faz.
+
+O tamanho do carrinho segue uma distribuição log-normal (maioria com poucos
+itens, alguns carrinhos grandes) e os produtos mais populares saem mais vezes
+(pesos 1/posição). Os gerentes alternam /reports/dashboard e /stock/history.
+
+Ao final imprime vazão e latência p50/p95/p99 por endpoint e salva o resultado
+em JSON (benchmarks/results/), para comparar execuções com --compare.
+
+Por padrão as requisições passam pela aplicação no próprio processo (ASGI, sem
+rede, só o PostgreSQL do .env). Com --url, vão por HTTP para um servidor já
+rodando (ex: uvicorn com vários workers) que use o MESMO banco.
+
+ATENÇÃO: use um banco de TESTE. Os dados criados são removidos no final.
+
+Uso:
+    python -m benchmarks.load_terminals --terminals 10 --duration 30
+    python -m benchmarks.load_terminals --url http://localhost:8000 --terminals 20
+    python -m benchmarks.load_terminals --compare benchmarks/results/load_20261017_101500.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from sqlalchemy import delete, select
+
+from app.database import engine, Base, SessionLocal
+from app import models, auth
+
+PASSWORD = "senha-benchmark"
+RESULTS_DIR = os.path.join("benchmarks", "results")
+PAYMENT_METHODS = ["dinheiro", "credito", "debito", "pix"]
+PAYMENT_WEIGHTS = [2, 3, 3, 4]
+
+
+# --- Transporte ---
+
+class AsgiClient:
+    """Chama a aplicação FastAPI direto no processo (pilha completa, sem socket)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, headers, body=b""):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"status": 500, "body": []}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait() # Cliente nunca desconecta
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response["status"], b"".join(response["body"])
+
+    async def close(self):
+        pass
+
+
+class HttpClient:
+    """HTTP/1.1 mínimo com keep-alive (uma conexão por terminal, como o navegador)."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        if parts.scheme != "http":
+            raise SystemExit("Só http:// é suportado (servidor local)")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers, body=b""):
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                return await self._roundtrip(method, path, headers, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Servidor fechou a conexão ociosa: reconecta uma vez
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _roundtrip(self, method, path, headers, body):
+        lines = [f"{method} {self.prefix}{path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readuntil(b"\r\n")).split()[1])
+        response_headers = {}
+        while (line := await self.reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while size := int((await self.reader.readuntil(b"\r\n")).strip(), 16):
+                chunks.append(await self.reader.readexactly(size + 2))
+            await self.reader.readuntil(b"\r\n")
+            data = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            data = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+# --- Medição ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+
+    def add(self, endpoint, status, ms):
+        self.latencies.setdefault(endpoint, []).append(ms)
+        by_status = self.statuses.setdefault(endpoint, {})
+        by_status[status] = by_status.get(status, 0) + 1
+
+
+def percentile(ordered, p):
+    # Nearest-rank: o menor valor que cobre p% das amostras
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def summarize(recorder, elapsed):
+    summary = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        ordered = sorted(values)
+        statuses = recorder.statuses[endpoint]
+        summary[endpoint] = {
+            "count": len(ordered),
+            "errors": sum(n for status, n in statuses.items() if status >= 400),
+            "statuses": {str(status): n for status, n in sorted(statuses.items())},
+            "rps": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p95_ms": round(percentile(ordered, 95), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2),
+        }
+    return summary
+
+
+class Client:
+    """Cliente de um terminal/gerente: token, terminal e registro das latências."""
+
+    def __init__(self, transport, recorder, terminal_id=None):
+        self.transport = transport
+        self.recorder = recorder
+        self.terminal_id = terminal_id
+        self.token = None
+
+    async def call(self, method, path, endpoint, json_body=None, form=None, params=None):
+        headers = {}
+        body = b""
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if self.terminal_id:
+            headers["x-terminal-id"] = self.terminal_id
+        if json_body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(json_body).encode()
+        elif form is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            body = urlencode(form).encode()
+        if params:
+            path = f"{path}?{urlencode(params)}"
+
+        start = time.perf_counter()
+        status, data = await self.transport.request(method, path, headers, body)
+        self.recorder.add(endpoint, status, (time.perf_counter() - start) * 1000)
+        return status, data
+
+    async def login(self, username):
+        status, data = await self.call("POST", "/token", "POST /token",
+                                       form={"username": username, "password": PASSWORD})
+        if status != 200:
+            raise SystemExit(f"Login de {username} falhou ({status}): {data[:200]!r}")
+        self.token = json.loads(data)["access_token"]
+
+
+# --- Cenário ---
+
+async def seed(n_terminals, n_managers, n_products):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    prefix = f"load_{uuid.uuid4().hex[:6]}"
+    hashed = await auth.hash_password(PASSWORD)
+    async with SessionLocal() as db:
+        users = [
+            models.User(name=f"Operador {i}", username=f"{prefix}_t{i}", hashed_password=hashed,
+                        role=models.UserRole.SELLER, is_active=True)
+            for i in range(n_terminals)
+        ] + [
+            models.User(name=f"Gerente {i}", username=f"{prefix}_m{i}", hashed_password=hashed,
+                        role=models.UserRole.MANAGER, is_active=True)
+            for i in range(n_managers)
+        ]
+        # 1 a cada 10 produtos é pesado (balança): quantidade fracionada
+        products = [
+            models.Product(
+                name=f"Produto Carga {i}", barcode=f"{prefix}{i:06d}", price=round(random.uniform(1, 60), 2),
+                cost_price=0.5, stock_quantity=1_000_000_000, min_stock=5, is_active=True,
+                is_weighted=(i % 10 == 0)
+            )
+            for i in range(n_products)
+        ]
+        db.add_all(users + products)
+        await db.commit()
+        catalog = [(p.id, p.barcode, bool(p.is_weighted)) for p in products]
+    return prefix, catalog
+
+
+def random_cart(catalog, cum_weights):
+    size = max(1, min(60, int(random.lognormvariate(1.3, 0.8))))
+    cart = {}
+    for product_id, barcode, is_weighted in random.choices(catalog, cum_weights=cum_weights, k=size):
+        quantity = round(random.uniform(0.1, 2.0), 3) if is_weighted else random.choices([1, 2, 3], [8, 2, 1])[0]
+        cart.setdefault((product_id, barcode), 0)
+        cart[(product_id, barcode)] += quantity
+    return cart
+
+
+async def terminal_loop(client, username, catalog, cum_weights, stop, args, counters):
+    await client.login(username)
+    status, data = await client.call("POST", "/cashier/open", "POST /cashier/open",
+                                     json_body={"initial_balance": 100.0})
+    if status != 200:
+        raise SystemExit(f"Abertura do caixa {client.terminal_id} falhou ({status}): {data[:200]!r}")
+
+    last_status = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_status >= args.status_interval:
+            await client.call("GET", "/cashier/status", "GET /cashier/status")
+            last_status = time.monotonic()
+
+        cart = random_cart(catalog, cum_weights)
+        for _, barcode in cart:
+            await client.call("GET", f"/products/barcode/{barcode}", "GET /products/barcode/{code}")
+            if args.think:
+                await asyncio.sleep(random.uniform(0, 2 * args.think) / 1000)
+
+        status, _ = await client.call("POST", "/sales/", "POST /sales/", json_body={
+            "payment_method": random.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0],
+            "sale_uuid": str(uuid.uuid4()),
+            "items": [{"product_id": pid, "quantity": qty} for (pid, _), qty in cart.items()],
+        })
+        if status == 200:
+            counters["sales"] += 1
+            counters["items"] += len(cart)
+
+
+async def manager_loop(client, username, catalog, stop, args):
+    await client.login(username)
+    calls = itertools.cycle(["dashboard", "history", "product_history"])
+    while not stop.is_set():
+        call = next(calls)
+        if call == "dashboard":
+            await client.call("GET", "/reports/dashboard", "GET /reports/dashboard")
+        elif call == "history":
+            await client.call("GET", "/stock/history", "GET /stock/history", params={"limit": 50})
+        else:
+            product_id = random.choice(catalog)[0]
+            await client.call("GET", "/stock/history", "GET /stock/history?product_id",
+                              params={"limit": 50, "product_id": product_id})
+        await asyncio.sleep(args.manager_interval)
+
+
+async def cleanup(prefix, terminal_ids):
+    async with SessionLocal() as db:
+        user_ids = select(models.User.id).where(models.User.username.like(f"{prefix}_%"))
+        product_ids = select(models.Product.id).where(models.Product.barcode.like(f"{prefix}%"))
+        sale_ids = select(models.Sale.id).where(models.Sale.user_id.in_(user_ids))
+        await db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id.in_(sale_ids)))
+        await db.execute(delete(models.Sale).where(models.Sale.user_id.in_(user_ids)))
+        await db.execute(delete(models.StockMovement).where(models.StockMovement.product_id.in_(product_ids)))
+        await db.execute(delete(models.CashierSession).where(models.CashierSession.user_id.in_(user_ids)))
+        await db.execute(delete(models.DailyProductSales).where(models.DailyProductSales.product_id.in_(product_ids)))
+        await db.execute(delete(models.ProductSalesTotal).where(models.ProductSalesTotal.product_id.in_(product_ids)))
+        await db.execute(delete(models.DailySales).where(models.DailySales.terminal_id.in_(terminal_ids)))
+        await db.execute(delete(models.Product).where(models.Product.barcode.like(f"{prefix}%")))
+        await db.execute(delete(models.User).where(models.User.username.like(f"{prefix}_%")))
+        await db.commit()
+
+
+# --- Relatório ---
+
+def print_report(result, previous=None):
+    print(f"\n{'endpoint':<34} {'req':>7} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8}")
+    for endpoint, s in result["endpoints"].items():
+        line = (f"{endpoint:<34} {s['count']:7d} {s['errors']:6d} {s['rps']:8.1f} "
+                f"{s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['max_ms']:8.1f}")
+        old = (previous or {}).get("endpoints", {}).get(endpoint)
+        if old:
+            line += f"   (p95 {s['p95_ms'] - old['p95_ms']:+.1f} ms, req/s {s['rps'] - old['rps']:+.1f})"
+        print(line)
+    print(f"\nVendas: {result['sales']} ({result['sales_per_second']:.1f}/s), "
+          f"{result['items']} itens em {result['duration_seconds']:.1f}s")
+    if previous:
+        print(f"Comparado com {previous['started_at']} "
+              f"({previous['sales_per_second']:.1f} vendas/s, {previous['config']['terminals']} terminais)")
+
+
+async def main(args):
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    prefix, catalog = await seed(args.terminals, args.managers, args.products)
+    # Popularidade: o produto na posição i sai com peso 1/(i+1)
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(catalog))))
+    terminal_ids = [f"LOAD-{prefix[-6:]}-{i:03d}" for i in range(args.terminals)]
+
+    if args.url:
+        make_transport = lambda: HttpClient(args.url)
+    else:
+        from app.main import app, startup
+        await startup()
+        make_transport = lambda: AsgiClient(app)
+
+    recorder = Recorder()
+    counters = {"sales": 0, "items": 0}
+    transports = []
+    stop = asyncio.Event()
+    started_at = datetime.now()
+    print(f"{args.terminals} terminais, {args.managers} gerentes, {args.products} produtos, "
+          f"{args.duration}s ({args.url or 'no processo'})...")
+
+    try:
+        tasks = []
+        for i, terminal_id in enumerate(terminal_ids):
+            transports.append(make_transport())
+            client = Client(transports[-1], recorder, terminal_id)
+            tasks.append(terminal_loop(client, f"{prefix}_t{i}", catalog, cum_weights, stop, args, counters))
+        for i in range(args.managers):
+            transports.append(make_transport())
+            tasks.append(manager_loop(Client(transports[-1], recorder), f"{prefix}_m{i}", catalog, stop, args))
+
+        start = time.perf_counter()
+        runners = [asyncio.create_task(task) for task in tasks]
+        await asyncio.wait(runners, timeout=args.duration, return_when=asyncio.FIRST_EXCEPTION)
+        stop.set()
+        await asyncio.gather(*runners) # Termina as vendas em andamento (e propaga falhas)
+        elapsed = time.perf_counter() - start
+    finally:
+        for transport in transports:
+            await transport.close()
+        await cleanup(prefix, terminal_ids)
+        await engine.dispose()
+
+    result = {
+        "started_at": started_at.isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        "duration_seconds": round(elapsed, 2),
+        "sales": counters["sales"],
+        "items": counters["items"],
+        "sales_per_second": round(counters["sales"] / elapsed, 1),
+        "endpoints": summarize(recorder, elapsed),
+    }
+    print_report(result, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultado salvo em {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=10)
+    parser.add_argument("--managers", type=int, default=1)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--think", type=float, default=0, help="Pausa média entre leituras do scanner (ms)")
+    parser.add_argument("--status-interval", type=float, default=5, help="Segundos entre consultas de /cashier/status")
+    parser.add_argument("--manager-interval", type=float, default=1, help="Segundos entre consultas dos gerentes")
+    parser.add_argument("--url", help="Servidor já rodando (ex: http://localhost:8000); padrão: no processo")
+    parser.add_argument("--output", help="Arquivo JSON do resultado (padrão: benchmarks/results/load_<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,126 @@
+"""
+Teste de estresse de concorrência: dispara N vendas em paralelo contra um único
+produto (e reposições simultâneas) e confere se o estoque final é exato.
+
+Sai com código 1 se houver venda a mais (overselling) ou atualização perdida.
+Os mesmos cenários rodam nos testes (tests/test_concurrent_sales.py); aqui dá
+para variar a carga.
+
+Uso:
+    python -m benchmarks.stress_concurrent_sales [--sales 200] [--stock 150] [--restocks 20]
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete, func
+
+from app.database import engine, Base, SessionLocal
+from app import models, schemas
+from app.routers.sales import create_sale
+from app.routers.products import add_stock
+
+
+async def seed(terminal_id, stock):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        user = models.User(
+            name="Stress", username=f"stress_{uuid.uuid4().hex[:8]}",
+            hashed_password="-", role=models.UserRole.SELLER, is_active=True
+        )
+        product = models.Product(
+            name="Produto Stress", price=1.0, cost_price=0.5,
+            stock_quantity=stock, is_active=True, is_weighted=False
+        )
+        db.add_all([user, product])
+        await db.flush()
+        db.add(models.CashierSession(
+            user_id=user.id, terminal_id=terminal_id, initial_balance=0.0, status="open"
+        ))
+        await db.commit()
+        return user, product.id
+
+
+async def sell_one(user, product_id, terminal_id):
+    sale_in = schemas.SaleCreate(
+        payment_method="dinheiro",
+        items=[schemas.SaleItemCreate(product_id=product_id, quantity=1)]
+    )
+    async with SessionLocal() as db:
+        try:
+            await create_sale(sale_in=sale_in, current_user=user, db=db, x_terminal_id=terminal_id)
+            return True
+        except HTTPException as e:
+            if e.status_code != 400:
+                raise
+            return False
+
+
+async def restock_one(user, product_id):
+    async with SessionLocal() as db:
+        await add_stock(product_id=product_id, quantity=1, db=db, current_user=user)
+
+
+async def final_state(product_id):
+    """Estoque final do produto e a soma das movimentações dele."""
+    async with SessionLocal() as db:
+        final_stock = await db.scalar(
+            select(models.Product.stock_quantity).where(models.Product.id == product_id)
+        )
+        ledger = await db.scalar(
+            select(func.sum(models.StockMovement.quantity_change))
+            .where(models.StockMovement.product_id == product_id)
+        ) or 0.0
+    return final_stock, ledger
+
+
+async def cleanup(user, product_id, terminal_id):
+    async with SessionLocal() as db:
+        sale_ids = select(models.Sale.id).where(models.Sale.user_id == user.id)
+        await db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id.in_(sale_ids)))
+        await db.execute(delete(models.Sale).where(models.Sale.user_id == user.id))
+        await db.execute(delete(models.StockMovement).where(models.StockMovement.product_id == product_id))
+        await db.execute(delete(models.CashierSession).where(models.CashierSession.user_id == user.id))
+        # Consolidados gerados pelas vendas do teste (referenciam os produtos)
+        await db.execute(delete(models.DailyProductSales).where(models.DailyProductSales.product_id == product_id))
+        await db.execute(delete(models.ProductSalesTotal).where(models.ProductSalesTotal.product_id == product_id))
+        await db.execute(delete(models.DailySales).where(models.DailySales.terminal_id == terminal_id))
+        await db.execute(delete(models.Product).where(models.Product.id == product_id))
+        await db.execute(delete(models.User).where(models.User.id == user.id))
+        await db.commit()
+
+
+async def main(n_sales, stock, n_restocks):
+    terminal_id = f"STRESS-{uuid.uuid4().hex[:6]}"
+    user, product_id = await seed(terminal_id, stock)
+    try:
+        tasks = [sell_one(user, product_id, terminal_id) for _ in range(n_sales)]
+        tasks += [restock_one(user, product_id) for _ in range(n_restocks)]
+        results = await asyncio.gather(*tasks)
+        sold = sum(1 for r in results[:n_sales] if r)
+
+        final_stock, ledger = await final_state(product_id)
+
+        expected = stock + n_restocks - sold
+        print(f"vendas aceitas: {sold}/{n_sales} | reposições: {n_restocks}")
+        print(f"estoque final: {final_stock} | esperado: {expected} | soma do histórico: {ledger}")
+
+        ok = final_stock == expected and final_stock >= 0 and ledger == n_restocks - sold
+        print("OK" if ok else "FALHA: estoque inconsistente")
+        return 0 if ok else 1
+    finally:
+        await cleanup(user, product_id, terminal_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sales", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=150)
+    parser.add_argument("--restocks", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.sales, args.stock, args.restocks)))
@@ -0,0 +1,52 @@
+"""
+Vendas concorrentes do mesmo produto: o estoque nunca fica negativo e
+nenhuma atualização se perde (benchmarks/stress_concurrent_sales).
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from benchmarks import stress_concurrent_sales as stress
+
+pytestmark = [pytest.mark.postgres, pytest.mark.anyio]
+
+STOCK = 50
+SALES = 80 # Mais vendas que estoque: as excedentes têm que ser recusadas
+RESTOCKS = 10
+
+
+@pytest.fixture
+async def product(database):
+    terminal_id = f"STRESS-{uuid.uuid4().hex[:6]}"
+    user, product_id = await stress.seed(terminal_id, STOCK)
+    try:
+        yield user, product_id, terminal_id
+    finally:
+        await stress.cleanup(user, product_id, terminal_id)
+
+
+async def test_concurrent_sales_never_oversell(product):
+    user, product_id, terminal_id = product
+    results = await asyncio.gather(*(stress.sell_one(user, product_id, terminal_id) for _ in range(SALES)))
+    final_stock, ledger = await stress.final_state(product_id)
+
+    assert final_stock >= 0
+    assert sum(results) == STOCK
+    assert final_stock == 0
+    assert ledger == -STOCK
+
+
+async def test_concurrent_sales_and_restocks_keep_exact_stock(product):
+    user, product_id, terminal_id = product
+    results = await asyncio.gather(
+        *(stress.sell_one(user, product_id, terminal_id) for _ in range(SALES)),
+        *(stress.restock_one(user, product_id) for _ in range(RESTOCKS)),
+    )
+    sold = sum(1 for accepted in results[:SALES] if accepted)
+    final_stock, ledger = await stress.final_state(product_id)
+
+    assert final_stock >= 0
+    assert STOCK <= sold <= STOCK + RESTOCKS
+    assert final_stock == STOCK + RESTOCKS - sold
+    assert ledger == RESTOCKS - sold
@@ -0,0 +1,148 @@
+"""
+Orçamento de consultas SQL por endpoint: pega regressões N+1 antes de irem
+para produção.
+
+As rotas quentes são chamadas pela aplicação no próprio processo (mesmo
+caminho do benchmarks/load_terminals) e cada requisição é contada com o
+fixture query_budget. Duas verificações:
+
+- orçamento: a requisição não pode passar de BUDGETS[endpoint] comandos;
+- custo constante: carrinho de 1 e de 50 itens, lote de 1 e de 20 vendas,
+  listagem da sessão com poucas e com muitas vendas — o número de comandos
+  não pode crescer com o tamanho.
+
+Os caches (usuário, caixa aberto, código de barras) são aquecidos antes, então
+os números são do caminho quente.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import SessionLocal
+from app import models, auth
+from benchmarks.load_terminals import AsgiClient, Client, Recorder, PASSWORD, seed, cleanup
+
+pytestmark = [pytest.mark.postgres, pytest.mark.anyio]
+
+# Máximo de comandos SQL por requisição (caminho quente, caches aquecidos).
+# Ao otimizar uma rota, baixe o número; ao subir, justifique no commit.
+BUDGETS = {
+    "GET /cashier/status": 1,
+    "GET /products/barcode/{code}": 0,
+    "GET /products/search": 1,
+    "POST /sales/": 9, # +1: trava dos produtos em ordem de id (evita deadlock)
+    "POST /sales/batch": 10,
+    "GET /sales/?session_id": 4,
+    "GET /stock/history": 1,
+}
+
+SMALL_CART, LARGE_CART = 1, 50
+SMALL_BATCH, LARGE_BATCH = 1, 20
+
+
+async def call(client, method, path, endpoint, **kwargs):
+    status, data = await client.call(method, path, endpoint, **kwargs)
+    assert status < 400, f"{endpoint} falhou ({status}): {data[:300]!r}"
+    return json.loads(data)
+
+
+def cart(catalog, size):
+    return [{"product_id": product_id, "quantity": 1} for product_id, _, _ in catalog[:size]]
+
+
+def batch(catalog, n_sales):
+    return {"sales": [
+        {"payment_method": "pix", "sale_uuid": str(uuid.uuid4()), "items": cart(catalog, 3)}
+        for _ in range(n_sales)
+    ]}
+
+
+@pytest.fixture
+async def store(api):
+    """Operador com o caixa aberto, gerente/admin e 50 produtos, com os caches aquecidos."""
+    prefix, catalog = await seed(1, 0, LARGE_CART)
+    terminal_id = f"BUDGET-{prefix[-6:]}"
+    try:
+        async with SessionLocal() as db:
+            db.add(models.User(name="Admin Orçamento", username=f"{prefix}_admin",
+                               hashed_password=await auth.hash_password(PASSWORD),
+                               role=models.UserRole.ADMIN, is_active=True))
+            await db.commit()
+
+        seller = Client(AsgiClient(api), Recorder(), terminal_id)
+        admin = Client(AsgiClient(api), Recorder())
+        await seller.login(f"{prefix}_t0")
+        await admin.login(f"{prefix}_admin")
+        await call(seller, "POST", "/cashier/open", "POST /cashier/open", json_body={"initial_balance": 0})
+
+        # Aquecimento: usuário, caixa aberto e códigos de barras em cache
+        status = await call(seller, "GET", "/cashier/status", "GET /cashier/status")
+        await call(admin, "GET", "/stock/history", "GET /stock/history", params={"limit": 1})
+        await call(seller, "GET", f"/products/barcode/{catalog[0][1]}", "GET /products/barcode/{code}")
+
+        yield SimpleNamespace(seller=seller, admin=admin, catalog=catalog, session_id=status["session_id"])
+    finally:
+        await cleanup(prefix, [terminal_id])
+
+
+async def test_hot_reads_within_budget(store, query_budget):
+    with query_budget(BUDGETS["GET /cashier/status"], "GET /cashier/status"):
+        await call(store.seller, "GET", "/cashier/status", "GET /cashier/status")
+
+    barcode = store.catalog[0][1]
+    with query_budget(BUDGETS["GET /products/barcode/{code}"], "GET /products/barcode/{code}"):
+        await call(store.seller, "GET", f"/products/barcode/{barcode}", "GET /products/barcode/{code}")
+
+    with query_budget(BUDGETS["GET /products/search"], "GET /products/search"):
+        await call(store.seller, "GET", "/products/search", "GET /products/search", params={"q": "produto carga"})
+
+    with query_budget(BUDGETS["GET /stock/history"], "GET /stock/history"):
+        await call(store.admin, "GET", "/stock/history", "GET /stock/history", params={"limit": 100})
+
+
+async def test_create_sale_cost_does_not_grow_with_cart(store, query_budget):
+    sizes = {}
+    for size in (SMALL_CART, LARGE_CART):
+        with query_budget(BUDGETS["POST /sales/"], f"POST /sales/ ({size} itens)") as statements:
+            await call(store.seller, "POST", "/sales/", "POST /sales/",
+                       json_body={"payment_method": "dinheiro", "items": cart(store.catalog, size)})
+        sizes[size] = len(statements)
+    assert sizes[LARGE_CART] <= sizes[SMALL_CART], f"N+1 no carrinho: {sizes[SMALL_CART]} -> {sizes[LARGE_CART]} comandos"
+
+
+async def test_sales_batch_cost_does_not_grow_with_batch(store, query_budget):
+    sizes = {}
+    for n_sales in (SMALL_BATCH, LARGE_BATCH):
+        with query_budget(BUDGETS["POST /sales/batch"], f"POST /sales/batch ({n_sales} vendas)") as statements:
+            await call(store.seller, "POST", "/sales/batch", "POST /sales/batch", json_body=batch(store.catalog, n_sales))
+        sizes[n_sales] = len(statements)
+    assert sizes[LARGE_BATCH] <= sizes[SMALL_BATCH], f"N+1 no lote: {sizes[SMALL_BATCH]} -> {sizes[LARGE_BATCH]} comandos"
+
+
+async def test_sales_batch_with_and_without_timestamp(store, query_budget):
+    # Fila offline com e sem a hora do terminal, alternadas: todas gravadas (no mesmo executemany)
+    payload = batch(store.catalog, 4)
+    offline_at = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    for sale in payload["sales"][::2]:
+        sale["timestamp"] = offline_at
+
+    with query_budget(BUDGETS["POST /sales/batch"], "POST /sales/batch (com e sem timestamp)"):
+        response = await call(store.seller, "POST", "/sales/batch", "POST /sales/batch", json_body=payload)
+    assert response["created"] == len(payload["sales"])
+
+
+async def test_list_session_sales_cost_does_not_grow_with_sales(store, query_budget):
+    params = {"session_id": store.session_id}
+    await call(store.seller, "POST", "/sales/", "POST /sales/",
+               json_body={"payment_method": "dinheiro", "items": cart(store.catalog, 1)})
+    with query_budget(BUDGETS["GET /sales/?session_id"], "GET /sales/?session_id (1 venda)") as few:
+        await call(store.admin, "GET", "/sales/", "GET /sales/", params=params)
+
+    await call(store.seller, "POST", "/sales/batch", "POST /sales/batch", json_body=batch(store.catalog, LARGE_BATCH))
+    with query_budget(BUDGETS["GET /sales/?session_id"], "GET /sales/?session_id (várias vendas)") as many:
+        page = await call(store.admin, "GET", "/sales/", "GET /sales/", params=params)
+    assert len(page) > 1
+    assert len(many) <= len(few), f"N+1 na listagem: {len(few)} -> {len(many)} comandos"
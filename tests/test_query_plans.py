@@ -0,0 +1,41 @@
+"""
+Planos das consultas quentes (caixa, vendas, estoque, busca, dashboard): com
+volume de loja real, nenhuma pode cair em Seq Scan.
+
+Os dados sintéticos e as consultas são os de benchmarks/explain_hot_queries.
+Tudo roda em uma transação desfeita no final (ANALYZE incluído), então o banco
+de teste não guarda nada.
+"""
+import json
+
+import pytest
+
+from benchmarks import explain_hot_queries
+
+pytestmark = [pytest.mark.postgres, pytest.mark.anyio]
+
+# Volume em que o PostgreSQL deixa de preferir Seq Scan nas tabelas com índice
+PRODUCTS = 20_000
+TERMINALS = 20
+SALES = 200_000
+
+
+async def test_hot_queries_use_indexes(database):
+    failures = []
+    async with database.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await explain_hot_queries.seed(conn, PRODUCTS, TERMINALS, SALES)
+            await explain_hot_queries.analyze(conn)
+            queries = explain_hot_queries.hot_queries(*await explain_hot_queries.sample_values(conn))
+            for label, query in queries:
+                plan = await explain_hot_queries.explain(conn, query)
+                tables = explain_hot_queries.seq_scans(plan)
+                if tables:
+                    failures.append(
+                        f"{label}: Seq Scan em {', '.join(tables)}\n{json.dumps(plan, indent=2, ensure_ascii=False)}"
+                    )
+        finally:
+            await transaction.rollback()
+
+    assert not failures, "\n\n".join(failures)